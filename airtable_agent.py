@@ -1,60 +1,582 @@
 import os
-from playwright.async_api import async_playwright, TimeoutError
-from pyairtable import Api
-from dotenv import load_dotenv
 import asyncio
 import re
 import traceback # Import traceback explicitly
 import time # Import time for timeout tracking
-
-load_dotenv()
-
-# ... (Airtable setup remains the same) ...
-AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
-AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID")
-AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME")
-
-if not all([AIRTABLE_API_KEY, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME]):
-    raise ValueError("Airtable environment variables not set correctly.")
-
-api = Api(AIRTABLE_API_KEY)
-table = api.table(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+import uuid
+from urllib.parse import urlparse
+
+# Importing this module has no side effects: entry points (app.py, worker.py, batch_run.py)
+# load .env first, and the Airtable client and Playwright are only loaded on first use.
+from airtable_writer import AirtableWriter
+from browser_pool import get_browser_pool
+from credential_pool import NoAccountAvailable, get_credential_pool
+from flow_engine import Step, run_steps
+from job_log import JobLog
+from metrics import PHASE_SECONDS, observe_run
+from request_filter import REQUEST_FILTER_ENABLED, RequestFilter
+from session_cache import get_session_cache
+
+# --- Airtable Configuration (AIRTABLE_API_KEY / AIRTABLE_BASE_ID / AIRTABLE_TABLE_NAME) ---
+# Read, validated and connected on first use (see get_airtable_table), not at import, so
+# variables set after importing this module (load_dotenv, tests, notebooks) are honoured.
+
+
+class AirtableConfigError(ValueError):
+    """Raised by get_airtable_table() when the Airtable environment variables are missing."""
+
+
+_airtable_table = None
+
+def get_airtable_table():
+    """Returns the pyairtable Table for the configured base and table, created on first call."""
+    global _airtable_table
+    if _airtable_table is None:
+        api_key, base_id, table_name = (os.getenv(name) for name in ("AIRTABLE_API_KEY", "AIRTABLE_BASE_ID", "AIRTABLE_TABLE_NAME"))
+        if not all([api_key, base_id, table_name]):
+            raise AirtableConfigError("Airtable environment variables not set correctly.")
+        from pyairtable import Api # Slow to import; only needed once Airtable is actually used
+        _airtable_table = Api(api_key).table(base_id, table_name)
+    return _airtable_table
+
+def timeout_errors():
+    """Exception types meaning "timed out": the builtin one raised here and Playwright's (imported on demand)."""
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    return (TimeoutError, PlaywrightTimeoutError)
+
+# --- Genspark selectors and URLs (shared by the login probe and the flow) ---
+LOGIN_EMAIL_BUTTON_SELECTOR = 'button:has-text("Login with email")'
+EMAIL_SELECTOR = "input[type='email']"
+PASSWORD_SELECTOR = "input[type='password']"
+NEXT_BUTTON_SELECTOR = "#next" # Keeping ID selector as specified
+MODAL_SVG_SELECTOR = ".n-modal svg"
+CHAT_INPUT_SELECTOR = "textarea.search-input"
+SEND_BUTTON_SELECTOR = ".enter-icon"
+GENSPARK_BASE_URL = os.getenv("GENSPARK_BASE_URL", "https://www.genspark.ai").rstrip("/") # fake_genspark.py for local runs
+GENSPARK_HOST = urlparse(GENSPARK_BASE_URL).netloc
+DEEP_RESEARCH_URL = f"{GENSPARK_BASE_URL}/agents?type=agentic_deep_research"
+GENSPARK_SESSION_PROBE_TIMEOUT = int(os.getenv("GENSPARK_SESSION_PROBE_TIMEOUT", "10000")) # ms
+GENSPARK_ACCOUNT_LEASE_TIMEOUT = int(os.getenv("GENSPARK_ACCOUNT_LEASE_TIMEOUT", "900")) # seconds waiting for a free account
+# Page texts that mean the account hit its usage quota (takes it out of rotation).
+QUOTA_PATTERN = re.compile(r"quota|usage limit|limit reached|out of credits|upgrade (?:your )?plan|límite de uso", re.IGNORECASE)
+ACCOUNT_FAILURE_REASONS = ("login_failed", "quota", "captcha")
+# Banner texts that mean Genspark turned the credentials down (only these count as login_failed).
+LOGIN_REJECTED_PATTERN = re.compile(r"incorrect|invalid (?:email|password|credentials)|wrong password|account (?:not found|disabled|locked)|contraseña incorrecta|credenciales", re.IGNORECASE)
+
+# --- Research completion signals (Flow 34) ---
+GENSPARK_MAX_WAIT = int(os.getenv("GENSPARK_MAX_WAIT", "900")) # seconds (15 minutes ceiling)
+GENSPARK_POLL_INTERVAL = float(os.getenv("GENSPARK_POLL_INTERVAL", "30")) # seconds, fallback DOM poll only
+REPORT_IMAGE_SUBSTRING = "spark_page"
+# Single round-trip DOM check; also used with polling="mutation" so a MutationObserver fires it.
+# Takes the number of reports expected on the page (follow-ups add one each).
+REPORT_READY_JS = "(minCount) => document.querySelectorAll('img[src*=\"spark_page\"]').length >= minCount"
+REPORT_COUNT_JS = "() => document.querySelectorAll('img[src*=\"spark_page\"]').length"
 
 # --- Predicate function for network response wait ---
-async def check_image_response(response):
+def check_image_response(response):
     """Check if the response is the target image signal, requiring 'spark_page' in the URL."""
-    content_type = await response.header_value("content-type")
-    is_image = content_type and "image" in content_type.lower()
+    content_type = response.headers.get("content-type", "")
+    is_image = "image" in content_type.lower()
     return (
-        "www.genspark.ai" in response.url and 
-        "spark_page" in response.url and
+        GENSPARK_HOST in response.url and 
+        REPORT_IMAGE_SUBSTRING in response.url and
         response.request.method == "GET" and 
         response.status == 200 and 
         is_image
     )
 
-async def run_genspark_interaction(empresa, pais, consideraciones, airtable_record_id):
+async def wait_for_report_ready(page, log, max_wait=GENSPARK_MAX_WAIT, poll_interval=GENSPARK_POLL_INTERVAL, min_count=1):
+    """
+    Resolves as soon as the report is ready, racing three signals:
+    the spark_page image response on the network, a MutationObserver on the DOM,
+    and a slow single-call DOM poll as a fallback. Raises TimeoutError after `max_wait` seconds.
+    `min_count` is the number of reports the page must show (1 + follow-ups answered so far).
+    Returns the name of the signal that fired first.
+    """
+    deadline = time.monotonic() + max_wait
+
+    async def network_signal():
+        # Earlier reports' images can load again, so a response only counts once the DOM shows min_count.
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Sin respuesta de imagen antes del límite.")
+            await page.wait_for_event("response", predicate=check_image_response, timeout=remaining * 1000)
+            if await page.evaluate(REPORT_READY_JS, min_count):
+                return "network"
+
+    async def mutation_signal():
+        # A navigation destroys the observer's execution context; re-arm it until the deadline.
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("MutationObserver sin señal antes del límite.")
+            try:
+                await page.wait_for_function(REPORT_READY_JS, arg=min_count, polling="mutation", timeout=remaining * 1000)
+                return "mutation"
+            except timeout_errors():
+                raise
+            except Exception as e:
+                log(f"   Observador DOM reiniciado tras error: {e}")
+                await asyncio.sleep(1)
+
+    async def poll_signal():
+        while time.monotonic() < deadline:
+            try:
+                if await page.evaluate(REPORT_READY_JS, min_count):
+                    return "poll"
+            except Exception as e:
+                log(f"    Advertencia: Error en sondeo de respaldo: {e}")
+            await asyncio.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+        raise TimeoutError("Sondeo de respaldo sin señal antes del límite.")
+
+    tasks = [asyncio.create_task(coro()) for coro in (network_signal, mutation_signal, poll_signal)]
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    raise TimeoutError(f"No se detectó la imagen '{REPORT_IMAGE_SUBSTRING}' dentro de {max_wait}s.")
+
+# --- Research Watchdog (runs alongside Flow 34 to fail fast instead of waiting 15 minutes) ---
+GENSPARK_WATCHDOG_INTERVAL = float(os.getenv("GENSPARK_WATCHDOG_INTERVAL", "5")) # seconds between page probes
+GENSPARK_STALL_TIMEOUT = int(os.getenv("GENSPARK_STALL_TIMEOUT", "300")) # seconds without any DOM change
+ERROR_BANNER_PATTERN = re.compile(r"something went wrong|an error occurred|please try again|network error|algo salió mal|inténtalo de nuevo", re.IGNORECASE)
+# Reasons worth an immediate retry (fresh context, full login) rather than a plain failure.
+RETRYABLE_FAILURE_REASONS = ("login_wall", "page_closed", "page_crashed")
+# One round-trip probe: DOM size (progress signature), alert/toast texts, captcha and login prompt.
+WATCHDOG_PROBE_JS = """
+() => ({
+    size: document.getElementsByTagName('*').length + ':' + (document.body ? document.body.innerHTML.length : 0),
+    alerts: Array.from(document.querySelectorAll('[role="alert"], [role="alertdialog"], .n-message, .n-notification, .n-dialog, .toast'))
+        .filter(el => el.offsetParent !== null).map(el => el.innerText || '').join('\n'),
+    captcha: !!document.querySelector('iframe[src*="captcha"], iframe[src*="challenges.cloudflare.com"], #challenge-form, .g-recaptcha, .h-captcha'),
+    loginPrompt: Array.from(document.querySelectorAll('button'))
+        .some(b => b.offsetParent !== null && (b.innerText || '').includes('Login with email')),
+})
+"""
+
+# --- Live Progress Capture (text the research page adds while it works) ---
+PROGRESS_CAPTURE_ENABLED = os.getenv("PROGRESS_CAPTURE_ENABLED", "1") != "0"
+GENSPARK_PROGRESS_SELECTOR = os.getenv("GENSPARK_PROGRESS_SELECTOR", "") # Conversation container, if known (default: body)
+PROGRESS_FLUSH_MS = 1500 # Page-side throttle between progress snapshots
+PROGRESS_MAX_CHARS = 50000 # Tail kept as partial output
+PROGRESS_BINDING = "kenmeiProgress"
+# Re-armed before each research wait: lines already on the page (and the query itself) form
+# the baseline, and every throttled snapshot sends the lines added since then.
+PROGRESS_OBSERVER_JS = """
+([binding, selector, exclude, flushMs]) => {
+    if (window.__kenmeiProgress) window.__kenmeiProgress.disconnect();
+    const root = () => (selector && document.querySelector(selector)) || document.body;
+    const lines = (text) => (text || '').split('\n').map(l => l.trim()).filter(Boolean);
+    const baseline = new Set(lines(root().innerText).concat(lines(exclude)));
+    let last = '', timer = null;
+    const flush = () => {
+        timer = null;
+        const text = lines(root().innerText).filter(l => !baseline.has(l)).join('\n');
+        if (text && text !== last) {
+            last = text;
+            window[binding](text);
+        }
+    };
+    window.__kenmeiProgress = new MutationObserver(() => { if (!timer) timer = setTimeout(flush, flushMs); });
+    window.__kenmeiProgress.observe(document.body, {childList: true, subtree: true, characterData: true});
+}
+"""
+
+class ProgressCapture:
+    """
+    Latest progress snapshot of the research page; each new one is passed to `on_progress(text)`.
+    Problems arming the observer are reported to `log` (the job's JobLog).
+    """
+
+    def __init__(self, log, on_progress=None, max_chars=PROGRESS_MAX_CHARS):
+        self.log = log
+        self.on_progress = on_progress
+        self.max_chars = max_chars
+        self.text = ""
+
+    async def attach(self, page):
+        """Exposes the page-side callback; call once per page, before navigating."""
+        await page.expose_function(PROGRESS_BINDING, self.update)
+
+    async def observe(self, page, exclude=""):
+        """(Re)arms the observer on the current document, ignoring text already shown and `exclude`."""
+        try:
+            await page.evaluate(PROGRESS_OBSERVER_JS, [PROGRESS_BINDING, GENSPARK_PROGRESS_SELECTOR, exclude, PROGRESS_FLUSH_MS])
+        except Exception as e:
+            self.log.warning(f"[Progress] No se pudo observar el progreso: {e}")
+
+    def update(self, text):
+        self.text = text[-self.max_chars:]
+        if self.on_progress:
+            self.on_progress(self.text)
+
+class ResearchAborted(Exception):
+    """The watchdog recognized a dead end during the research wait; `reason` classifies it."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+def classify_probe(probe, url):
+    """Returns (reason, message) for a known error state in a WATCHDOG_PROBE_JS result, or None."""
+    if "login" in url.lower() or probe["loginPrompt"]:
+        return "login_wall", f"Genspark pidió login durante la investigación ({url})."
+    if probe["captcha"]:
+        return "captcha", "Genspark mostró un captcha."
+    if QUOTA_PATTERN.search(probe["alerts"]):
+        return "quota", f"Aviso de cuota: {probe['alerts'][:200]}"
+    if ERROR_BANNER_PATTERN.search(probe["alerts"]):
+        return "error_banner", f"Aviso de error de Genspark: {probe['alerts'][:200]}"
+    return None
+
+async def watch_research(page, log, interval=GENSPARK_WATCHDOG_INTERVAL, stall_timeout=GENSPARK_STALL_TIMEOUT):
+    """
+    Probes the page every `interval` seconds and raises ResearchAborted as soon as it shows
+    a login wall, captcha, quota or error banner, stops changing for `stall_timeout` seconds,
+    or is closed / crashes. Never returns on its own; cancel it when the wait ends.
+    """
+    loop = asyncio.get_running_loop()
+    page_gone = loop.create_future()
+
+    def on_gone(reason, message):
+        if not page_gone.done():
+            page_gone.set_exception(ResearchAborted(reason, message))
+
+    on_close = lambda _: on_gone("page_closed", "La página se cerró durante la investigación.")
+    on_crash = lambda _: on_gone("page_crashed", "La página del navegador se colgó (crash).")
+    page.on("close", on_close)
+    page.on("crash", on_crash)
+    last_signature, last_change = None, time.monotonic()
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(page_gone), interval)
+            except asyncio.TimeoutError:
+                pass
+            if page.is_closed():
+                raise ResearchAborted("page_closed", "La página se cerró durante la investigación.")
+            try:
+                probe = await page.evaluate(WATCHDOG_PROBE_JS)
+            except Exception as e:
+                if page_gone.done():
+                    raise page_gone.exception()
+                log(f"   Watchdog: sondeo fallido (posible navegación): {e}")
+                continue
+            verdict = classify_probe(probe, page.url)
+            if verdict:
+                raise ResearchAborted(*verdict)
+            now = time.monotonic()
+            if probe["size"] != last_signature:
+                last_signature, last_change = probe["size"], now
+            elif now - last_change > stall_timeout:
+                raise ResearchAborted("stalled", f"Sin cambios en la página durante {stall_timeout}s.")
+    finally:
+        page.remove_listener("close", on_close)
+        page.remove_listener("crash", on_crash)
+        if not page_gone.done():
+            page_gone.cancel()
+        elif not page_gone.cancelled():
+            page_gone.exception() # Mark as retrieved
+
+async def wait_with_watchdog(page, log, wait_coro):
+    """Awaits `wait_coro` while watch_research runs alongside; the first to finish or fail wins."""
+    wait_task = asyncio.create_task(wait_coro)
+    watch_task = asyncio.create_task(watch_research(page, log))
+    try:
+        await asyncio.wait({wait_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+        if wait_task.done():
+            return wait_task.result()
+        return watch_task.result() # Raises ResearchAborted
+    finally:
+        for task in (wait_task, watch_task):
+            task.cancel()
+        await asyncio.gather(wait_task, watch_task, return_exceptions=True)
+
+async def page_shows_quota(page):
+    """True if the visible page text matches a known quota/limit message."""
+    try:
+        return bool(QUOTA_PATTERN.search(await page.inner_text("body", timeout=2000)))
+    except Exception:
+        return False
+
+async def page_shows_login_rejection(page, submitted):
+    """
+    True if Genspark rejected the credentials: a visible banner about them, or (once the form
+    was `submitted`) the password field still on screen. Timeouts elsewhere are not rejections.
+    """
+    try:
+        probe = await page.evaluate(WATCHDOG_PROBE_JS)
+        if LOGIN_REJECTED_PATTERN.search(probe["alerts"]):
+            return True
+        return submitted and await page.locator(PASSWORD_SELECTOR).first.is_visible()
+    except Exception:
+        return False
+
+async def is_session_valid(page, timeout=GENSPARK_SESSION_PROBE_TIMEOUT):
+    """Quick probe on an already-loaded Genspark page: chat input renders and no login prompt is shown."""
+    try:
+        await page.locator(CHAT_INPUT_SELECTOR).wait_for(state="visible", timeout=timeout)
+    except timeout_errors():
+        return False
+    if "login" in page.url.lower():
+        return False
+    return not await page.locator(LOGIN_EMAIL_BUTTON_SELECTOR).first.is_visible()
+
+# --- Declarative Genspark Flow (readiness-based waits instead of fixed sleeps) ---
+BUTTONS_SELECTOR = ".buttons" # Confirming: Using class selector
+COPY_BUTTONS_READY_JS = "() => document.querySelectorAll('.buttons').length >= 2"
+CLIPBOARD_READY_TIMEOUT = 5 # seconds
+# --- Report Extraction (Flow 37): read the answer from the DOM, clipboard only as fallback ---
+REPORT_EXTRACTION = os.getenv("REPORT_EXTRACTION", "dom").lower() # "dom" (clipboard fallback) | "clipboard"
+GENSPARK_REPORT_SELECTOR = os.getenv("GENSPARK_REPORT_SELECTOR", "") # CSS selector of the answer container, if known
+REPORT_MIN_TEXT_LENGTH = 200 # characters; shorter candidates are UI chrome, not the report
+# Returns the answer's innerHTML: the last match of the configured selector, otherwise the
+# closest preceding sibling of the penultimate .buttons group (the one whose copy button
+# copies the report) that carries enough text.
+EXTRACT_REPORT_JS = """
+([selector, minLength]) => {
+    const substantial = (el) => el && (el.innerText || '').trim().length >= minLength;
+    if (selector) {
+        const matches = document.querySelectorAll(selector);
+        const el = matches[matches.length - 1];
+        if (substantial(el)) return el.innerHTML;
+    }
+    const groups = document.querySelectorAll('.buttons');
+    if (groups.length < 2) return null;
+    let node = groups[groups.length - 2];
+    for (let depth = 0; node && node !== document.body && depth < 5; depth++) {
+        let sibling = node.previousElementSibling;
+        while (sibling && !substantial(sibling)) sibling = sibling.previousElementSibling;
+        if (sibling) return sibling.innerHTML;
+        node = node.parentElement;
+    }
+    return null;
+}
+"""
+
+async def extract_report_markdown(page, selector=GENSPARK_REPORT_SELECTOR):
+    """Reads the rendered answer straight from the DOM and converts it to Markdown ("" if not found)."""
+    html = await page.evaluate(EXTRACT_REPORT_JS, [selector, REPORT_MIN_TEXT_LENGTH])
+    from html_to_markdown import html_to_markdown # Loads BeautifulSoup; only needed once a report is extracted
+    return html_to_markdown(html) if html else ""
+
+async def read_clipboard_when_ready(page, timeout=CLIPBOARD_READY_TIMEOUT):
+    """Polls the clipboard until the copy action lands (instead of a fixed 1.5s sleep)."""
+    deadline = time.monotonic() + timeout
+    content = ""
+    while time.monotonic() < deadline:
+        content = await page.evaluate('navigator.clipboard.readText()')
+        if content:
+            return content
+        await asyncio.sleep(0.1)
+    return content
+
+async def copy_report_to_clipboard(page, log):
+    """Clicks the copy button of the penultimate .buttons group and returns the clipboard text."""
+    all_buttons_groups = page.locator(BUTTONS_SELECTOR)
+    count = await all_buttons_groups.count()
+    log(f"   Encontrados {count} elementos con CLASE .buttons.")
+    copy_button_element = all_buttons_groups.nth(-2) # Penúltimo
+    # It's often better to click a specific button *inside* the container if possible
+    try:
+        await copy_button_element.locator('button, svg').first.click(timeout=5000)
+        log("   Clic en botón/svg interno realizado.")
+    except Exception:
+        log("   No se encontró botón/svg interno, haciendo clic en el contenedor .buttons...")
+        await copy_button_element.click() # Fallback to clicking the container
+    return await read_clipboard_when_ready(page)
+
+async def extract_report(page, log):
+    """Returns (content, source) for the latest answer: DOM first, clipboard as fallback."""
+    if REPORT_EXTRACTION != "clipboard":
+        try:
+            content = await extract_report_markdown(page)
+        except Exception as e:
+            log(f"   Advertencia: Extracción desde el DOM falló: {e}")
+            content = ""
+        if content:
+            log(f"   Reporte extraído del DOM ({len(content)} caracteres).")
+            return content, "dom"
+        log("   No se encontró el reporte en el DOM. Usando el portapapeles como respaldo...")
+    return await copy_report_to_clipboard(page, log), "clipboard"
+
+def clean_report(content):
+    """Trims the extracted text to the Markdown report (from the first '#'); None if empty."""
+    match = re.search(r'#.*', content or "", re.DOTALL)
+    if match:
+        return match.group(0).strip()
+    return (content or "").strip() or None
+
+def _bind_goto(url):
+    """Step action that navigates the page to `url`."""
+    async def action(page, locator, flow_state):
+        await page.goto(url)
+    return action
+
+def build_genspark_steps(email, password, login_url, long_query, sessions, log):
+    """Returns the Genspark flow as a list of Steps (login steps are skipped when the session was reused)."""
+    needs_login = lambda s: not s["session_reused"]
+    relogin_shown = lambda s: not s["session_reused"] and "relogin_button" in s["completed"]
+
+    async def click(page, locator, flow_state):
+        await locator.click()
+
+    def fill(value):
+        async def action(page, locator, flow_state):
+            await locator.fill(value)
+        return action
+
+    async def send_query(page, locator, flow_state):
+        await locator.click()
+        flow_state["query_sent_at"] = time.perf_counter()
+
+    async def save_session(page, locator, flow_state):
+        try:
+            await sessions.save(page.context, email)
+            log("   Sesión autenticada guardada para reutilizarla.")
+        except Exception as save_err:
+            log(f"   Advertencia: No se pudo guardar la sesión: {save_err}")
+
+    async def research_wait(page, locator, flow_state):
+        if flow_state.get("progress"):
+            await flow_state["progress"].observe(page, exclude=long_query)
+        signal = await wait_with_watchdog(page, log, wait_for_report_ready(page, log))
+        log(f"   ¡Imagen '{REPORT_IMAGE_SUBSTRING}' detectada vía {signal}!")
+
+    async def extract(page, locator, flow_state):
+        flow_state["report_content"], flow_state["report_source"] = await extract_report(page, log)
+
+    return [
+        # --- First Login Sequence (Flow 1-8) ---
+        Step("login_page", f"Navegando a la URL de login: {login_url}", action=_bind_goto(login_url), when=needs_login, phase="login"),
+        Step("login_button", "[Flow 1-2] Clic en 'Login with email'", selector=LOGIN_EMAIL_BUTTON_SELECTOR, action=click, timeout=30000, when=needs_login, phase="login"),
+        Step("email", "[Flow 3-4] Rellenando input email", selector=EMAIL_SELECTOR, action=fill(email), when=needs_login, phase="login"),
+        Step("password", "[Flow 5-6] Rellenando input password", selector=PASSWORD_SELECTOR, action=fill(password), when=needs_login, phase="login"),
+        Step("next", "[Flow 7-8] Clic en #next", selector=NEXT_BUTTON_SELECTOR, action=click, when=needs_login, phase="login"),
+        # --- Modal Interaction (Flow 10-11), replaces the 3s sleep of Flow 9 ---
+        Step("dismiss_modal", "[Flow 10-11] Cerrando modal (.n-modal svg) si aparece", selector=MODAL_SVG_SELECTOR, pick="first", action=click, timeout=10000, optional=True, when=needs_login, phase="login"),
+        # --- Send "Hola" (Flow 13-16), replaces the 2s sleep of Flow 12 ---
+        Step("hola_input", "[Flow 13-14] Escribiendo 'Hola'", selector=CHAT_INPUT_SELECTOR, action=fill("Hola"), timeout=30000, when=needs_login, phase="login"),
+        Step("hola_send", "[Flow 15-16] Enviando 'Hola'", selector=SEND_BUTTON_SELECTOR, action=click, when=needs_login, phase="login"),
+        # --- Second Login Sequence (Flow 18-25): waits for the prompt instead of sleeping 5s first ---
+        Step("relogin_button", "[Flow 18-19] Esperando botón 'Login with email' (login preventivo)", selector=LOGIN_EMAIL_BUTTON_SELECTOR, pick="first", action=click, timeout=8000, optional=True, when=needs_login, phase="login"),
+        Step("relogin_email", "[Flow 20-21] Rellenando input email de nuevo", selector=EMAIL_SELECTOR, action=fill(email), timeout=5000, optional=True, when=relogin_shown, phase="login"),
+        Step("relogin_password", "[Flow 22-23] Rellenando input password de nuevo", selector=PASSWORD_SELECTOR, action=fill(password), timeout=5000, optional=True, when=relogin_shown, phase="login"),
+        Step("relogin_next", "[Flow 24-25] Clic en #next de nuevo", selector=NEXT_BUTTON_SELECTOR, action=click, timeout=5000, optional=True, when=relogin_shown, phase="login"),
+        # Replaces the 3s + 5s sleeps of Flow 26-27: wait until the login form is gone.
+        Step("relogin_done", "[Flow 26-27] Esperando que desaparezca el formulario de login", selector=EMAIL_SELECTOR, state="hidden", timeout=15000, optional=True, when=relogin_shown, phase="login"),
+        Step("save_session", "Guardando sesión autenticada", action=save_session, when=needs_login, phase="login"),
+        # --- Navigate Directly to Deep Research Agent (Flow 28), replaces the 3s sleep of Flow 29 ---
+        Step("deep_research", f"[Flow 28] Navegando directamente a: {DEEP_RESEARCH_URL}", action=_bind_goto(DEEP_RESEARCH_URL), when=needs_login, phase="query"),
+        # --- Send the long query (Flow 30-33) ---
+        Step("query_input", "[Flow 30-31] Escribiendo query larga", selector=CHAT_INPUT_SELECTOR, action=fill(long_query), timeout=30000, phase="query"),
+        Step("query_send", "[Flow 32-33] Enviando query larga", selector=SEND_BUTTON_SELECTOR, action=send_query, phase="query"),
+        # --- Wait for Report Completion Event (Flow 34) ---
+        Step("research_wait", f"[Flow 34] Esperando imagen '{REPORT_IMAGE_SUBSTRING}' (max {GENSPARK_MAX_WAIT}s)", action=research_wait, timeout=GENSPARK_MAX_WAIT * 1000, phase="research_wait"),
+        # --- Extract Result (Flow 35-37): waits for the copy buttons instead of sleeping 5s ---
+        Step("copy_buttons", "[Flow 35-36] Esperando el penúltimo grupo .buttons", selector=BUTTONS_SELECTOR, pick="last", condition=COPY_BUTTONS_READY_JS, timeout=60000, phase="extraction"),
+        Step("extract_report", "[Flow 37] Extrayendo reporte (DOM, portapapeles como respaldo)", action=extract, phase="extraction"),
+    ]
+
+# First follow-up of a resumed run (phase 1 saved earlier, asked in a new conversation).
+RESUME_CONTEXT_TEMPLATE = "Este es el análisis anterior:\n\n{base_content}\n\n{query}"
+
+def build_follow_up_steps(index, query, log):
+    """
+    Steps that ask one follow-up `query` in the conversation already open on the page
+    (phase 2) and extract its answer into flow_state["follow_ups"][index].
+    """
+    prefix = f"follow_up_{index + 1}"
+
+    async def fill_query(page, locator, flow_state):
+        await locator.fill(query)
+
+    async def send(page, locator, flow_state):
+        # Baseline counts so the waits below only fire for the new answer.
+        flow_state["baseline"] = {
+            "reports": await page.evaluate(REPORT_COUNT_JS),
+            "buttons": await page.locator(BUTTONS_SELECTOR).count(),
+        }
+        await locator.click()
+
+    async def research_wait(page, locator, flow_state):
+        if flow_state.get("progress"):
+            await flow_state["progress"].observe(page, exclude=query)
+        signal = await wait_with_watchdog(page, log, wait_for_report_ready(page, log, min_count=flow_state["baseline"]["reports"] + 1))
+        log(f"   Respuesta de seguimiento {index + 1} detectada vía {signal}.")
+
+    async def buttons_ready(page, locator, flow_state):
+        await page.wait_for_function(
+            "(n) => document.querySelectorAll('.buttons').length > n",
+            arg=flow_state["baseline"]["buttons"], polling="mutation", timeout=60000,
+        )
+
+    async def extract(page, locator, flow_state):
+        content, source = await extract_report(page, log)
+        flow_state.setdefault("follow_ups", {})[index] = clean_report(content)
+
+    return [
+        Step(f"{prefix}_input", f"[Fase 2] Escribiendo consulta de seguimiento {index + 1}", selector=CHAT_INPUT_SELECTOR, action=fill_query, timeout=30000, phase="follow_up"),
+        Step(f"{prefix}_send", f"[Fase 2] Enviando consulta de seguimiento {index + 1}", selector=SEND_BUTTON_SELECTOR, action=send, phase="follow_up"),
+        Step(f"{prefix}_wait", f"[Fase 2] Esperando respuesta {index + 1} (max {GENSPARK_MAX_WAIT}s)", action=research_wait, timeout=GENSPARK_MAX_WAIT * 1000, phase="follow_up"),
+        Step(f"{prefix}_buttons", f"[Fase 2] Esperando botones de la respuesta {index + 1}", action=buttons_ready, phase="follow_up"),
+        Step(f"{prefix}_extract", f"[Fase 2] Extrayendo respuesta {index + 1}", action=extract, phase="follow_up"),
+    ]
+
+async def run_genspark_interaction(empresa, pais, consideraciones, airtable_record_id, browser_pool=None, session_cache=None, job_log=None, airtable_writer=None, credential_pool=None, request_filter=None, follow_up_queries=None, on_phase_complete=None, on_progress=None, base_content=None):
     """
     Runs the full Genspark interaction process based on the specified flow.
+    The Genspark account is leased from `credential_pool` (per-account concurrency limits;
+    accounts failing login or hitting a quota are rotated out).
+    Uses a context from `browser_pool` (the shared warm pool by default) instead of launching Chromium,
+    and reuses the account's cached login from `session_cache` when it is still valid.
+    Non-essential requests are blocked by `request_filter` (default RequestFilter when
+    REQUEST_FILTER_ENABLED) and an estimate of the bytes saved is reported in result["network"].
+    While waiting for research results a watchdog fails the run within seconds on a login
+    wall, captcha, quota or error banner, a stalled or crashed page (result["failure_reason"]);
+    result["retryable"] marks the reasons worth an immediate retry.
+    The final Airtable update goes through the batched, rate-limited `airtable_writer`.
+    Progress goes to `job_log` (a bounded JobLog; one is created if not given) and the
+    result carries only its compact tail.
+    Each of `follow_up_queries` (phase 2) is asked in the same conversation and page once
+    the base report (phase 1) is extracted; their answers are joined in result["follow_up_content"].
+    `on_phase_complete` (async (phase, content)) is awaited as soon as "phase_1" / "phase_2"
+    finishes, so callers can persist each phase before the next one runs.
+    Text the page adds during each research wait is passed to `on_progress(text)` as it
+    appears (throttled snapshots); a failed run returns the last one as result["partial_content"].
+    `base_content` is a phase 1 report saved by an earlier attempt: the base research is then
+    skipped and the follow-up queries go to a new conversation, the first one carrying the
+    saved report as context (RESUME_CONTEXT_TEMPLATE).
     """
-    logs = []
-    def log_and_print(message):
-        print(message) # Print to local terminal
-        logs.append(message) # Append for browser logs
+    job_log = job_log or JobLog(airtable_record_id or uuid.uuid4().hex[:12])
+    log_and_print = job_log.info
 
     log_and_print("Iniciando run_genspark_interaction...")
+    run_start = time.perf_counter()
     analysis_markdown = None
+    follow_up_content = None
     success = False
+    failure_reason = None # Classified cause when success is False (exported as a metric label)
 
-    # Load credentials securely
-    email = os.getenv("GENSPARK_EMAIL")
-    password = os.getenv("GENSPARK_PASSWORD")
+    # Load credentials securely (accounts are leased from the pool below)
+    credentials = credential_pool or get_credential_pool()
     login_url = os.getenv("GENSPARK_LOGIN_URL") # Make sure this is in your .env
 
-    if not email or not password or not login_url:
-        log_and_print("Error CRÍTICO: Faltan credenciales de Genspark o URL de login en el archivo .env")
-        return {"success": False, "content": None, "logs": logs}
-    log_and_print("Credenciales de Genspark y URL cargadas.")
+    if not credentials.accounts or not login_url:
+        job_log.error("Error CRÍTICO: Faltan credenciales de Genspark o URL de login en el archivo .env")
+        observe_run([], "failure", "missing_credentials")
+        return {"success": False, "content": None, "logs": job_log.tail(), "timings": [], "failure_reason": "missing_credentials"}
+    log_and_print(f"Pool de credenciales de Genspark cargado ({len(credentials.accounts)} cuentas) y URL.")
 
     # --- Long Query (NO MODIFICAR) ---
     long_query = f"""
@@ -81,328 +603,224 @@ El estudio que hagas debe responder cada una de estas preguntas:
 
     log_and_print("Query larga preparada.")
 
-    async with async_playwright() as p:
-        browser = None
-        log_and_print("Inicializando Playwright...")
-        try:
-            # --- Stealth Options --- 
-            # Define a common user agent string
-            user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-            log_and_print(f"Usando User-Agent: {user_agent}")
-            # Script to disable webdriver flag
-            stealth_script = "Object.defineProperty(navigator, 'webdriver', {get: () => false})"
-            log_and_print("Script para ocultar 'navigator.webdriver' preparado.")
-            
-            # --- Launch Browser (Headless as Intended) ---
-            log_and_print("Lanzando navegador Chromium (MODO HEADLESS)...")
-            # browser = await p.chromium.launch(headless=False) # Keep commented unless debugging visually
-            browser = await p.chromium.launch(headless=True, args=['--no-sandbox']) # <-- Use headless=True
-            log_and_print("Navegador lanzado exitosamente (headless).")
-            
-            # --- Create Context with Stealth Options ---
-            log_and_print("Creando contexto del navegador con User-Agent modificado...")
-            context = await browser.new_context(user_agent=user_agent)
-            log_and_print("Contexto creado.")
+    # --- Stealth Options --- 
+    # Define a common user agent string
+    user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    log_and_print(f"Usando User-Agent: {user_agent}")
+    # Script to disable webdriver flag
+    stealth_script = "Object.defineProperty(navigator, 'webdriver', {get: () => false})"
+    log_and_print("Script para ocultar 'navigator.webdriver' preparado.")
+
+    # --- Warm Browser Pool (replaces per-job Chromium launch) ---
+    pool = browser_pool or get_browser_pool()
+    sessions = session_cache or get_session_cache()
+    timings = [] # Per-step wall-clock durations, returned with the result
+    flow_state = None
+    page = None
+    account = None
+    network_stats = None
+    progress = ProgressCapture(job_log, on_progress) if PROGRESS_CAPTURE_ENABLED else None
+    try:
+        log_and_print("Solicitando una cuenta de Genspark al pool de credenciales...")
+        account = await credentials.acquire(timeout=GENSPARK_ACCOUNT_LEASE_TIMEOUT)
+        email, password = account.email, account.password
+        storage_state = sessions.load(email)
+        log_and_print(f"Cuenta asignada: {email} ({'sesión en caché' if storage_state else 'sin sesión en caché'}).")
+
+        log_and_print("Solicitando contexto aislado al pool de navegadores...")
+        async with pool.context(user_agent=user_agent, storage_state=storage_state) as context:
+            log_and_print(f"Contexto creado ({pool.browser_count} navegadores en el pool).")
+
+            # --- Network Request Filtering (skip fonts, media, trackers, unrelated images) ---
+            if request_filter is not None or REQUEST_FILTER_ENABLED:
+                network_stats = await (request_filter or RequestFilter()).attach(context)
+                log_and_print("Filtro de peticiones de red activado.")
             
-            # Grant clipboard permissions proactively
+            # Grant clipboard permissions proactively (used only by the extraction fallback)
             try:
                 await context.grant_permissions(['clipboard-read', 'clipboard-write'])
                 log_and_print("Permisos de portapapeles solicitados.")
             except Exception as perm_error:
-                 log_and_print(f"Advertencia: No se pudieron establecer permisos de portapapeles (puede fallar la copia): {perm_error}")
+                 job_log.warning(f"Advertencia: No se pudieron establecer permisos de portapapeles (puede fallar la copia): {perm_error}")
 
             page = await context.new_page()
             page.set_default_timeout(900000) # 15 minutes global timeout
             log_and_print("Nueva página creada y timeout global establecido (15 min).")
+            if progress:
+                await progress.attach(page)
 
             # --- Apply Stealth Script --- 
             log_and_print("Añadiendo script de inicialización para ocultar 'navigator.webdriver'...")
             await page.add_init_script(stealth_script)
             log_and_print("Script añadido.")
 
-            # --- Navigate to Login URL --- 
-            log_and_print(f"Navegando a la URL de login: {login_url}")
-            await page.goto(login_url)
-            log_and_print("Navegación a URL de login completada.")
-
-            # --- First Login Sequence (New Flow) ---
-            log_and_print("[Flow 1] Localizando botón 'Login with email'...")
-            login_email_button_selector = 'button:has-text("Login with email")'
-            await page.locator(login_email_button_selector).wait_for(state="visible", timeout=30000)
-            log_and_print("[Flow 2] Haciendo clic en botón 'Login with email'...")
-            await page.locator(login_email_button_selector).click()
-
-            log_and_print("[Flow 3] Localizando input[type='email']...")
-            email_selector = "input[type='email']"
-            await page.locator(email_selector).wait_for(state="visible", timeout=15000)
-            log_and_print("[Flow 4] Rellenando input email...")
-            await page.locator(email_selector).fill(email)
-
-            log_and_print("[Flow 5] Localizando input[type='password']...")
-            password_selector = "input[type='password']"
-            await page.locator(password_selector).wait_for(state="visible", timeout=15000)
-            log_and_print("[Flow 6] Rellenando input password...")
-            await page.locator(password_selector).fill(password)
-
-            log_and_print("[Flow 7] Localizando #next...")
-            next_button_selector = "#next" # Keeping ID selector as specified
-            await page.locator(next_button_selector).wait_for(state="visible", timeout=15000)
-            log_and_print("[Flow 8] Haciendo clic en #next...")
-            await page.locator(next_button_selector).click()
-            log_and_print("Primer inicio de sesión enviado.")
-
-            log_and_print("[Flow 9] Esperando 3 segundos...")
-            await asyncio.sleep(3)
-
-            # --- Modal Interaction (New Flow) ---
-            log_and_print("[Flow 10] Buscando SVG dentro de .n-modal...")
-            modal_svg_selector = ".n-modal svg"
-            try:
-                await page.locator(modal_svg_selector).first.wait_for(state="visible", timeout=10000) # Shorter timeout, might not appear
-                log_and_print("[Flow 11] Haciendo clic en SVG del modal...")
-                await page.locator(modal_svg_selector).first.click()
-            except TimeoutError:
-                log_and_print("SVG en modal no encontrado o timeout (puede ser normal). Continuando...")
-
-            log_and_print("[Flow 12] Esperando 2 segundos...")
-            await asyncio.sleep(2)
-
-            # --- Send "Hola" (New Flow) ---
-            log_and_print("[Flow 13] Localizando textarea.search-input...")
-            chat_input_selector = "textarea.search-input"
-            await page.locator(chat_input_selector).wait_for(state="visible", timeout=30000)
-            log_and_print("[Flow 14] Escribiendo 'Hola'...")
-            await page.locator(chat_input_selector).fill("Hola")
-
-            log_and_print("[Flow 15] Localizando .enter-icon...")
-            send_button_selector = ".enter-icon"
-            await page.locator(send_button_selector).wait_for(state="visible", timeout=15000)
-            log_and_print("[Flow 16] Haciendo clic en .enter-icon...")
-            await page.locator(send_button_selector).click()
-            log_and_print("'Hola' enviado.")
-
-            log_and_print("[Flow 17] Esperando 5 segundos...")
-            await asyncio.sleep(5)
-
-            # --- Second Login Sequence (Attempt - New Flow) ---
-            log_and_print("--- Iniciando segundo intento de login (preventivo) ---")
-            try:
-                log_and_print("[Flow 18] Buscando botón 'Login with email' de nuevo...")
-                if await page.locator(login_email_button_selector).is_visible(timeout=5000):
-                    log_and_print("   Elemento encontrado. Haciendo clic...")
-                    await page.locator(login_email_button_selector).click()
-
-                    log_and_print("[Flow 20] Buscando input[type='email'] de nuevo...")
-                    if await page.locator(email_selector).is_visible(timeout=5000):
-                        log_and_print("[Flow 21]    Rellenando input email...")
-                        await page.locator(email_selector).fill(email)
-                    else:
-                        log_and_print("   input email no visible para segundo login.")
-
-                    log_and_print("[Flow 22] Buscando input[type='password'] de nuevo...")
-                    if await page.locator(password_selector).is_visible(timeout=5000):
-                         log_and_print("[Flow 23]   Rellenando input password...")
-                         await page.locator(password_selector).fill(password)
-                    else:
-                         log_and_print("   input password no visible para segundo login.")
-
-                    log_and_print("[Flow 24] Buscando #next de nuevo...")
-                    if await page.locator(next_button_selector).is_visible(timeout=5000):
-                         log_and_print("[Flow 25]   Haciendo clic en #next...")
-                         await page.locator(next_button_selector).click()
-                         log_and_print("   Segundo intento de login enviado.")
-                    else:
-                         log_and_print("   #next no visible para segundo login.")
-
-                    log_and_print("[Flow 26] Esperando 3 segundos post-segundo intento...")
-                    await asyncio.sleep(3)
+            # --- Reuse Cached Session (skips the login steps while it stays valid) ---
+            flow_state = {"session_reused": False, "completed": set(), "progress": progress}
+            if storage_state:
+                log_and_print("[Sesión] Sesión guardada encontrada. Verificando con sondeo rápido...")
+                await page.goto(DEEP_RESEARCH_URL)
+                flow_state["session_reused"] = await is_session_valid(page)
+                if flow_state["session_reused"]:
+                    log_and_print("[Sesión] Sesión válida. Omitiendo la secuencia completa de login.")
                 else:
-                     log_and_print("   Botón 'Login with email' no encontrado, asumiendo que ya estamos logueados.")
-
-            except Exception as e:
-                log_and_print(f"   Excepción durante el segundo intento de login (ignorado): {e}")
-            log_and_print("--- Fin del segundo intento de login ---")
-
-            log_and_print("[Flow 27] Esperando 5 segundos adicionales...")
-            await asyncio.sleep(5)
-
-            # --- Navigate Directly to Deep Research Agent (Replaces old 28-30) ---
-            deep_research_url = "https://www.genspark.ai/agents?type=agentic_deep_research"
-            log_and_print(f"[Flow 28] Navegando directamente a: {deep_research_url}")
-            await page.goto(deep_research_url)
-            log_and_print("   Navegación a Deep Research completada.")
-
-            log_and_print("[Flow 29] Esperando 3 segundos...")
-            await asyncio.sleep(3)
-
-            # --- Continue with sending query (Old step 31 is now 30) ---
-            log_and_print("[Flow 30 - antes 31] Localizando textarea.search-input para query larga...")
-            await page.locator(chat_input_selector).wait_for(state="visible", timeout=30000)
-            log_and_print("[Flow 31 - antes 32] Escribiendo query larga...")
-            await page.locator(chat_input_selector).fill(long_query)
-
-            log_and_print("[Flow 32 - antes 33] Localizando .enter-icon para query larga...")
-            await page.locator(send_button_selector).wait_for(state="visible", timeout=15000)
-            log_and_print("[Flow 33 - antes 34] Haciendo clic en .enter-icon para enviar query...")
-            await page.locator(send_button_selector).click()
-            log_and_print("Query larga enviada.")
-
-            # --- Wait for Image Element in DOM (Replaces Network Wait - New 34) ---
-            max_wait_time = 900 # seconds (15 minutes)
-            poll_interval = 30 # seconds
-            start_time = time.time()
-            image_found = False
-            img_selector = "img" # Base selector
-            target_src_substring = "spark_page"
-
-            log_and_print(f"[Flow 34] Iniciando sondeo del DOM cada {poll_interval}s buscando '{img_selector}[src*=\"{target_src_substring}\"]' (max {max_wait_time}s)...")
-
-            while time.time() - start_time < max_wait_time:
-                # Find all image elements currently in the DOM
-                all_images = page.locator(img_selector)
-                count = await all_images.count()
-                found_matching_image = False
-                if count > 0:
-                    log_and_print(f"   Encontrados {count} elementos '{img_selector}'. Verificando atributo src...")
-                    for i in range(count):
-                        img = all_images.nth(i)
-                        try:
-                            src = await img.get_attribute("src")
-                            if src and target_src_substring in src:
-                                log_and_print(f"   ¡Imagen encontrada con '{target_src_substring}' en src!: {src}")
-                                image_found = True
-                                found_matching_image = True
-                                break # Exit the inner for loop
-                        except Exception as e:
-                            # Log error getting attribute but continue checking other images
-                            log_and_print(f"    Advertencia: Error obteniendo src de imagen {i}: {e}")
-                    if found_matching_image:
-                        break # Exit the outer while loop
-                        
-                if not image_found:
-                    log_and_print(f"   Imagen con '{target_src_substring}' en src no encontrada. Esperando {poll_interval}s para volver a sondear...")
-                    await asyncio.sleep(poll_interval)
-
-            if not image_found:
-                log_and_print(f"   TIMEOUT: No se encontró ningún elemento '{img_selector}' con '{target_src_substring}' en src después de {max_wait_time}s.")
-                raise TimeoutError(f"No se encontró un elemento '{img_selector}' con '{target_src_substring}' en src dentro del tiempo límite.")
-
-            # --- Wait after finding image (New 35) ---
-            log_and_print("[Flow 35] Imagen encontrada. Esperando 5 segundos adicionales...")
-            await asyncio.sleep(5)
-
-            # --- Copy Result (Old 37/38 is now 36/37) ---
-            log_and_print("[Flow 36] Buscando el penúltimo elemento con CLASE .buttons...")
-            buttons_selector = ".buttons" # Confirming: Using class selector
-            # --- ADDED: Explicit wait for the buttons AFTER the image wait ---
-            log_and_print("   Esperando explícitamente a que aparezcan los elementos con CLASE .buttons (Timeout: 60s)...")
+                    log_and_print("[Sesión] Sesión expirada. Se hará login completo.")
+                    sessions.invalidate(email)
+                    await context.clear_cookies()
+
+            # --- Run the declarative flow ---
+            steps = build_genspark_steps(email, password, login_url, long_query, sessions, log_and_print)
+            if base_content:
+                # Phase 1 is already saved: only log in and open a new deep research conversation.
+                steps = [step for step in steps if step.phase == "login" or step.name == "deep_research"]
             try:
-                # Wait for the *last* group of buttons (identified by class) to be visible
-                await page.locator(buttons_selector).last.wait_for(state="visible", timeout=60000)
-                log_and_print("   Al menos un elemento con CLASE .buttons está visible.")
-            except TimeoutError:
-                log_and_print(f"   TIMEOUT esperando a que los elementos con CLASE {buttons_selector} estén visibles.")
-                # Even if an image appeared, if buttons don't appear, it's an error
-                raise Exception(f"Los botones de copia (CLASE {buttons_selector}) no aparecieron después de encontrar una imagen.")
-
-            all_buttons_groups = page.locator(buttons_selector) # Using class selector
-            count = await all_buttons_groups.count()
-            log_and_print(f"   Encontrados {count} elementos con CLASE .buttons.")
-
-            if count >= 2:
-                copy_button_element = all_buttons_groups.nth(-2) # Penúltimo
-                log_and_print("[Flow 37] Haciendo clic en el penúltimo elemento con CLASE .buttons (botón de copiar)...")
-                # It's often better to click a specific button *inside* the container if possible
-                # Try finding a button or svg inside the target container first
-                try:
-                    copy_button_inner = copy_button_element.locator('button, svg').first
-                    await copy_button_inner.click(timeout=5000)
-                    log_and_print("   Clic en botón/svg interno realizado.")
-                except (TimeoutError, Exception):
-                    log_and_print("   No se encontró botón/svg interno, haciendo clic en el contenedor .buttons...")
-                    await copy_button_element.click() # Fallback to clicking the container
-
-                log_and_print("   Esperando acción de portapapeles...")
-                await asyncio.sleep(1.5) # Give a bit more time for clipboard action
-
-                log_and_print("   Leyendo contenido del portapapeles...")
-                # Ensure permissions were granted
-                clipboard_content = await page.evaluate('navigator.clipboard.readText()')
-                log_and_print(f"   Contenido crudo del portapapeles: {clipboard_content[:200]}...")
-
-                # Process clipboard content (find first #)
-                match = re.search(r'#.*', clipboard_content, re.DOTALL)
+                await run_steps(page, steps, flow_state, log_and_print, timings)
+            except Exception:
+                if await page_shows_quota(page):
+                    flow_state["quota"] = True
+                elif not flow_state["session_reused"] and timings and timings[-1]["phase"] in ("login", "query"):
+                    submitted = "next" in flow_state["completed"]
+                    flow_state["login_rejected"] = await page_shows_login_rejection(page, submitted)
+                raise
+
+            if base_content:
+                analysis_markdown = base_content
+                success = True
+                log_and_print("[Fase 1] Reanudando con el análisis base guardado en un intento anterior.")
+            else:
+                report_content = flow_state.get("report_content") or ""
+                report_source = flow_state.get("report_source", "clipboard")
+                job_log.debug(f"   Contenido crudo ({report_source}): {report_content[:200]}...")
+
+                # Process report content (find first #)
+                match = re.search(r'#.*', report_content, re.DOTALL)
                 if match:
                     analysis_markdown = match.group(0).strip()
                     log_and_print("   Contenido procesado (desde '#').")
                     success = True
-                elif clipboard_content: # Use raw content if '#' not found but content exists
-                     log_and_print("   ADVERTENCIA: No se encontró '#' en el portapapeles. Usando contenido crudo.")
-                     analysis_markdown = clipboard_content.strip()
+                elif report_content: # Use raw content if '#' not found but content exists
+                     job_log.warning(f"   ADVERTENCIA: No se encontró '#' en el contenido ({report_source}). Usando contenido crudo.")
+                     analysis_markdown = report_content.strip()
                      success = True # Still consider success if we got something
                 else:
-                    log_and_print("   ERROR: No se pudo leer contenido del portapapeles o estaba vacío.")
-                    success = False # Mark as failure if clipboard is empty or unreadable
-
-            else:
-                log_and_print(f"   ERROR: No se encontraron suficientes ({count}) elementos con CLASE '.buttons' para hacer clic en el penúltimo.")
-                success = False # Mark as failure if we couldn't find the button
-
-        except TimeoutError as e:
-            log_and_print(f"Error de TIMEOUT durante la automatización: {e}")
-            log_and_print(f"   URL actual: {page.url if 'page' in locals() and page else 'N/A'}")
-            log_and_print(f"   Traceback: {traceback.format_exc()}")
-            success = False
-        except Exception as e:
-            log_and_print(f"Error EXCEPCIÓN GENERAL durante la automatización: {e}")
-            log_and_print(f"   Traceback: {traceback.format_exc()}")
-            success = False
-        finally:
-            # --- Browser Cleanup ---
-            log_and_print("Bloque finally alcanzado. Intentando cerrar el navegador si existe...")
-            if browser:
+                    job_log.error("   ERROR: No se pudo extraer el reporte del DOM ni del portapapeles.")
+                    success = False # Mark as failure if the report could not be read
+                    failure_reason = "empty_report"
+
+                if success and on_phase_complete:
+                    await on_phase_complete("phase_1", analysis_markdown)
+
+            # --- Phase 2: follow-up queries in the same conversation (no new login or page) ---
+            if success and follow_up_queries:
+                log_and_print(f"[Fase 2] {len(follow_up_queries)} consultas de seguimiento en la misma conversación...")
+                queries = list(follow_up_queries)
+                if base_content: # New conversation: the first follow-up carries the saved base report
+                    queries[0] = RESUME_CONTEXT_TEMPLATE.format(base_content=base_content, query=queries[0])
+                follow_up_steps = [step for i, q in enumerate(queries) for step in build_follow_up_steps(i, q, log_and_print)]
                 try:
-                    if browser.is_connected():
-                        log_and_print("   Cerrando navegador...")
-                        await browser.close()
-                        log_and_print("   Navegador cerrado.")
-                    else:
-                        log_and_print("   El navegador no estaba conectado (no se necesita cerrar).")
-                except Exception as close_err:
-                    log_and_print(f"   Error durante el cierre del navegador: {close_err}")
-            else:
-                log_and_print("   La variable 'browser' era None (probablemente falló el lanzamiento inicial).")
+                    await run_steps(page, follow_up_steps, flow_state, log_and_print, timings)
+                except Exception:
+                    if await page_shows_quota(page):
+                        flow_state["quota"] = True
+                    raise
+                answers = [flow_state.get("follow_ups", {}).get(i) for i in range(len(follow_up_queries))]
+                if all(answers):
+                    follow_up_content = "\n\n".join(answers)
+                    if on_phase_complete:
+                        await on_phase_complete("phase_2", follow_up_content)
+                else:
+                    job_log.error("   ERROR: Alguna respuesta de seguimiento llegó vacía.")
+                    success = False
+                    failure_reason = "empty_follow_up"
+
+    except NoAccountAvailable as e:
+        job_log.error(f"Error: {e}")
+        success = False
+        failure_reason = "no_account"
+    except ResearchAborted as e:
+        job_log.error(f"Watchdog: {e} (motivo: {e.reason}, URL actual: {page.url if page and not page.is_closed() else 'N/A'})")
+        success = False
+        failure_reason = e.reason
+        if e.reason == "login_wall" and account is not None:
+            sessions.invalidate(account.email) # The cached session no longer logs in
+    except timeout_errors() as e:
+        job_log.error(f"Error de TIMEOUT durante la automatización: {e} (URL actual: {page.url if page else 'N/A'})", detail=traceback.format_exc())
+        success = False
+        failure_reason = "timeout"
+    except Exception as e:
+        job_log.error(f"Error EXCEPCIÓN GENERAL durante la automatización: {e}", detail=traceback.format_exc())
+        success = False
+        failure_reason = type(e).__name__
+    finally:
+        # --- Context Cleanup (the browser itself stays warm in the pool) ---
+        log_and_print("Bloque finally alcanzado. Contexto cerrado y devuelto al pool.")
+        # --- Account Rotation ---
+        if account is not None:
+            if flow_state and flow_state.get("quota"):
+                failure_reason = "quota"
+            elif flow_state and flow_state.get("login_rejected"):
+                failure_reason = "login_failed" # A plain timeout while logging in stays "timeout"
+            if failure_reason in ACCOUNT_FAILURE_REASONS:
+                job_log.warning(f"Cuenta {account.email} retirada temporalmente de la rotación ({failure_reason}).")
+                await credentials.report_failure(account, failure_reason)
+            await credentials.release(account, success=success)
+        if network_stats:
+            log_and_print(f"Red: {network_stats.summary()}.")
+        if timings:
+            log_and_print("Tiempos por paso: " + ", ".join(f"{t['step']}={t['seconds']:.2f}s" for t in timings if t["status"] != "skipped"))
 
     # --- Airtable Update (Old 39 is now 38) ---
     log_and_print("--- Iniciando actualización de Airtable (si aplica) ---")
+    writer = airtable_writer or get_airtable_writer()
     if airtable_record_id:
-        if success and analysis_markdown:
+        if analysis_markdown: # The base report is kept even if a follow-up (phase 2) failed
             try:
                 log_and_print(f"[Flow 38] Actualizando Airtable record {airtable_record_id} con 'Analisis'...")
-                table.update(airtable_record_id, {'Analisis': analysis_markdown})
+                airtable_start = time.perf_counter()
+                await writer.update(airtable_record_id, {'Analisis': analysis_markdown})
+                PHASE_SECONDS.labels(phase="airtable").observe(time.perf_counter() - airtable_start)
                 log_and_print("   Actualización de Airtable exitosa.")
             except Exception as e:
-                log_and_print(f"   ERROR al actualizar Airtable (éxito): {e}")
+                job_log.error(f"   ERROR al actualizar Airtable (éxito): {e}")
         elif not success:
             try:
                 log_and_print(f"[Flow 38 - Fallo] Proceso de automatización falló.")
-                # error_details = "\n".join(logs[-5:]) # Get last 5 log messages
+                # error_details = "\n".join(e["message"] for e in job_log.tail(5)) # Get last 5 log messages
                 # Consider adding an 'Error Details' field to Airtable and updating it here
                 # table.update(airtable_record_id, {'Status': 'Error', 'Error Details': error_details})
                 log_and_print("   (No se actualizó ningún campo de error en Airtable para evitar fallos).")
             except Exception as e:
-                log_and_print(f"   ERROR al intentar marcar Airtable como Error: {e}")
+                job_log.error(f"   ERROR al intentar marcar Airtable como Error: {e}")
     else:
          log_and_print("   No hay record_id de Airtable, omitiendo actualización.")
 
+    # --- Metrics ---
+    query_sent_at = flow_state.get("query_sent_at") if flow_state else None
+    observe_run(
+        timings,
+        "success" if success else ("timeout" if failure_reason == "timeout" else "failure"),
+        failure_reason,
+        time_to_query=(query_sent_at - run_start) if query_sent_at else None,
+        total=time.perf_counter() - run_start,
+    )
+
     log_and_print("Fin de run_genspark_interaction.")
-    return {"success": success, "content": analysis_markdown, "logs": logs}
+    return {
+        "success": success,
+        "content": analysis_markdown,
+        "follow_up_content": follow_up_content,
+        "logs": job_log.tail(),
+        "timings": timings,
+        "failure_reason": failure_reason,
+        "retryable": failure_reason in RETRYABLE_FAILURE_REASONS,
+        "partial_content": (progress.text or None) if progress and not success else None,
+        "network": network_stats.to_dict() if network_stats else None,
+    }
 
 # --- Airtable Helper Functions (Keep create_airtable_record as is) ---
 def create_airtable_record(empresa, pais, consideraciones):
     """Creates an initial Airtable record and returns its ID and an error message if applicable."""
     try:
-        record = table.create({
+        record = get_airtable_table().create({
             'Empresa': empresa,
             'Pais': pais,
             'Consideraciones': consideraciones
@@ -415,6 +833,32 @@ def create_airtable_record(empresa, pais, consideraciones):
         error_message = f"Error de Airtable al crear registro: {e}"
         return None, error_message
 
+# --- Async Airtable Access (batched, rate-limited, never blocks the event loop) ---
+_airtable_writer = None
+
+def get_airtable_writer():
+    """Returns the process-wide AirtableWriter for the configured table (connected on its first write)."""
+    global _airtable_writer
+    if _airtable_writer is None:
+        _airtable_writer = AirtableWriter(get_airtable_table)
+    return _airtable_writer
+
+async def create_airtable_record_async(empresa, pais, consideraciones, airtable_writer=None):
+    """Async counterpart of create_airtable_record, queued through the AirtableWriter."""
+    writer = airtable_writer or get_airtable_writer()
+    try:
+        record_id = await writer.create({
+            'Empresa': empresa,
+            'Pais': pais,
+            'Consideraciones': consideraciones
+        })
+        print(f"Created Airtable record {record_id}")
+        return record_id, None
+    except Exception as e:
+        print(f"Error creating Airtable record: {e}")
+        error_message = f"Error de Airtable al crear registro: {e}"
+        return None, error_message
+
 # Example usage (for testing script directly)
 # if __name__ == "__main__":
 #     test_empresa = "Bimbo"
@@ -427,5 +871,5 @@ def create_airtable_record(empresa, pais, consideraciones):
 #         print(f"Success: {result['success']}")
 #         print(f"Content (first 200 chars): {result.get('content', '')[:200]}...")
 #         print("\n--- LOGS ---")
-#         for log_msg in result.get('logs', []):
-#              print(log_msg)
+#         for entry in result.get('logs', []):
+#              print(entry['level'], entry['message'])
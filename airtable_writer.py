@@ -0,0 +1,206 @@
+import asyncio
+import os
+import random
+import time
+
+from metrics import AIRTABLE_REQUEST_SECONDS
+
+# --- Airtable Writer Configuration (overridable from .env) ---
+AIRTABLE_RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5")) # Airtable allows 5 requests/sec per base
+AIRTABLE_BATCH_SIZE = 10 # Airtable's maximum records per batch request
+AIRTABLE_BATCH_WINDOW = float(os.getenv("AIRTABLE_BATCH_WINDOW", "0.25")) # seconds to gather a batch
+AIRTABLE_MAX_RETRIES = int(os.getenv("AIRTABLE_MAX_RETRIES", "5"))
+AIRTABLE_MAX_BACKOFF = 30 # seconds
+
+
+class TokenBucket:
+    """Async token bucket: at most `rate` acquisitions per second, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_retryable(error):
+    """429s, 5xx and network errors are retried; other 4xx are not."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return True
+    return status == 429 or status >= 500
+
+
+class AirtableWriter:
+    """
+    Background Airtable writer. create()/update() enqueue an operation and await its result;
+    a single consumer task groups queued operations into batch_create/batch_update calls of up
+    to 10 records, paced by a token bucket and retried with exponential backoff.
+    Bound to the event loop it was started on; close() flushes everything still queued.
+    """
+
+    def __init__(self, table, rate=None, batch_size=AIRTABLE_BATCH_SIZE, batch_window=None):
+        self._table = table # A pyairtable Table, or a zero-argument factory called on the first write
+        self.rate = rate or AIRTABLE_RATE_LIMIT
+        self.batch_size = batch_size
+        self.batch_window = AIRTABLE_BATCH_WINDOW if batch_window is None else batch_window
+        self._queue = None
+        self._task = None
+        self._bucket = None
+
+    @property
+    def table(self):
+        if callable(self._table):
+            self._table = self._table()
+        return self._table
+
+    @property
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._bucket = TokenBucket(self.rate)
+            self._task = asyncio.create_task(self._run())
+
+    async def create(self, fields):
+        """Creates a record and returns its ID."""
+        return await self._submit("create", None, fields)
+
+    async def update(self, record_id, fields):
+        """Updates a record's fields."""
+        await self._submit("update", record_id, fields)
+
+    async def close(self):
+        """Flushes queued operations and stops the consumer task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _submit(self, kind, record_id, fields):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((kind, record_id, fields, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            op = await self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            # Give concurrent jobs a short window to add operations to this batch.
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size * 2:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    op = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+            await self._flush(batch)
+        # Drain anything enqueued after the shutdown sentinel.
+        leftover = []
+        while not self._queue.empty():
+            op = self._queue.get_nowait()
+            if op is not None:
+                leftover.append(op)
+        if leftover:
+            await self._flush(leftover)
+
+    async def _flush(self, batch):
+        creates = [op for op in batch if op[0] == "create"]
+        updates = [op for op in batch if op[0] == "update"]
+        for i in range(0, len(creates), self.batch_size):
+            await self._send_chunk(
+                "batch_create", creates[i:i + self.batch_size],
+                lambda op: op[2],
+                lambda op, record, error: self._settle([op[3]], record and record["id"], error),
+            )
+
+        # Merge several updates to the same record into one entry (later fields win).
+        merged = {}
+        for _, record_id, fields, future in updates:
+            entry = merged.setdefault(record_id, {"fields": {}, "futures": []})
+            entry["fields"].update(fields)
+            entry["futures"].append(future)
+        items = list(merged.items())
+        for i in range(0, len(items), self.batch_size):
+            await self._send_chunk(
+                "batch_update", items[i:i + self.batch_size],
+                lambda item: {"id": item[0], "fields": item[1]["fields"]},
+                lambda item, record, error: self._settle(item[1]["futures"], None, error),
+            )
+
+    async def _send_chunk(self, method, chunk, to_payload, resolve):
+        """
+        Sends one batch through the table's `method` and calls resolve(item, record, error)
+        for each item. Airtable rejects the whole batch for one invalid record (422 etc.),
+        so non-retryable errors are bisected until only the offending records fail.
+        """
+        try:
+            records = await self._send(getattr(self.table, method), [to_payload(item) for item in chunk])
+        except Exception as e:
+            if len(chunk) > 1 and not _is_retryable(e):
+                middle = len(chunk) // 2
+                await self._send_chunk(method, chunk[:middle], to_payload, resolve)
+                await self._send_chunk(method, chunk[middle:], to_payload, resolve)
+            else:
+                for item in chunk:
+                    resolve(item, None, e)
+            return
+        for item, record in zip(chunk, records or [None] * len(chunk)):
+            resolve(item, record, None)
+
+    @staticmethod
+    def _settle(futures, result, error):
+        for future in futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _send(self, method, payload):
+        """Calls a (blocking) pyairtable batch method off the loop, rate-limited and retried."""
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            start = time.perf_counter()
+            try:
+                result = await asyncio.to_thread(method, payload)
+                AIRTABLE_REQUEST_SECONDS.labels(operation=method.__name__, outcome="ok").observe(time.perf_counter() - start)
+                return result
+            except Exception as e:
+                AIRTABLE_REQUEST_SECONDS.labels(operation=method.__name__, outcome="error").observe(time.perf_counter() - start)
+                attempt += 1
+                if attempt > AIRTABLE_MAX_RETRIES or not _is_retryable(e):
+                    print(f"[AirtableWriter] Error definitivo tras {attempt} intentos: {e}")
+                    raise
+                backoff = min(AIRTABLE_MAX_BACKOFF, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2)
+                print(f"[AirtableWriter] Error de Airtable ({e}); reintento {attempt} en {backoff:.1f}s...")
+                await asyncio.sleep(backoff)
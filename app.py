@@ -1,23 +1,37 @@
 # filename: app.py
+"""
+Web front end, served as an ASGI app on one process-wide event loop:
+
+    uvicorn app:app --host 0.0.0.0 --port 5000
+
+Startup warms the shared browser pool and Airtable writer; shutdown stops taking jobs,
+drains the ones in flight (JOB_DRAIN_TIMEOUT) and then closes the shared resources.
+"""
 import asyncio
+import json
 import os
 import traceback
-# Remove direct Playwright imports if not used elsewhere in app.py
-# from playwright.async_api import async_playwright, TimeoutError 
 from dotenv import load_dotenv
-from pyairtable import Api
-from flask import Flask, render_template, request, jsonify
-import html # Import html module for escaping
-import markdown # Ensure markdown library is installed
 
-# ---> Import functions from airtable_agent <--- 
-from airtable_agent import run_genspark_interaction, create_airtable_record
+# --- Load Environment Variables (before the local modules, which read their configuration at import) ---
+load_dotenv() # Load variables from .env file
 
-# --- Flask App Setup ---
-app = Flask(__name__)
+from quart import Quart, Response, render_template, request, jsonify, send_from_directory
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-# --- Load Environment Variables ---
-load_dotenv() # Load variables from .env file
+# ---> Import functions from airtable_agent (no clients or browsers are created at import) <---
+from airtable_agent import get_airtable_writer
+from browser_pool import get_browser_pool
+from job_manager import JobManager, QueueSaturated, ShuttingDown
+from metrics import track_airtable_writer, track_browser_pool
+from report_renderer import RENDER_OUTPUT_DIR, get_report_renderer
+
+# --- Quart App Setup (Flask-compatible API, natively async) ---
+app = Quart(__name__)
+
+SSE_KEEPALIVE_SECONDS = 15 # Comment line sent on idle event streams so proxies keep them open
+# Served reports are third-party content: no scripts, frames or remote loads, only their inline CSS.
+REPORT_CSP = "default-src 'none'; style-src 'unsafe-inline'"
 
 # Genspark Credentials (kept here for potential direct use or moved to agent)
 email = os.getenv("GENSPARK_EMAIL")
@@ -42,26 +56,60 @@ if not airtable_api_key or not airtable_base_id:
 # The entire async def run_genspark_interaction(...) block is deleted.
 
 
-# --- Flask Routes --- 
+# --- Shared Resources on the Server Event Loop ---
+# Requests, the job runner, the warm browser pool and the Airtable writer all live on the
+# single loop the ASGI server runs, so concurrent requests share them directly.
+job_manager = None # Background job runner: /submit enqueues here and returns immediately.
+
+@app.before_serving
+async def start_agent_resources():
+    """Creates the job runner on the server loop and warms up the browsers and the Airtable writer."""
+    global job_manager
+    job_manager = JobManager(asyncio.get_running_loop())
+    track_browser_pool(get_browser_pool())
+    track_airtable_writer(get_airtable_writer())
+    get_airtable_writer().start()
+    try:
+        await get_browser_pool().start()
+    except Exception as e:
+        print(f"Error arrancando el pool de navegadores (se reintentará con el primer trabajo): {e}")
+
+@app.after_serving
+async def shutdown_agent_resources():
+    """Drains in-flight jobs, flushes pending Airtable writes and closes the warm browsers."""
+    if job_manager is not None:
+        await job_manager.drain()
+    try:
+        await get_airtable_writer().close()
+    except Exception as e:
+        print(f"Error vaciando la cola de Airtable: {e}")
+    try:
+        await get_browser_pool().close()
+    except Exception as e:
+        print(f"Error cerrando el pool de navegadores: {e}")
+    await asyncio.to_thread(get_report_renderer().close)
+
+
+# --- Routes --- 
 @app.route('/')
-def index():
+async def index():
     """Serves the main form page."""
     # Check credentials before rendering page
     if CREDENTIALS_ERROR:
          # You might want a dedicated error template
          return f"<h1>Error de Configuración</h1><p>{CREDENTIALS_ERROR}</p>", 500
-    return render_template('index.html')
+    return await render_template('index.html')
 
 @app.route('/submit', methods=['POST'])
 async def submit():
-    """Handles form submission, creates initial Airtable record, runs automation, updates record."""
+    """Handles form submission: enqueues the job (or reuses a cached/in-flight one) and returns its ID right away."""
     if CREDENTIALS_ERROR: # Check for Airtable credential errors
         return jsonify({"status": "error", "message": CREDENTIALS_ERROR, "logs": [CREDENTIALS_ERROR]}), 500
 
     if not request.is_json:
         return jsonify({"error": "Request must be JSON", "logs": ["Error: Request must be JSON"]}), 400
 
-    data = request.get_json()
+    data = await request.get_json()
     empresa = data.get('empresa')
     pais = data.get('pais')
     consideraciones = data.get('consideraciones')
@@ -72,81 +120,131 @@ async def submit():
     request_logs = [] # Initialize logs for this request
     request_logs.append(f"Recibida solicitud: Empresa={empresa}, Pais={pais}, Consideraciones={consideraciones}")
 
-    record_id = None # To store the ID of the initially created record
-    # Initialize response data for errors before interaction
-    response_data = {"status": "error", "message": "El proceso falló antes de la interacción.", "logs": request_logs}
-
     try:
-        # --- Step 1: Create Initial Airtable Record --- 
-        # Uses the imported create_airtable_record function
-        request_logs.append("Creando registro inicial en Airtable...")
-        record_id, airtable_error = create_airtable_record(empresa, pais, consideraciones)
-
-        if not record_id:
-             # Log the detailed error message returned by the function
-             log_msg = f"Error crítico al crear registro Airtable: {airtable_error}"
-             request_logs.append(log_msg)
-             response_data = {"status": "error", "message": airtable_error or "Error desconocido al crear registro inicial en Airtable.", "logs": request_logs}
-             return jsonify(response_data), 500
-        
-        # If successful, continue logging
-        request_logs.append(f"Registro inicial creado con ID: {record_id}")
-
-        # --- Step 2: Run Playwright Automation --- 
-        # Calls the imported run_genspark_interaction function
-        request_logs.append("Iniciando la interacción principal con Genspark...")
-        # Note: We don't need to pass email/password if the function reads them from os.getenv()
-        interaction_result = await run_genspark_interaction(
-            empresa, pais, consideraciones, record_id
-        )
-        
-        # Combine logs
-        backend_logs = interaction_result.get("logs", [])
-        all_logs = request_logs + backend_logs
-
-        # --- Step 3: Prepare Response based on interaction_result --- 
-        if interaction_result["success"]:
-            all_logs.append("Proceso completado exitosamente.") # Add final success log
-            response_data = {
-                "status": "success",
-                "message": "Generación de reporte finalizada.",
-                "analysis_markdown": interaction_result["content"],
-                "logs": all_logs
-            }
+        # --- Enqueue the Genspark run (progress is streamed via /jobs/<id>/events or polled via /jobs/<id>) ---
+        # The job creates the Airtable record itself, so cache hits and joined
+        # duplicates don't add rows.
+        # Clients are capped by address (behind a proxy, run uvicorn with --proxy-headers).
+        job, reused = job_manager.submit(empresa, pais, consideraciones, client=request.remote_addr)
+        if reused == "cache":
+            request_logs.append(f"Resultado en caché para esta solicitud (trabajo {job.id}).")
+        elif reused == "in_flight":
+            request_logs.append(f"Solicitud idéntica en curso; uniéndose al trabajo {job.id}.")
         else:
-            # Handle failure case from the agent
-            error_msg = "Error durante la generación del reporte." 
-            # Try to get more specific error from logs if available
-            if backend_logs:
-                 error_msg += f" Último log: {backend_logs[-1]}"
-            all_logs.append(f"El proceso falló: {error_msg}") # Add final failure log
-            response_data = {
-                "status": "error",
-                "message": error_msg,
-                "analysis_markdown": None,
-                "logs": all_logs
-            }
-            # Decide if 500 is appropriate for agent failure vs internal server error
-            return jsonify(response_data), 500 
-
-        return jsonify(response_data)
-
+            request_logs.append(f"Trabajo {job.id} encolado.")
+        response_data = {
+            "status": job.status,
+            "message": job.message,
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events",
+            "reused": reused,
+            "eta_seconds": job.eta_seconds,
+            "logs": request_logs,
+        }
+        return jsonify(response_data), 200 if job.finished else 202
+
+    except QueueSaturated as e:
+        request_logs.append(str(e))
+        response_data = {"status": "error", "message": str(e), "retry_after_seconds": e.retry_after, "logs": request_logs}
+        return jsonify(response_data), 429, {"Retry-After": str(e.retry_after)}
+    except ShuttingDown as e:
+        request_logs.append(str(e))
+        return jsonify({"status": "error", "message": str(e), "logs": request_logs}), 503
     except Exception as e:
         print(f"Error EXCEPCIÓN GENERAL en ruta /submit: {e}")
         print(traceback.format_exc())
-        error_prefix = f"(Record ID: {record_id}) " if record_id else ""
-        # Append exception to logs if possible
         request_logs.append(f"Error interno del servidor: {e}")
-        response_data = {"status": "error", "message": f"{error_prefix}Error interno del servidor: {e}", "logs": request_logs}
+        response_data = {"status": "error", "message": f"Error interno del servidor: {e}", "logs": request_logs}
         return jsonify(response_data), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """Returns the status, a compact tail of progress logs and (when finished) the analysis_markdown of a job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Trabajo {job_id} no encontrado."}), 404
+    since = request.args.get('since', type=int) # Only log entries newer than this seq
+    return jsonify(job.to_dict(since=since))
+
+def _sse(event, data, event_id=None):
+    """One Server-Sent Events frame."""
+    frame = f"event: {event}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+async def job_events(job_id):
+    """
+    Streams a job as Server-Sent Events: a "status" snapshot first (with the logs after
+    `since` / Last-Event-ID), then "log" entries, "progress" text and "status" changes
+    until the job finishes. Event ids are log seqs, so a reconnecting EventSource resumes.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Trabajo {job_id} no encontrado."}), 404
+    since = request.args.get('since', type=int)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+
+    async def stream():
+        events = job.subscribe() # Before the snapshot, so nothing falls in between
+        try:
+            snapshot = job.to_dict(since=since)
+            last_seq = snapshot["logs"][-1]["seq"] if snapshot["logs"] else since
+            yield _sse("status", snapshot, last_seq)
+            if job.finished:
+                return
+            if job.partial_output:
+                yield _sse("progress", job.partial_output)
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(events.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event == "log":
+                    if last_seq is not None and data["seq"] <= last_seq:
+                        continue # Already in the snapshot
+                    yield _sse("log", data, data["seq"])
+                else:
+                    yield _sse(event, data)
+                    if event == "status" and data["status"] in ("completed", "failed"):
+                        return
+        finally:
+            job.unsubscribe(events)
+
+    response = Response(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no" # Don't let nginx buffer the stream
+    response.timeout = None # Jobs outlive Quart's default response timeout
+    return response
+
+@app.route('/reports/<path:filename>', methods=['GET'])
+async def report_file(filename):
+    """Serves a rendered report (HTML/PDF/DOCX, named by the sha256 of its Markdown)."""
+    is_html = filename.endswith(".html")
+    response = await send_from_directory(os.path.abspath(RENDER_OUTPUT_DIR), filename, as_attachment=not is_html)
+    if is_html:
+        response.headers["Content-Security-Policy"] = REPORT_CSP
+    return response
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Prometheus scrape endpoint (phase latencies, outcomes, browsers, pending jobs)."""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
 # --- Main Execution ---
 if __name__ == "__main__":
-    # Note: Flask's default development server is not ideal for production
-    # or heavy async tasks. Consider using a proper ASGI server like uvicorn or hypercorn.
-    print("Starting Flask app...")
+    import uvicorn
+
+    # A single uvicorn worker = one event loop sharing the browser pool across requests.
+    # Scale out with more processes (each gets its own pool), e.g. `uvicorn app:app --workers 2`.
+    print("Starting Kenmei ASGI app...")
     if CREDENTIALS_ERROR:
         print("\n !!! WARNING: AIRTABLE CREDENTIALS ARE MISSING OR INCORRECT IN .env FILE !!!")
-        print(" !!! FLASK WILL RUN, BUT SUBMISSIONS WILL FAIL. !!!\n")
+        print(" !!! THE SERVER WILL RUN, BUT SUBMISSIONS WILL FAIL. !!!\n")
     print("Access the agent at http://127.0.0.1:5000")
-    app.run(debug=True) # debug=True helps with development, remove for production 
\ No newline at end of file
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
\ No newline at end of file
@@ -0,0 +1,180 @@
+# filename: batch_run.py
+"""
+Batch mode: runs the Genspark analysis for every row of a CSV or JSONL file.
+
+Each input row needs `empresa`, `pais` and `consideraciones`. Results are written to disk
+(one Markdown file per row plus results.jsonl) and to Airtable as each row finishes. A
+checkpoint file records finished rows, so re-running the same command resumes where an
+interrupted batch stopped.
+
+    python batch_run.py empresas.csv --concurrency 4 --output-dir batch_output
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import re
+import time
+
+from dotenv import load_dotenv
+
+# Load .env before importing local modules that read their configuration at import time.
+load_dotenv()
+
+from airtable_agent import create_airtable_record_async, get_airtable_writer, run_genspark_interaction
+from browser_pool import BROWSER_CONTEXTS_PER_BROWSER, BrowserPool
+from result_cache import get_result_cache, make_cache_key
+
+REQUIRED_FIELDS = ("empresa", "pais", "consideraciones")
+
+
+def load_rows(path):
+    """
+    Reads input rows from a .csv or .jsonl/.json-lines file. Required fields are returned as
+    stripped strings (JSON numbers or booleans are converted; objects and lists are rejected).
+    """
+    rows = []
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = [dict(row) for row in csv.DictReader(f)]
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"Fila {index + 1}: se esperaba un objeto JSON")
+        invalid = [field for field in REQUIRED_FIELDS if isinstance(row.get(field), (dict, list))]
+        if invalid:
+            raise ValueError(f"Fila {index + 1}: valores no válidos en {', '.join(invalid)}")
+        for field in REQUIRED_FIELDS:
+            row[field] = "" if row.get(field) is None else str(row[field]).strip()
+        missing = [field for field in REQUIRED_FIELDS if not row[field]]
+        if missing:
+            raise ValueError(f"Fila {index + 1}: faltan campos {', '.join(missing)}")
+    return rows
+
+
+def load_checkpoint(path):
+    """Returns the keys of rows already completed in a previous run."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get("status") == "completed":
+                        done.add(entry["key"])
+    return done
+
+
+def append_jsonl(path, entry):
+    """Appends one JSON line and forces it to disk so progress survives a crash."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:40] or "empresa"
+
+
+async def run_row(index, row, args, pool, cache, checkpoint_path, results_path):
+    """Runs one row end to end and records it in results.jsonl and the checkpoint."""
+    empresa, pais, consideraciones = (row[field] for field in REQUIRED_FIELDS) # Normalized by load_rows
+    key = make_cache_key(empresa, pais, consideraciones)
+    start = time.perf_counter()
+    entry = {"key": key, "row": index + 1, "empresa": empresa, "pais": pais}
+
+    cached = cache.get(key)
+    if cached is not None:
+        content, record_id, success = cached["content"], cached["airtable_record_id"], True
+        entry["cached"] = True
+    else:
+        record_id = None
+        if not args.no_airtable:
+            record_id, airtable_error = await create_airtable_record_async(empresa, pais, consideraciones)
+            if not record_id:
+                print(f"   Fila {index + 1}: {airtable_error}")
+        result = await run_genspark_interaction(empresa, pais, consideraciones, record_id, browser_pool=pool)
+        content, success = result["content"], result["success"]
+        entry["timings"] = result.get("timings", [])
+        entry["network"] = result.get("network")
+        if success:
+            cache.put(key, content, record_id)
+
+    entry["latency"] = round(time.perf_counter() - start, 3)
+    entry["status"] = "completed" if success else "failed"
+    entry["airtable_record_id"] = record_id
+    if success:
+        output_file = os.path.join(args.output_dir, f"{index + 1:04d}_{_slug(empresa)}.md")
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(content)
+        entry["output_file"] = output_file
+    append_jsonl(results_path, entry)
+    append_jsonl(checkpoint_path, {"key": key, "row": index + 1, "status": entry["status"]})
+    print(f"[Batch] Fila {index + 1} ({empresa}): {entry['status']} en {entry['latency']:.1f}s")
+    return entry
+
+
+async def run_batch(args):
+    rows = load_rows(args.input)
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint_path = args.checkpoint or os.path.join(args.output_dir, "checkpoint.jsonl")
+    results_path = os.path.join(args.output_dir, "results.jsonl")
+
+    done = load_checkpoint(checkpoint_path)
+    pending = [(i, row) for i, row in enumerate(rows)
+               if make_cache_key(*(row[f] for f in REQUIRED_FIELDS)) not in done]
+    print(f"[Batch] {len(rows)} filas, {len(rows) - len(pending)} ya completadas, {len(pending)} pendientes.")
+    if not pending:
+        return
+
+    pool = BrowserPool(size=max(1, math.ceil(args.concurrency / BROWSER_CONTEXTS_PER_BROWSER)))
+    cache = get_result_cache()
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(index, row):
+        async with slots:
+            try:
+                return await run_row(index, row, args, pool, cache, checkpoint_path, results_path)
+            except Exception as e:
+                print(f"[Batch] Fila {index + 1}: Error EXCEPCIÓN GENERAL: {e}")
+                return {"status": "failed", "latency": None}
+
+    batch_start = time.perf_counter()
+    try:
+        entries = await asyncio.gather(*(bounded(i, row) for i, row in pending))
+    finally:
+        await get_airtable_writer().close()
+        await pool.close()
+    elapsed = time.perf_counter() - batch_start
+
+    # --- Summary: throughput and latency percentiles ---
+    completed = [e for e in entries if e["status"] == "completed"]
+    latencies = [e["latency"] for e in entries if e.get("latency") is not None]
+    print("\n--- RESUMEN DEL LOTE ---")
+    print(f"Completadas: {len(completed)}/{len(entries)} en {elapsed:.1f}s")
+    print(f"Throughput: {len(completed) / elapsed * 3600:.1f} reportes/hora")
+    if latencies:
+        print("Latencia: " + ", ".join(f"p{p}={percentile(latencies, p):.1f}s" for p in (50, 90, 95, 99))
+              + f", max={max(latencies):.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kenmei: análisis en lote desde CSV/JSONL.")
+    parser.add_argument("input", help="Archivo .csv o .jsonl con columnas empresa, pais, consideraciones.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Análisis simultáneos (default: 2).")
+    parser.add_argument("--output-dir", default="batch_output", help="Directorio de resultados (default: batch_output).")
+    parser.add_argument("--checkpoint", help="Archivo de checkpoint (default: <output-dir>/checkpoint.jsonl).")
+    parser.add_argument("--no-airtable", action="store_true", help="No crear registros en Airtable.")
+    asyncio.run(run_batch(parser.parse_args()))
@@ -0,0 +1,178 @@
+# filename: benchmark.py
+"""
+End-to-end benchmark of run_genspark_interaction against the local fake Genspark server.
+
+Starts fake_genspark.py in-process, fakes Airtable (configurable latency), runs --jobs
+reports with --concurrency at a time through the real browser pool, credential pool and
+flow, and reports latency percentiles, throughput, peak RSS and peak browser count.
+
+    python benchmark.py --jobs 20 --concurrency 4 --research-delay 5
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+import psutil
+
+from fake_genspark import FakeGensparkConfig, start_fake_genspark
+
+RSS_SAMPLE_INTERVAL = 0.5 # seconds
+
+
+class FakeAirtableTable:
+    """Stands in for a pyairtable Table in AirtableWriter: sleeps `latency` per batch call."""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.calls = {"batch_create": 0, "batch_update": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock() # Called from worker threads (asyncio.to_thread)
+
+    def batch_create(self, records):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls["batch_create"] += 1
+            return [{"id": f"recBENCH{next(self._ids):06d}", "fields": fields} for fields in records]
+
+    def batch_update(self, records):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls["batch_update"] += 1
+        return records
+
+
+def _tree_rss_mb():
+    """RSS of this process plus every child (Playwright driver and Chromium processes)."""
+    total = 0
+    try:
+        root = psutil.Process()
+        for proc in [root] + root.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+    except psutil.Error:
+        pass
+    return total / (1024 * 1024)
+
+
+async def sample_resources(pool, peaks, stop):
+    """Tracks peak RSS and peak browser count until `stop` is set."""
+    while not stop.is_set():
+        peaks["rss_mb"] = max(peaks["rss_mb"], _tree_rss_mb())
+        peaks["browsers"] = max(peaks["browsers"], pool.browser_count)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_benchmark(args):
+    config = FakeGensparkConfig(
+        login_delay=args.login_delay, modal_delay=args.modal_delay, chat_delay=args.chat_delay,
+        research_delay=args.research_delay, jitter=args.jitter, relogin_prompt=not args.no_relogin_prompt,
+        error_rate=args.error_rate,
+    )
+    runner, base_url = await start_fake_genspark(config, port=args.port)
+    print(f"[Bench] Genspark falso en {base_url}")
+
+    # The agent modules read their configuration at import time, so point them at the
+    # fake server before importing them (Airtable goes through FakeAirtableTable below).
+    os.environ["GENSPARK_BASE_URL"] = base_url
+    os.environ["GENSPARK_LOGIN_URL"] = f"{base_url}/login"
+    from airtable_agent import create_airtable_record_async, run_genspark_interaction
+    from airtable_writer import AirtableWriter
+    from batch_run import percentile
+    from browser_pool import BrowserPool
+    from credential_pool import Account, CredentialPool
+    from session_cache import SessionCache
+
+    session_dir = tempfile.mkdtemp(prefix="kenmei_bench_sessions_")
+    accounts = [Account(f"bench{i}@example.com", "benchmark", max_concurrency=args.per_account)
+                for i in range(args.accounts or math.ceil(args.concurrency / args.per_account))]
+    sessions = SessionCache(session_dir)
+    credentials = CredentialPool(accounts, session_cache=sessions)
+    pool = BrowserPool(size=args.browsers, contexts_per_browser=math.ceil(args.concurrency / args.browsers))
+    fake_table = FakeAirtableTable(args.airtable_latency)
+    writer = AirtableWriter(fake_table)
+
+    peaks = {"rss_mb": _tree_rss_mb(), "browsers": 0}
+    stop = asyncio.Event()
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one_job(index):
+        async with slots:
+            start = time.perf_counter()
+            record_id, _ = await create_airtable_record_async(f"Empresa {index}", "Chile", "Benchmark", airtable_writer=writer)
+            result = await run_genspark_interaction(
+                f"Empresa {index}", "Chile", "Benchmark", record_id,
+                browser_pool=pool, session_cache=sessions, airtable_writer=writer, credential_pool=credentials,
+            )
+            latency = time.perf_counter() - start
+            print(f"[Bench] Trabajo {index + 1}/{args.jobs}: {'ok' if result['success'] else result['failure_reason']} en {latency:.1f}s")
+            return {"success": result["success"], "failure_reason": result["failure_reason"], "latency": latency}
+
+    await pool.start()
+    sampler = asyncio.create_task(sample_resources(pool, peaks, stop))
+    bench_start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(one_job(i) for i in range(args.jobs)))
+    finally:
+        elapsed = time.perf_counter() - bench_start
+        stop.set()
+        await sampler
+        await writer.close()
+        await pool.close()
+        await runner.cleanup()
+
+    latencies = [r["latency"] for r in results if r["success"]]
+    failures = {}
+    for r in results:
+        if not r["success"]:
+            failures[r["failure_reason"]] = failures.get(r["failure_reason"], 0) + 1
+    summary = {
+        "jobs": args.jobs,
+        "concurrency": args.concurrency,
+        "succeeded": len(latencies),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_min": round(len(latencies) / elapsed * 60, 2),
+        "latency_p50_s": round(percentile(latencies, 50), 2) if latencies else None,
+        "latency_p95_s": round(percentile(latencies, 95), 2) if latencies else None,
+        "peak_rss_mb": round(peaks["rss_mb"], 1),
+        "peak_browsers": peaks["browsers"],
+        "airtable_calls": dict(fake_table.calls),
+    }
+    print("\n--- RESUMEN DEL BENCHMARK ---")
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo contra el Genspark falso.")
+    parser.add_argument("--jobs", type=int, default=10, help="Trabajos a ejecutar (default: 10).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Trabajos simultáneos (default: 4).")
+    parser.add_argument("--browsers", type=int, default=2, help="Navegadores en el pool (default: 2).")
+    parser.add_argument("--accounts", type=int, default=0, help="Cuentas falsas (default: concurrencia / --per-account).")
+    parser.add_argument("--per-account", type=int, default=2, help="Concurrencia máxima por cuenta (default: 2).")
+    parser.add_argument("--port", type=int, default=0, help="Puerto del servidor falso (default: libre).")
+    parser.add_argument("--login-delay", type=float, default=FakeGensparkConfig.login_delay)
+    parser.add_argument("--modal-delay", type=float, default=FakeGensparkConfig.modal_delay)
+    parser.add_argument("--chat-delay", type=float, default=FakeGensparkConfig.chat_delay)
+    parser.add_argument("--research-delay", type=float, default=FakeGensparkConfig.research_delay)
+    parser.add_argument("--jitter", type=float, default=FakeGensparkConfig.jitter)
+    parser.add_argument("--no-relogin-prompt", action="store_true", help="El servidor falso no muestra el segundo login.")
+    parser.add_argument("--error-rate", type=float, default=FakeGensparkConfig.error_rate, help="Fracción de investigaciones que fallan con un aviso de error.")
+    parser.add_argument("--airtable-latency", type=float, default=0.2, help="Latencia simulada por llamada a Airtable (s).")
+    parser.add_argument("--json", help="Escribe el resumen en este archivo JSON.")
+    asyncio.run(run_benchmark(parser.parse_args()))
@@ -0,0 +1,218 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import psutil
+
+# --- Pool Configuration (overridable from .env) ---
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))  # Warm Chromium processes kept alive
+BROWSER_CONTEXTS_PER_BROWSER = int(os.getenv("BROWSER_CONTEXTS_PER_BROWSER", "2"))  # Concurrent jobs per browser
+BROWSER_MAX_JOBS = int(os.getenv("BROWSER_MAX_JOBS", "25"))  # Recycle a browser after this many jobs
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))  # Recycle when its process tree grows past this
+BROWSER_LAUNCH_ARGS = ['--no-sandbox']
+
+
+def _process_tree_rss_mb(root_pids):
+    """Returns the combined RSS (MB) of the given processes and all their descendants."""
+    total = 0
+    for pid in root_pids:
+        try:
+            root = psutil.Process(pid)
+            for proc in [root] + root.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def _descendant_pids():
+    """PIDs of every process started (directly or indirectly) by this Python process."""
+    try:
+        return {proc.pid for proc in psutil.Process().children(recursive=True)}
+    except psutil.Error:
+        return set()
+
+
+class PooledBrowser:
+    """A launched Chromium plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, browser, root_pids):
+        self.browser = browser
+        self.root_pids = root_pids
+        self.jobs_served = 0
+        self.active_contexts = 0
+        self.retiring = False
+
+    def rss_mb(self):
+        return _process_tree_rss_mb(self.root_pids)
+
+    def is_healthy(self, max_jobs, max_rss_mb):
+        """Connected, under its job budget and under the memory limit."""
+        if self.retiring or not self.browser.is_connected():
+            return False
+        if self.jobs_served >= max_jobs:
+            return False
+        if max_rss_mb and self.root_pids and self.rss_mb() > max_rss_mb:
+            return False
+        return True
+
+
+class BrowserPool:
+    """
+    Long-lived pool of headless Chromium browsers. Each job gets a fresh, isolated
+    BrowserContext from a warm browser instead of launching a whole new process.
+
+    The pool is bound to the event loop it was started on; use it from that loop only.
+    """
+
+    def __init__(self, size=None, contexts_per_browser=None, max_jobs=None, max_rss_mb=None, headless=True):
+        self.size = size or BROWSER_POOL_SIZE
+        self.contexts_per_browser = contexts_per_browser or BROWSER_CONTEXTS_PER_BROWSER
+        self.max_jobs = max_jobs or BROWSER_MAX_JOBS
+        self.max_rss_mb = BROWSER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.headless = headless
+        self._playwright = None
+        self._browsers = []
+        self._loop = None
+        self._lock = None
+        self._slots = None
+        self._starting = None # Task shared by concurrent start() calls
+
+    @property
+    def browser_count(self):
+        return len(self._browsers)
+
+    @property
+    def active_contexts(self):
+        return sum(b.active_contexts for b in self._browsers)
+
+    async def start(self):
+        """
+        Starts Playwright and launches the warm browsers (idempotent). Concurrent callers
+        share one start task; a failed start is retried by the next call.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop:
+            raise RuntimeError("BrowserPool ya está ligado a otro event loop.")
+        if self._starting is None:
+            self._loop = loop
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+                self._slots = asyncio.Semaphore(self.size * self.contexts_per_browser)
+            self._starting = loop.create_task(self._start())
+        starting = self._starting
+        try:
+            await asyncio.shield(starting)
+        except BaseException:
+            if starting.done() and starting is self._starting:
+                self._starting = None
+            raise
+
+    async def _start(self):
+        if self._playwright is None:
+            from playwright.async_api import async_playwright # Loaded when browsers are first needed
+            self._playwright = await async_playwright().start()
+        async with self._lock:
+            while len(self._browsers) < self.size:
+                self._browsers.append(await self._launch())
+        print(f"[BrowserPool] {len(self._browsers)} navegadores listos.")
+
+    async def close(self):
+        """Closes every browser and stops Playwright."""
+        if self._playwright is None:
+            return
+        async with self._lock:
+            for pooled in self._browsers:
+                await self._close_browser(pooled)
+            self._browsers = []
+            await self._playwright.stop()
+            self._playwright = None
+        self._starting = None
+        self._loop = None
+        print("[BrowserPool] Pool cerrado.")
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        """Yields a fresh BrowserContext on a warm browser; closes it and returns the slot on exit."""
+        await self.start()
+        async with self._slots:
+            pooled = await self._checkout()
+            context = None
+            try:
+                context = await pooled.browser.new_context(**context_options)
+                yield context
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception as close_err:
+                        print(f"[BrowserPool] Error cerrando contexto: {close_err}")
+                await self._checkin(pooled)
+
+    # --- Internal helpers ---
+    async def _launch(self):
+        # Chromium's PIDs are not exposed by Playwright, so diff our process tree around
+        # the launch (serialized by self._lock) to find it for RSS accounting.
+        before = _descendant_pids()
+        browser = await self._playwright.chromium.launch(headless=self.headless, args=BROWSER_LAUNCH_ARGS)
+        new_pids = _descendant_pids() - before
+        root_pids = set()
+        for pid in new_pids:
+            try:
+                if psutil.Process(pid).ppid() not in new_pids:
+                    root_pids.add(pid)
+            except psutil.Error:
+                pass
+        return PooledBrowser(browser, root_pids)
+
+    async def _close_browser(self, pooled):
+        try:
+            if pooled.browser.is_connected():
+                await pooled.browser.close()
+        except Exception as close_err:
+            print(f"[BrowserPool] Error cerrando navegador: {close_err}")
+
+    async def _checkout(self):
+        async with self._lock:
+            # Health check: retire unhealthy browsers, close them once idle and top the pool back up.
+            for pooled in list(self._browsers):
+                if not pooled.is_healthy(self.max_jobs, self.max_rss_mb):
+                    pooled.retiring = True
+                    if pooled.active_contexts == 0:
+                        self._browsers.remove(pooled)
+                        await self._close_browser(pooled)
+            healthy = [b for b in self._browsers if not b.retiring]
+            while len(healthy) < self.size:
+                pooled = await self._launch()
+                self._browsers.append(pooled)
+                healthy.append(pooled)
+            available = [b for b in healthy if b.active_contexts < self.contexts_per_browser]
+            pooled = min(available or healthy, key=lambda b: b.active_contexts)
+            pooled.active_contexts += 1
+            return pooled
+
+    async def _checkin(self, pooled):
+        async with self._lock:
+            pooled.active_contexts -= 1
+            pooled.jobs_served += 1
+            if not pooled.is_healthy(self.max_jobs, self.max_rss_mb):
+                pooled.retiring = True
+            if pooled.retiring and pooled.active_contexts == 0 and pooled in self._browsers:
+                self._browsers.remove(pooled)
+                await self._close_browser(pooled)
+                print(f"[BrowserPool] Navegador reciclado tras {pooled.jobs_served} trabajos.")
+
+
+# --- Shared pool ---
+_shared_pool = None
+
+
+def get_browser_pool():
+    """Returns the process-wide BrowserPool (created lazily, started on first use)."""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = BrowserPool()
+    return _shared_pool
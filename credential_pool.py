@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import time
+
+from session_cache import get_session_cache
+
+# --- Credential Pool Configuration (overridable from .env) ---
+# GENSPARK_ACCOUNTS_FILE / GENSPARK_ACCOUNTS: JSON list of
+#   {"email": ..., "password": ..., "max_concurrency": 2, "cooldown": 600}
+# Falls back to the single GENSPARK_EMAIL / GENSPARK_PASSWORD pair.
+GENSPARK_ACCOUNTS_FILE = os.getenv("GENSPARK_ACCOUNTS_FILE")
+GENSPARK_ACCOUNT_MAX_CONCURRENCY = int(os.getenv("GENSPARK_ACCOUNT_MAX_CONCURRENCY", "2"))
+GENSPARK_ACCOUNT_COOLDOWN = int(os.getenv("GENSPARK_ACCOUNT_COOLDOWN", "600")) # seconds out of rotation
+MAX_COOLDOWN = 6 * 3600 # Cap for repeated failures (cooldown doubles each time)
+
+
+class NoAccountAvailable(Exception):
+    """No Genspark account could be leased within the timeout."""
+
+
+class Account:
+    """One Genspark account with its concurrency limit and rotation state."""
+
+    def __init__(self, email, password, max_concurrency=None, cooldown=None):
+        self.email = email
+        self.password = password
+        self.max_concurrency = max_concurrency or GENSPARK_ACCOUNT_MAX_CONCURRENCY
+        self.cooldown = GENSPARK_ACCOUNT_COOLDOWN if cooldown is None else cooldown
+        self.active = 0
+        self.failures = 0
+        self.disabled_until = 0.0
+        self.disabled_reason = None
+
+    def available(self, now):
+        return now >= self.disabled_until and self.active < self.max_concurrency
+
+
+def load_accounts():
+    """Reads the account list from GENSPARK_ACCOUNTS_FILE, GENSPARK_ACCOUNTS or the single-pair variables."""
+    raw = None
+    if GENSPARK_ACCOUNTS_FILE:
+        with open(GENSPARK_ACCOUNTS_FILE, encoding="utf-8") as f:
+            raw = json.load(f)
+    elif os.getenv("GENSPARK_ACCOUNTS"):
+        raw = json.loads(os.getenv("GENSPARK_ACCOUNTS"))
+    if raw is not None:
+        return [Account(a["email"], a["password"], a.get("max_concurrency"), a.get("cooldown")) for a in raw]
+    email, password = os.getenv("GENSPARK_EMAIL"), os.getenv("GENSPARK_PASSWORD")
+    return [Account(email, password)] if email and password else []
+
+
+class CredentialPool:
+    """
+    Leases Genspark accounts to jobs. Each account runs at most `max_concurrency` jobs;
+    accounts with a warm cached session are preferred, then the least busy one. Accounts
+    whose login fails or that hit a quota are taken out of rotation for their cooldown,
+    doubling on consecutive failures.
+    """
+
+    def __init__(self, accounts, session_cache=None):
+        self.accounts = accounts
+        self.session_cache = session_cache or get_session_cache()
+        self._changed = None # asyncio.Condition, created on the running loop
+
+    @property
+    def capacity(self):
+        return sum(a.max_concurrency for a in self.accounts)
+
+    def _pick(self):
+        now = time.time()
+        candidates = [a for a in self.accounts if a.available(now)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda a: (not self.session_cache.has(a.email), a.active / a.max_concurrency))
+
+    async def acquire(self, timeout=None):
+        """Waits for and returns a leased Account; raises NoAccountAvailable on timeout."""
+        if not self.accounts:
+            raise NoAccountAvailable("No hay cuentas de Genspark configuradas.")
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self._changed:
+            while True:
+                account = self._pick()
+                if account is not None:
+                    account.active += 1
+                    return account
+                # Wake up on release/failure reports, or when the next cooldown ends.
+                now = time.time()
+                wait = min((a.disabled_until - now for a in self.accounts if a.disabled_until > now), default=None)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise NoAccountAvailable("Todas las cuentas de Genspark están ocupadas o en enfriamiento.")
+                    wait = remaining if wait is None else min(wait, remaining)
+                try:
+                    await asyncio.wait_for(self._changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, account, success=None):
+        """Returns a leased account; `success=True` resets its failure streak."""
+        async with self._changed:
+            account.active -= 1
+            if success:
+                account.failures = 0
+            self._changed.notify_all()
+
+    async def report_failure(self, account, reason):
+        """Takes the account out of rotation (login failure, quota...) with exponential cooldown."""
+        async with self._changed:
+            account.failures += 1
+            cooldown = min(MAX_COOLDOWN, account.cooldown * 2 ** (account.failures - 1))
+            account.disabled_until = time.time() + cooldown
+            account.disabled_reason = reason
+            if reason == "login_failed":
+                self.session_cache.invalidate(account.email)
+            print(f"[CredentialPool] Cuenta {account.email} fuera de rotación {cooldown}s ({reason}).")
+            self._changed.notify_all()
+
+
+# --- Shared pool ---
+_shared_pool = None
+
+
+def get_credential_pool():
+    """Returns the process-wide CredentialPool built from the environment."""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = CredentialPool(load_accounts())
+    return _shared_pool
@@ -0,0 +1,262 @@
+# filename: fake_genspark.py
+"""
+Local stand-in for Genspark, for benchmarks and end-to-end checks without the real site.
+
+Reproduces what run_genspark_interaction relies on: the "Login with email" button, the
+email/password form with #next, the .n-modal svg popup, textarea.search-input with
+.enter-icon, the re-login prompt after the first message, and answers that end with a
+spark_page image followed by a .buttons copy group. Delays are configurable.
+
+    python fake_genspark.py --port 8765 --research-delay 20
+    GENSPARK_BASE_URL=http://127.0.0.1:8765 GENSPARK_LOGIN_URL=http://127.0.0.1:8765/login python batch_run.py ...
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import uuid
+from dataclasses import dataclass
+
+from aiohttp import web
+
+SESSION_COOKIE = "fake_genspark_session"
+# 1x1 transparent PNG served as the spark_page completion signal.
+SPARK_PAGE_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+
+@dataclass
+class FakeGensparkConfig:
+    """Delays are in seconds; `jitter` adds up to that fraction of random extra delay."""
+    login_delay: float = 0.3  # "Login with email" click → form shown
+    modal_delay: float = 0.5  # Home page load → .n-modal shown
+    chat_delay: float = 0.5  # Short chat answers ("Hola")
+    research_delay: float = 5.0  # Deep research answers (query → spark_page image)
+    jitter: float = 0.2
+    relogin_prompt: bool = True  # Show the second login prompt after the first chat message
+    report_sections: int = 6  # Size of the generated report
+    error_rate: float = 0.0  # Fraction of research answers replaced by a "Something went wrong" toast
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="UTF-8"><title>Genspark (fake)</title>
+<style>
+body {{ font-family: sans-serif; margin: 0 auto; max-width: 900px; }}
+.n-modal {{ position: fixed; top: 20px; right: 20px; background: #eee; padding: 10px; }}
+.n-modal svg {{ width: 24px; height: 24px; cursor: pointer; }}
+.message {{ border-bottom: 1px solid #ddd; padding: 8px 0; }}
+.buttons button {{ margin-right: 4px; }}
+</style></head>
+<body>
+<div id="login-area" style="display: {login_display}">
+  <button id="login-email-button">Login with email</button>
+  <div id="login-form" style="display: none">
+    <input type="email" name="email" placeholder="Email">
+    <input type="password" name="password" placeholder="Password">
+    <button id="next" type="button">Next</button>
+  </div>
+</div>
+<div id="messages"></div>
+<div id="input-area" style="display: {chat_display}">
+  <textarea class="search-input" rows="3"></textarea>
+  <div class="enter-icon" role="button">&#10148;</div>
+  <div class="buttons"><button type="button">Tools</button></div>
+</div>
+<script>
+const CONFIG = {config};
+const delay = (s) => new Promise(r => setTimeout(r, s * 1000 * (1 + Math.random() * CONFIG.jitter)));
+const loginArea = document.getElementById('login-area');
+const loginForm = document.getElementById('login-form');
+let messagesSent = 0;
+
+function showLoginPrompt() {{
+  loginArea.style.display = 'block';
+  loginForm.style.display = 'none';
+}}
+
+document.getElementById('login-email-button').addEventListener('click', async () => {{
+  await delay(CONFIG.login_delay);
+  loginForm.style.display = 'block';
+}});
+
+document.getElementById('next').addEventListener('click', async () => {{
+  const email = loginForm.querySelector('input[type=email]').value;
+  await fetch('/api/login', {{method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({{email}})}});
+  if (CONFIG.page === 'login') {{
+    window.location.href = '/';
+  }} else {{
+    loginArea.style.display = 'none';
+  }}
+}});
+
+if (CONFIG.page === 'home') {{
+  delay(CONFIG.modal_delay).then(() => {{
+    const modal = document.createElement('div');
+    modal.className = 'n-modal';
+    modal.innerHTML = '<span>Welcome!</span><svg viewBox="0 0 24 24"><path d="M6 6l12 12M18 6L6 18" stroke="black"/></svg>';
+    modal.querySelector('svg').addEventListener('click', () => modal.remove());
+    document.body.appendChild(modal);
+  }});
+}}
+
+document.querySelector('.enter-icon').addEventListener('click', async () => {{
+  const input = document.querySelector('.search-input');
+  const query = input.value;
+  input.value = '';
+  messagesSent += 1;
+  const response = await fetch('/api/ask', {{method: 'POST', headers: {{'Content-Type': 'application/json'}},
+    body: JSON.stringify({{query, research: CONFIG.page === 'agents'}})}});
+  const answer = await response.json();
+  if (answer.error) {{
+    const toast = document.createElement('div');
+    toast.className = 'n-message';
+    toast.setAttribute('role', 'alert');
+    toast.textContent = answer.error;
+    document.body.appendChild(toast);
+    return;
+  }}
+  const message = document.createElement('div');
+  message.className = 'message';
+  message.innerHTML = answer.html;
+  const buttons = document.createElement('div');
+  buttons.className = 'buttons';
+  buttons.innerHTML = '<button type="button" class="copy">Copy</button><button type="button">Share</button>';
+  buttons.querySelector('.copy').addEventListener('click', () => navigator.clipboard.writeText(answer.markdown));
+  const messages = document.getElementById('messages');
+  messages.appendChild(message);
+  messages.appendChild(buttons);
+  if (CONFIG.page === 'home' && CONFIG.relogin_prompt && messagesSent === 1) {{
+    showLoginPrompt();
+  }}
+}});
+</script>
+</body></html>
+"""
+
+
+def _report(query, sections, image_url):
+    """Returns (html, markdown) of a fake deep-research report."""
+    topic = " ".join(query.split()[:8]) or "consulta"
+    md = [f"# Análisis: {topic}", "", "Resumen ejecutivo del estudio generado por el servidor de pruebas."]
+    html = [f"<h1>Análisis: {topic}</h1>", "<p>Resumen ejecutivo del estudio generado por el servidor de pruebas.</p>"]
+    for i in range(1, sections + 1):
+        paragraph = (f"Hallazgo {i}: el sector muestra cambios relevantes en comportamiento de compra, "
+                     f"canales digitales y regulación, con impacto estimado en los próximos {i * 6} meses.")
+        md += ["", f"## Sección {i}", "", paragraph, "", f"- Punto clave {i}.1", f"- Punto clave {i}.2"]
+        html += [f"<h2>Sección {i}</h2>", f"<p>{paragraph}</p>",
+                 f"<ul><li>Punto clave {i}.1</li><li>Punto clave {i}.2</li></ul>"]
+    html.append(f'<img src="{image_url}" alt="spark page">')
+    return "\n".join(html), "\n".join(md)
+
+
+def create_app(config=None):
+    """Builds the aiohttp application serving the fake Genspark pages and APIs."""
+    config = config or FakeGensparkConfig()
+    sessions = set()
+    image_ids = itertools.count(1)
+    app = web.Application()
+    app["stats"] = {"logins": 0, "questions": 0, "research": 0, "errors": 0}
+
+    def jittered(seconds):
+        return seconds * (1 + random.random() * config.jitter)
+
+    def render(page, logged_in):
+        client_config = dict(vars(config), page=page)
+        return web.Response(
+            text=PAGE.format(
+                config=json.dumps(client_config),
+                login_display="none" if logged_in else "block",
+                chat_display="block" if logged_in else "none",
+            ),
+            content_type="text/html",
+        )
+
+    def logged_in(request):
+        return request.cookies.get(SESSION_COOKIE) in sessions
+
+    async def login_page(request):
+        return render("login", logged_in=False)
+
+    async def home(request):
+        if not logged_in(request):
+            raise web.HTTPFound("/login")
+        return render("home", logged_in=True)
+
+    async def agents(request):
+        if not logged_in(request):
+            raise web.HTTPFound("/login?next=agents")
+        return render("agents", logged_in=True)
+
+    async def api_login(request):
+        token = uuid.uuid4().hex
+        sessions.add(token)
+        app["stats"]["logins"] += 1
+        response = web.json_response({"ok": True})
+        response.set_cookie(SESSION_COOKIE, token, httponly=True)
+        return response
+
+    async def api_ask(request):
+        if not logged_in(request):
+            return web.json_response({"error": "login required"}, status=401)
+        body = await request.json()
+        app["stats"]["questions"] += 1
+        if body.get("research"):
+            app["stats"]["research"] += 1
+            if random.random() < config.error_rate:
+                await asyncio.sleep(jittered(config.chat_delay))
+                app["stats"]["errors"] += 1
+                return web.json_response({"error": "Something went wrong. Please try again later."})
+            await asyncio.sleep(jittered(config.research_delay))
+            image_url = f"/spark_page/{next(image_ids)}.png"
+            html, markdown = _report(body.get("query", ""), config.report_sections, image_url)
+        else:
+            await asyncio.sleep(jittered(config.chat_delay))
+            html, markdown = "<p>¡Hola! ¿En qué puedo ayudarte?</p>", "¡Hola! ¿En qué puedo ayudarte?"
+        return web.json_response({"html": html, "markdown": markdown})
+
+    async def spark_page(request):
+        return web.Response(body=SPARK_PAGE_PNG, content_type="image/png")
+
+    async def stats(request):
+        return web.json_response(app["stats"])
+
+    app.router.add_get("/login", login_page)
+    app.router.add_get("/", home)
+    app.router.add_get("/agents", agents)
+    app.router.add_post("/api/login", api_login)
+    app.router.add_post("/api/ask", api_ask)
+    app.router.add_get("/spark_page/{name}", spark_page)
+    app.router.add_get("/_stats", stats)
+    return app
+
+
+async def start_fake_genspark(config=None, host="127.0.0.1", port=0):
+    """Starts the server in the running loop; returns (runner, base_url). Stop with runner.cleanup()."""
+    runner = web.AppRunner(create_app(config))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor Genspark falso para pruebas locales y benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--login-delay", type=float, default=FakeGensparkConfig.login_delay)
+    parser.add_argument("--modal-delay", type=float, default=FakeGensparkConfig.modal_delay)
+    parser.add_argument("--chat-delay", type=float, default=FakeGensparkConfig.chat_delay)
+    parser.add_argument("--research-delay", type=float, default=FakeGensparkConfig.research_delay)
+    parser.add_argument("--jitter", type=float, default=FakeGensparkConfig.jitter)
+    parser.add_argument("--no-relogin-prompt", action="store_true", help="No mostrar el segundo login tras el primer mensaje.")
+    parser.add_argument("--error-rate", type=float, default=FakeGensparkConfig.error_rate, help="Fracción de investigaciones que terminan en error.")
+    args = parser.parse_args()
+    config = FakeGensparkConfig(
+        login_delay=args.login_delay, modal_delay=args.modal_delay, chat_delay=args.chat_delay,
+        research_delay=args.research_delay, jitter=args.jitter, relogin_prompt=not args.no_relogin_prompt,
+        error_rate=args.error_rate,
+    )
+    web.run_app(create_app(config), host=args.host, port=args.port)
@@ -0,0 +1,74 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class Step:
+    """
+    One declarative step of a browser flow.
+
+    The engine first waits for readiness (`selector` reaching `state`, and/or the JS
+    `condition` becoming truthy) within `timeout` ms, then runs `action`.
+    `when` skips the step entirely when it returns False; `optional` steps that fail
+    or time out are logged and skipped instead of aborting the flow.
+    """
+    name: str
+    description: str = ""
+    selector: Optional[str] = None
+    pick: Optional[str] = None  # "first" | "last" | None (whole locator)
+    state: str = "visible"
+    condition: Optional[str] = None  # JS predicate, re-evaluated on DOM mutations
+    action: Optional[Callable[..., Any]] = None  # async (page, locator, flow_state) -> None
+    timeout: int = 15000  # ms
+    optional: bool = False
+    when: Optional[Callable[[dict], bool]] = None  # (flow_state) -> bool
+    phase: Optional[str] = None  # Groups steps for metrics (login, query, research_wait, extraction)
+
+
+def _locate(page, step):
+    locator = page.locator(step.selector)
+    if step.pick == "first":
+        return locator.first
+    if step.pick == "last":
+        return locator.last
+    return locator
+
+
+async def run_steps(page, steps, flow_state, log, timings):
+    """
+    Runs `steps` in order against `page`, appending one timing record per step to
+    `timings` ({"step", "phase", "seconds", "status"}). Names of steps that completed are
+    added to flow_state["completed"]. Re-raises the error of a failed required step.
+    """
+    completed = flow_state.setdefault("completed", set())
+    for step in steps:
+        if step.when is not None and not step.when(flow_state):
+            timings.append({"step": step.name, "phase": step.phase, "seconds": 0.0, "status": "skipped"})
+            continue
+
+        log(f"[{step.name}] {step.description}" if step.description else f"[{step.name}]")
+        start = time.perf_counter()
+        try:
+            locator = None
+            if step.selector:
+                locator = _locate(page, step)
+                await locator.wait_for(state=step.state, timeout=step.timeout)
+            if step.condition:
+                await page.wait_for_function(step.condition, polling="mutation", timeout=step.timeout)
+            if step.action is not None:
+                await step.action(page, locator, flow_state)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            if step.optional:
+                log(f"   Paso opcional '{step.name}' omitido tras {elapsed:.2f}s: {e}")
+                timings.append({"step": step.name, "phase": step.phase, "seconds": round(elapsed, 3), "status": "optional_skipped"})
+                continue
+            timings.append({"step": step.name, "phase": step.phase, "seconds": round(elapsed, 3), "status": "failed"})
+            raise
+
+        elapsed = time.perf_counter() - start
+        completed.add(step.name)
+        timings.append({"step": step.name, "phase": step.phase, "seconds": round(elapsed, 3), "status": "ok"})
+        log(f"   '{step.name}' completado en {elapsed:.2f}s.")
+    return timings
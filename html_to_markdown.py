@@ -0,0 +1,122 @@
+import re
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+# Converts the report HTML rendered by Genspark into Markdown, in-process (no clipboard).
+# Covers what the reports use: headings, paragraphs, emphasis, links, nested lists,
+# code, blockquotes, tables and rules. Unknown tags fall through to their text.
+
+_BLOCK_SKIP = {"script", "style", "noscript", "svg", "button", "template"}
+
+
+def _inline(node):
+    """Markdown for the inline content of `node`."""
+    parts = []
+    for child in node.children:
+        if isinstance(child, NavigableString):
+            parts.append(re.sub(r"\s+", " ", str(child)))
+            continue
+        if not isinstance(child, Tag) or child.name in _BLOCK_SKIP:
+            continue
+        name = child.name
+        text = _inline(child)
+        if name in ("strong", "b"):
+            parts.append(f"**{text.strip()}**" if text.strip() else "")
+        elif name in ("em", "i"):
+            parts.append(f"*{text.strip()}*" if text.strip() else "")
+        elif name == "code":
+            parts.append(f"`{child.get_text()}`")
+        elif name == "a":
+            href = child.get("href")
+            parts.append(f"[{text.strip()}]({href})" if href and not href.startswith("javascript:") else text)
+        elif name == "br":
+            parts.append("  \n")
+        elif name == "img":
+            continue # Report images are decorative / signal-only
+        else:
+            parts.append(text)
+    return "".join(parts)
+
+
+def _list(node, depth):
+    lines = []
+    ordered = node.name == "ol"
+    for index, item in enumerate(node.find_all("li", recursive=False), start=1):
+        marker = f"{index}." if ordered else "-"
+        nested = [c for c in item.children if isinstance(c, Tag) and c.name in ("ul", "ol")]
+        for sub in nested:
+            sub.extract()
+        lines.append(f"{'   ' * depth}{marker} {_inline(item).strip()}")
+        for sub in nested:
+            lines.extend(_list(sub, depth + 1))
+    return lines
+
+
+def _table(node):
+    rows = []
+    for tr in node.find_all("tr"):
+        cells = [_inline(cell).strip().replace("|", "\\|") for cell in tr.find_all(["th", "td"])]
+        if cells:
+            rows.append(cells)
+    if not rows:
+        return []
+    width = max(len(r) for r in rows)
+    rows = [r + [""] * (width - len(r)) for r in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "| " + " | ".join(["---"] * width) + " |"]
+    lines.extend("| " + " | ".join(r) + " |" for r in rows[1:])
+    return lines
+
+
+def _blocks(node):
+    """Markdown blocks (list of strings) for the block-level children of `node`."""
+    blocks = []
+    inline_buffer = []
+
+    def flush_inline():
+        text = "".join(inline_buffer).strip()
+        if text:
+            blocks.append(text)
+        inline_buffer.clear()
+
+    for child in node.children:
+        if isinstance(child, NavigableString):
+            inline_buffer.append(re.sub(r"\s+", " ", str(child)))
+            continue
+        if not isinstance(child, Tag) or child.name in _BLOCK_SKIP:
+            continue
+        name = child.name
+        if re.fullmatch(r"h[1-6]", name):
+            flush_inline()
+            blocks.append(f"{'#' * int(name[1])} {_inline(child).strip()}")
+        elif name == "p":
+            flush_inline()
+            blocks.append(_inline(child).strip())
+        elif name in ("ul", "ol"):
+            flush_inline()
+            blocks.append("\n".join(_list(child, 0)))
+        elif name == "pre":
+            flush_inline()
+            blocks.append(f"```\n{child.get_text().rstrip()}\n```")
+        elif name == "blockquote":
+            flush_inline()
+            inner = "\n\n".join(_blocks(child))
+            blocks.append("\n".join(f"> {line}" if line else ">" for line in inner.split("\n")))
+        elif name == "table":
+            flush_inline()
+            blocks.append("\n".join(_table(child)))
+        elif name == "hr":
+            flush_inline()
+            blocks.append("---")
+        elif name in ("div", "section", "article", "main", "header", "footer"):
+            flush_inline()
+            blocks.extend(_blocks(child))
+        else:
+            inline_buffer.append(_inline(child) if name != "br" else "  \n")
+    flush_inline()
+    return [b for b in blocks if b.strip()]
+
+
+def html_to_markdown(html):
+    """Converts an HTML fragment to Markdown."""
+    soup = BeautifulSoup(html or "", "html.parser")
+    return "\n\n".join(_blocks(soup)).strip()
@@ -0,0 +1,83 @@
+import collections
+import itertools
+import logging
+import os
+import sys
+import time
+
+# --- Job Log Configuration (overridable from .env) ---
+JOB_LOG_BUFFER_SIZE = int(os.getenv("JOB_LOG_BUFFER_SIZE", "200")) # Entries kept in memory per job
+JOB_LOG_TAIL = int(os.getenv("JOB_LOG_TAIL", "30")) # Entries returned to clients
+JOB_LOG_MESSAGE_MAX = 300 # Characters kept per in-memory entry; the sink gets the full text
+JOB_LOG_FILE = os.getenv("JOB_LOG_FILE") # Verbose sink file; stderr when unset
+
+_sink = logging.getLogger("kenmei.jobs")
+
+
+def _configure_sink():
+    """Attaches the verbose file/stream handler once per process."""
+    if _sink.handlers:
+        return
+    handler = logging.FileHandler(JOB_LOG_FILE, encoding="utf-8") if JOB_LOG_FILE else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [job=%(job_id)s] %(message)s"))
+    _sink.addHandler(handler)
+    _sink.setLevel(logging.DEBUG)
+    _sink.propagate = False
+
+
+class JobLog:
+    """
+    Structured, size-bounded log for one job. Every entry goes to the verbose sink in full;
+    INFO and above are also kept (truncated) in a ring buffer from which clients get a compact tail.
+    Calling the instance logs at INFO, so it can be passed wherever a `log(message)` callable is expected.
+    """
+
+    def __init__(self, job_id, maxlen=None, on_entry=None):
+        _configure_sink()
+        self.job_id = job_id
+        self.on_entry = on_entry
+        self._entries = collections.deque(maxlen=maxlen or JOB_LOG_BUFFER_SIZE)
+        self._seq = itertools.count(1)
+
+    def log(self, level, message, detail=None):
+        """Logs `message` at `level`; `detail` (e.g. a traceback) only goes to the sink."""
+        levelno = logging.getLevelName(level)
+        _sink.log(levelno, f"{message}\n{detail}" if detail else message, extra={"job_id": self.job_id})
+        if levelno < logging.INFO:
+            return
+        entry = {
+            "seq": next(self._seq),
+            "ts": time.time(),
+            "level": level,
+            "job_id": self.job_id,
+            "message": message if len(message) <= JOB_LOG_MESSAGE_MAX else message[:JOB_LOG_MESSAGE_MAX] + "…",
+        }
+        self._entries.append(entry)
+        if self.on_entry:
+            self.on_entry(entry)
+
+    def __call__(self, message):
+        self.log("INFO", message)
+
+    def debug(self, message, detail=None):
+        self.log("DEBUG", message, detail)
+
+    def info(self, message, detail=None):
+        self.log("INFO", message, detail)
+
+    def warning(self, message, detail=None):
+        self.log("WARNING", message, detail)
+
+    def error(self, message, detail=None):
+        self.log("ERROR", message, detail)
+
+    @property
+    def last_message(self):
+        return self._entries[-1]["message"] if self._entries else None
+
+    def tail(self, n=None, since=None):
+        """Latest `n` entries (default JOB_LOG_TAIL), optionally only those with seq > `since`."""
+        entries = list(self._entries)
+        if since is not None:
+            entries = [e for e in entries if e["seq"] > since]
+        return entries[-(n or JOB_LOG_TAIL):]
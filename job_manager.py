@@ -0,0 +1,305 @@
+import asyncio
+import collections
+import math
+import os
+import time
+import traceback
+import uuid
+
+from airtable_agent import create_airtable_record_async, run_genspark_interaction
+from job_log import JobLog
+from metrics import PENDING_JOBS, RUNNING_JOBS
+from report_renderer import get_report_renderer
+from result_cache import get_result_cache, make_cache_key
+
+# --- Job Manager Configuration ---
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2")) # Genspark runs in parallel per server process
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600")) # Keep finished jobs queryable this long
+JOB_DRAIN_TIMEOUT = int(os.getenv("JOB_DRAIN_TIMEOUT", "900")) # Seconds shutdown waits for in-flight jobs
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "20")) # Queued + running jobs before /submit answers 429
+JOB_MAX_PER_CLIENT = int(os.getenv("JOB_MAX_PER_CLIENT", "3")) # Queued + running jobs per client (0 = no cap)
+JOB_DEFAULT_DURATION = 600 # Seconds assumed per run until some have finished
+JOB_DURATION_HISTORY = 50 # Recent successful runs averaged for ETAs
+MIN_RETRY_AFTER = 30
+JOB_EVENT_QUEUE_SIZE = 256 # Events buffered per stream subscriber; a slow client misses the overflow
+
+
+class ShuttingDown(RuntimeError):
+    """Raised by JobManager.submit() once a drain has started."""
+
+
+class QueueSaturated(RuntimeError):
+    """Raised by JobManager.submit() when the queue, or the client's share of it, is full."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass # Slow subscriber: it catches up from the next status snapshot
+
+
+class Job:
+    """In-memory state of one report generation, polled through /jobs/<id> or streamed through /jobs/<id>/events."""
+
+    def __init__(self, empresa, pais, consideraciones, cache_key, client=None):
+        self.id = uuid.uuid4().hex
+        self.client = client # Submitting client (IP address for /submit); caps its share of the queue
+        self.empresa = empresa
+        self.pais = pais
+        self.consideraciones = consideraciones
+        self.cache_key = cache_key
+        self.airtable_record_id = None
+        self.cached = False
+        self.status = "queued" # queued -> running -> completed | failed
+        self.message = "En cola."
+        self.log = JobLog(self.id, on_entry=lambda entry: self._publish("log", entry)) # Bounded; clients get its tail
+        self.analysis_markdown = None
+        self.partial_output = None # Text Genspark has produced so far (live progress / failed runs)
+        self.output_files = {} # format -> rendered file path (HTML/PDF/DOCX)
+        self.timings = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.eta_seconds = None # Estimated at submission (queue position and recent durations)
+        self._subscribers = set() # asyncio.Queues of the open event streams
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed")
+
+    def subscribe(self):
+        """Returns a queue receiving (event, data) tuples: "log" entries, "progress" text and "status" snapshots."""
+        queue = asyncio.Queue(JOB_EVENT_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, event, data):
+        for queue in list(self._subscribers):
+            _offer(queue, (event, data))
+
+    def set_progress(self, text):
+        self.partial_output = text
+        self._publish("progress", text)
+
+    def publish_status(self):
+        """Sends the current status (without logs, which are streamed on their own) to subscribers."""
+        self._publish("status", self.to_dict(logs=False))
+
+    def to_dict(self, since=None, logs=True):
+        """JSON view; `since` limits logs to entries newer than that seq (incremental polling)."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "message": self.message,
+            "airtable_record_id": self.airtable_record_id,
+            "cached": self.cached,
+            "analysis_markdown": self.analysis_markdown,
+            "partial_output": self.partial_output,
+            "output_files": {fmt: f"/reports/{os.path.basename(path)}" for fmt, path in self.output_files.items()},
+            "timings": list(self.timings),
+            "logs": self.log.tail(since=since) if logs else [],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "eta_seconds": self.eta_seconds,
+        }
+
+
+class JobManager:
+    """
+    Runs report jobs in the background on the server's long-lived event loop,
+    at most `concurrency` at a time. submit() and get() run on that loop (request
+    handlers), so no locking is needed. drain() stops accepting jobs and waits for the
+    ones in flight (graceful shutdown).
+
+    Identical requests (same normalized empresa/pais/consideraciones) are answered from
+    the result cache when possible, and otherwise join the run already in flight.
+    New runs are refused with QueueSaturated once `queue_limit` are queued or running, or
+    once the submitting client already has `max_per_client` of them, so one client cannot
+    fill the queue. Cache hits and joined runs are not counted against either limit.
+    """
+
+    def __init__(self, loop, concurrency=JOB_CONCURRENCY, result_cache=None, queue_limit=JOB_QUEUE_LIMIT, max_per_client=JOB_MAX_PER_CLIENT):
+        self.loop = loop
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.max_per_client = max_per_client
+        self._durations = collections.deque(maxlen=JOB_DURATION_HISTORY) # Seconds of recent successful runs
+        self.result_cache = result_cache or get_result_cache()
+        self._jobs = {}
+        self._in_flight = {} # cache_key -> Job still queued/running
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set() # Jobs (and cache-hit renders) still running
+        self._accepting = True
+
+    def submit(self, empresa, pais, consideraciones, client=None):
+        """
+        Returns (job, reused) immediately. `reused` is "cache" for a cached result,
+        "in_flight" when joining an identical running job, or None for a new run.
+        `client` identifies the submitter for the per-client cap (None: not capped).
+        """
+        cache_key = make_cache_key(empresa, pais, consideraciones)
+        if not self._accepting:
+            raise ShuttingDown("El servidor se está deteniendo; no se aceptan trabajos nuevos.")
+        self._prune()
+        existing = self._in_flight.get(cache_key)
+        if existing is not None:
+            return existing, "in_flight"
+
+        job = Job(empresa, pais, consideraciones, cache_key, client)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            job.status = "completed"
+            job.message = "Resultado recuperado de caché."
+            job.analysis_markdown = cached["content"]
+            job.airtable_record_id = cached["airtable_record_id"]
+            job.cached = True
+            job.finished_at = time.time()
+            self._jobs[job.id] = job
+            self._spawn(self._render(job)) # Free if already rendered
+            return job, "cache"
+
+        if len(self._in_flight) >= self.queue_limit:
+            raise QueueSaturated(
+                "Hay demasiados reportes en cola; inténtalo de nuevo más tarde.",
+                self._retry_after(len(self._in_flight) - self.queue_limit + 1),
+            )
+        if client is not None and self.max_per_client:
+            own = sum(1 for j in self._in_flight.values() if j.client == client)
+            if own >= self.max_per_client:
+                raise QueueSaturated(
+                    f"Ya tienes {own} reportes en cola o en curso; espera a que termine alguno.",
+                    self._retry_after(1),
+                )
+        job.eta_seconds = self._estimate_eta(len(self._in_flight))
+        self._jobs[job.id] = job
+        self._in_flight[cache_key] = job
+        PENDING_JOBS.inc()
+        self._spawn(self._run(job))
+        return job, None
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self._tasks.add(task) # Strong reference until it finishes
+        task.add_done_callback(self._tasks.discard)
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    async def drain(self, timeout=JOB_DRAIN_TIMEOUT):
+        """Stops accepting new jobs and waits up to `timeout` seconds for queued/running ones."""
+        self._accepting = False
+        tasks = list(self._tasks)
+        if not tasks:
+            return True
+        print(f"[JobManager] Esperando {len(tasks)} trabajos en curso antes de detener el servidor...")
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            print(f"[JobManager] {len(pending)} trabajos no terminaron en {timeout}s; se cancelan.")
+            for task in pending:
+                task.cancel()
+        return not pending
+
+    @property
+    def average_duration(self):
+        return sum(self._durations) / len(self._durations) if self._durations else JOB_DEFAULT_DURATION
+
+    def _estimate_eta(self, ahead):
+        """
+        Estimated seconds until a new job finishes when `ahead` jobs are queued/running,
+        served `concurrency` at a time. Running jobs are counted as if they had not started
+        yet, so the estimate errs on the long side.
+        """
+        waiting = max(0, ahead + 1 - self.concurrency)
+        return math.ceil(self.average_duration * (waiting / self.concurrency + 1))
+
+    def _retry_after(self, overflow):
+        """A slot frees every average_duration / concurrency seconds; wait for `overflow` of them."""
+        return max(MIN_RETRY_AFTER, math.ceil(self.average_duration * overflow / self.concurrency))
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def _render(self, job):
+        """Renders the job's report to HTML/PDF/DOCX off the event loop; failures only get logged."""
+        try:
+            job.output_files = await get_report_renderer().render(job.analysis_markdown)
+        except Exception as e:
+            job.log.warning(f"No se pudieron generar los archivos del reporte: {e}")
+
+    async def _run(self, job):
+        running = False
+        try:
+            async with self._slots:
+                PENDING_JOBS.dec()
+                RUNNING_JOBS.inc()
+                running = True
+                job.status = "running"
+                job.message = "Generando reporte con Genspark..."
+                job.started_at = time.time()
+                job.publish_status()
+                await self._execute(job)
+        finally:
+            # Also reached when the job is cancelled while still waiting for a slot (drain timeout).
+            if running:
+                RUNNING_JOBS.dec()
+            else:
+                PENDING_JOBS.dec()
+            if not job.finished:
+                job.status = "failed"
+                job.message = "Trabajo cancelado: el servidor se detuvo antes de terminarlo."
+            job.finished_at = time.time()
+            self._in_flight.pop(job.cache_key, None)
+            job.publish_status()
+
+    async def _execute(self, job):
+        try:
+            # --- Create Initial Airtable Record (only for runs that actually start) ---
+            job.log("Creando registro inicial en Airtable...")
+            record_id, airtable_error = await create_airtable_record_async(
+                job.empresa, job.pais, job.consideraciones
+            )
+            if not record_id:
+                job.status = "failed"
+                job.message = airtable_error or "Error desconocido al crear registro inicial en Airtable."
+                job.log.error(f"Error crítico al crear registro Airtable: {airtable_error}")
+                return
+            job.airtable_record_id = record_id
+            job.log(f"Registro inicial creado con ID: {record_id}")
+
+            result = await run_genspark_interaction(
+                job.empresa, job.pais, job.consideraciones, job.airtable_record_id,
+                job_log=job.log, on_progress=job.set_progress,
+            )
+            job.timings = result.get("timings", [])
+            if result["success"]:
+                job.analysis_markdown = result["content"]
+                self.result_cache.put(job.cache_key, job.analysis_markdown, job.airtable_record_id)
+                await self._render(job)
+                job.status = "completed"
+                job.message = "Generación de reporte finalizada."
+                self._durations.append(time.time() - job.started_at)
+            else:
+                job.partial_output = result.get("partial_content") or job.partial_output
+                job.status = "failed"
+                job.message = "Error durante la generación del reporte."
+                if job.log.last_message:
+                    job.message += f" Último log: {job.log.last_message}"
+        except Exception as e:
+            job.log.error(f"Error EXCEPCIÓN GENERAL en trabajo {job.id}: {e}", detail=traceback.format_exc())
+            job.status = "failed"
+            job.message = f"Error interno del servidor: {e}"
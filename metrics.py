@@ -0,0 +1,58 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# --- Prometheus Metrics (exposed on /metrics by app.py and by each worker process) ---
+# Buckets span quick login steps (seconds) up to the 15-minute research ceiling.
+PHASE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 900, 1200)
+
+PHASE_SECONDS = Histogram(
+    "kenmei_phase_seconds",
+    "Duración de cada fase de run_genspark_interaction.",
+    ["phase"], # login | query | research_wait | extraction | airtable | time_to_query | total
+    buckets=PHASE_BUCKETS,
+)
+JOBS_TOTAL = Counter("kenmei_jobs_total", "Ejecuciones de Genspark por resultado.", ["outcome"]) # success | timeout | failure
+JOB_FAILURES_TOTAL = Counter("kenmei_job_failures_total", "Fallos de ejecución por motivo.", ["reason"])
+
+ACTIVE_BROWSERS = Gauge("kenmei_active_browsers", "Procesos Chromium vivos en el pool.")
+ACTIVE_CONTEXTS = Gauge("kenmei_active_contexts", "Contextos de navegador en uso (trabajos corriendo).")
+PENDING_JOBS = Gauge("kenmei_pending_jobs", "Trabajos en cola esperando un hueco.")
+RUNNING_JOBS = Gauge("kenmei_running_jobs", "Trabajos ejecutándose en este proceso.")
+ADMISSION_DEFERRALS = Counter("kenmei_admission_deferrals_total", "Entradas de cola aplazadas porque todos los trabajos pendientes superaban un límite.")
+JOBS_REQUEUED = Counter("kenmei_jobs_requeued_total", "Trabajos devueltos a la cola por el worker/reaper.", ["reason"]) # retry | retry_due | lease_expired | orphaned | queue_failed
+
+AIRTABLE_REQUEST_SECONDS = Histogram(
+    "kenmei_airtable_request_seconds",
+    "Latencia de las llamadas batch a Airtable.",
+    ["operation", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+BLOCKED_REQUESTS = Counter("kenmei_blocked_requests_total", "Peticiones bloqueadas por el filtro de red.", ["resource_type"])
+ESTIMATED_BYTES_SAVED = Counter("kenmei_estimated_bytes_saved_total", "Bytes estimados ahorrados por el filtro de red.")
+AIRTABLE_QUEUE_DEPTH = Gauge("kenmei_airtable_queue_depth", "Operaciones de Airtable pendientes en el writer.")
+
+
+def track_browser_pool(pool):
+    """Binds the browser gauges to a BrowserPool so they are read at scrape time."""
+    ACTIVE_BROWSERS.set_function(lambda: pool.browser_count)
+    ACTIVE_CONTEXTS.set_function(lambda: pool.active_contexts)
+
+
+def track_airtable_writer(writer):
+    AIRTABLE_QUEUE_DEPTH.set_function(lambda: writer.pending)
+
+
+def observe_run(timings, outcome, failure_reason=None, time_to_query=None, total=None):
+    """Records one run: per-phase durations from the step timings plus outcome counters."""
+    phases = {}
+    for t in timings:
+        if t.get("phase") and t["status"] != "skipped":
+            phases[t["phase"]] = phases.get(t["phase"], 0.0) + t["seconds"]
+    for phase, seconds in phases.items():
+        PHASE_SECONDS.labels(phase=phase).observe(seconds)
+    if time_to_query is not None:
+        PHASE_SECONDS.labels(phase="time_to_query").observe(time_to_query)
+    if total is not None:
+        PHASE_SECONDS.labels(phase="total").observe(total)
+    JOBS_TOTAL.labels(outcome=outcome).inc()
+    if failure_reason:
+        JOB_FAILURES_TOTAL.labels(reason=failure_reason).inc()
@@ -0,0 +1,33 @@
+"""
+Phase definitions for multi-phase reports (`report_jobs.status` processing_phase_1 → completed).
+
+Phase 1 is the base Genspark deep research (base_analysis_content). Phase 2 asks the
+follow-up queries below in the same conversation (specific_analysis_content). Phase 3
+turns the stored Markdown into deliverables (output_file_paths) without a browser.
+"""
+
+# Follow-up queries per report_type. Placeholders: {empresa}, {pais}, {consideraciones}.
+FOLLOW_UP_QUERIES = {
+    "trend_analysis": [
+        'A partir del análisis anterior, profundiza en las 5 tendencias con mayor impacto para "{empresa}" en "{pais}". '
+        "Para cada una indica horizonte temporal (corto, medio o largo plazo), nivel de impacto, evidencias concretas "
+        "y una recomendación accionable. Ten en cuenta: \"{consideraciones}\".",
+    ],
+    "social_listening": [
+        'A partir del análisis anterior, resume la conversación en redes sociales sobre "{empresa}" en "{pais}": '
+        "temas principales, sentimiento, comunidades e influenciadores relevantes y riesgos reputacionales. "
+        "Ten en cuenta: \"{consideraciones}\".",
+    ],
+}
+
+
+def follow_up_queries(report_type, params):
+    """
+    Phase 2 queries for a job: report_parameters["follow_up_queries"] when given,
+    otherwise the templates for its report_type (empty list means no phase 2).
+    """
+    custom = params.get("follow_up_queries")
+    if custom:
+        return [str(q) for q in custom if str(q).strip()]
+    values = {key: params.get(key) or "" for key in ("empresa", "pais", "consideraciones")}
+    return [template.format(**values) for template in FOLLOW_UP_QUERIES.get(report_type, [])]
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Rendering Configuration (overridable from .env) ---
+RENDER_OUTPUT_DIR = os.getenv("RENDER_OUTPUT_DIR", "report_output")
+RENDER_FORMATS = tuple(f.strip() for f in os.getenv("RENDER_FORMATS", "html,pdf,docx").split(",") if f.strip())
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2")) # Processes; rendering never runs on the asyncio loop
+MARKDOWN_EXTENSIONS = ["tables", "fenced_code", "sane_lists"]
+
+REPORT_CSS = """
+body { font-family: "Helvetica Neue", Arial, sans-serif; font-size: 11pt; line-height: 1.5; color: #222; max-width: 800px; margin: 2em auto; padding: 0 1em; }
+h1, h2, h3, h4 { color: #1a3a5c; line-height: 1.25; margin-top: 1.4em; }
+h1 { border-bottom: 2px solid #1a3a5c; padding-bottom: .3em; }
+table { border-collapse: collapse; width: 100%; margin: 1em 0; }
+th, td { border: 1px solid #ccc; padding: 6px 8px; text-align: left; vertical-align: top; }
+th { background: #eef2f6; }
+blockquote { border-left: 4px solid #ccd; margin: 1em 0; padding: .2em 1em; color: #555; }
+code, pre { font-family: Menlo, Consolas, monospace; background: #f5f5f5; }
+pre { padding: .8em; overflow-x: auto; }
+@page { size: A4; margin: 2cm; }
+"""
+
+
+def markdown_digest(markdown_text):
+    """Content address of a report: sha256 of its Markdown."""
+    return hashlib.sha256(markdown_text.encode("utf-8")).hexdigest()
+
+
+def render_html(markdown_text, title="Reporte"):
+    import markdown # Renderer dependencies load in the pool processes, not at import
+
+    md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    # Reports are third-party text: raw HTML in them is escaped and shown as text, never rendered.
+    md.preprocessors.deregister("html_block")
+    md.inlinePatterns.deregister("html")
+    body = md.convert(markdown_text)
+    return (
+        f'<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="UTF-8">\n'
+        f"<title>{html.escape(title)}</title>\n<style>{REPORT_CSS}</style>\n</head>\n"
+        f'<body class="markdown-body">\n{body}\n</body>\n</html>\n'
+    )
+
+
+def _write_pdf(document_html, path):
+    try:
+        from weasyprint import HTML
+    except OSError as e: # Installed, but the system cairo/pango libraries are missing
+        raise ImportError(f"weasyprint no encuentra sus librerías del sistema ({e})") from e
+    HTML(string=document_html).write_pdf(path)
+
+
+def _add_runs(paragraph, node):
+    """Adds the inline content of `node` to a python-docx paragraph, keeping bold/italic/code."""
+    from bs4 import NavigableString
+
+    for child in node.descendants:
+        if not isinstance(child, NavigableString):
+            continue
+        text = re.sub(r"\s+", " ", str(child))
+        if not text.strip() and not paragraph.runs:
+            continue
+        run = paragraph.add_run(text)
+        parents = {p.name for p in child.parents}
+        run.bold = bool(parents & {"strong", "b", "th"})
+        run.italic = bool(parents & {"em", "i"})
+        if "code" in parents:
+            run.font.name = "Consolas"
+
+
+def _write_docx(document_html, path):
+    import docx
+    from bs4 import BeautifulSoup
+
+    document = docx.Document()
+    body = BeautifulSoup(document_html, "html.parser").body
+    for node in body.find_all(recursive=False):
+        name = node.name
+        if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            document.add_heading(node.get_text(" ", strip=True), level=min(int(name[1]), 4))
+        elif name in ("ul", "ol"):
+            # Depth and list type are read before nested lists are detached from their items.
+            items = [(li, li.parent.name, len(li.find_parents(["ul", "ol"])) - 1) for li in node.find_all("li")]
+            for item, list_name, depth in items:
+                style = "List Number" if list_name == "ol" else "List Bullet"
+                paragraph = document.add_paragraph(style=style if depth == 0 else f"{style} {min(depth + 1, 3)}")
+                for sub in item.find_all(["ul", "ol"], recursive=False):
+                    sub.extract()
+                _add_runs(paragraph, item)
+        elif name == "table":
+            rows = [tr.find_all(["th", "td"]) for tr in node.find_all("tr")]
+            rows = [r for r in rows if r]
+            if not rows:
+                continue
+            table = document.add_table(rows=len(rows), cols=max(len(r) for r in rows))
+            table.style = "Table Grid"
+            for r, cells in enumerate(rows):
+                for c, cell in enumerate(cells):
+                    paragraph = table.cell(r, c).paragraphs[0]
+                    _add_runs(paragraph, cell)
+        elif name == "blockquote":
+            _add_runs(document.add_paragraph(style="Quote"), node)
+        elif name == "pre":
+            document.add_paragraph().add_run(node.get_text()).font.name = "Consolas" # Empty blocks still get a run
+        elif name == "hr":
+            continue
+        else:
+            _add_runs(document.add_paragraph(), node)
+    document.save(path)
+
+
+def render_report(markdown_text, formats=RENDER_FORMATS, output_dir=RENDER_OUTPUT_DIR):
+    """
+    Renders the Markdown to `formats` under `output_dir` as <sha256>.<ext> and returns
+    {format: path}. Files that already exist are reused, so re-rendering the same report
+    is free. Formats whose optional library (weasyprint, python-docx) is missing, or cannot
+    load its system libraries, are skipped.
+    Runs in a worker process (see ReportRenderer).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    digest = markdown_digest(markdown_text)
+    document_html = None
+    writers = {"pdf": _write_pdf, "docx": _write_docx}
+    paths = {}
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{digest}.{fmt}")
+        if not os.path.exists(path):
+            if document_html is None:
+                document_html = render_html(markdown_text)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                if fmt == "html":
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        f.write(document_html)
+                elif fmt in writers:
+                    writers[fmt](document_html, tmp_path)
+                else:
+                    raise ValueError(f"Formato de salida desconocido: {fmt}")
+            except BaseException as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if not isinstance(e, ImportError):
+                    raise
+                print(f"[Render] Formato '{fmt}' omitido, falta la dependencia: {e}")
+                continue
+            os.replace(tmp_path, path)
+        paths[fmt] = path
+    return paths
+
+
+class ReportRenderer:
+    """
+    Renders reports in a process pool so Markdown/PDF/DOCX conversion never blocks the
+    event loop driving Playwright. The pool is created on first use.
+    """
+
+    def __init__(self, max_workers=None, output_dir=None, formats=None):
+        self.max_workers = max_workers or RENDER_WORKERS
+        self.output_dir = output_dir or RENDER_OUTPUT_DIR
+        self.formats = tuple(formats or RENDER_FORMATS)
+        self._executor = None
+
+    async def render(self, markdown_text, formats=None):
+        """Returns {format: path} for the rendered (or already rendered) report."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, render_report, markdown_text, tuple(formats or self.formats), self.output_dir
+        )
+
+    def close(self):
+        """Waits for running renders and stops the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# --- Shared renderer ---
+_shared_renderer = None
+
+
+def get_report_renderer():
+    """Returns the process-wide ReportRenderer."""
+    global _shared_renderer
+    if _shared_renderer is None:
+        _shared_renderer = ReportRenderer()
+    return _shared_renderer
@@ -0,0 +1,137 @@
+import base64
+import os
+from urllib.parse import urlsplit
+
+from metrics import BLOCKED_REQUESTS, ESTIMATED_BYTES_SAVED
+
+# --- Request Filter Configuration (overridable from .env) ---
+REQUEST_FILTER_ENABLED = os.getenv("REQUEST_FILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+REQUEST_FILTER_BLOCK_TYPES = os.getenv("REQUEST_FILTER_BLOCK_TYPES", "image,font,media")
+REQUEST_FILTER_BLOCK_DOMAINS = os.getenv(
+    "REQUEST_FILTER_BLOCK_DOMAINS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,googleadservices.com,facebook.net,"
+    "facebook.com,hotjar.com,clarity.ms,segment.io,segment.com,mixpanel.com,amplitude.com,"
+    "intercom.io,intercomcdn.com,tiktok.com,linkedin.com,bing.com,twitter.com,ads-twitter.com",
+)
+# URLs containing any of these are never blocked (the spark_page image is the completion signal).
+REQUEST_FILTER_ALLOW_PATTERNS = os.getenv("REQUEST_FILTER_ALLOW_PATTERNS", "spark_page")
+
+# Blocked requests never reach the network, so their size is estimated from typical payloads.
+ESTIMATED_SIZE_BY_TYPE = {
+    "image": 40_000,
+    "font": 60_000,
+    "media": 500_000,
+    "script": 50_000,
+    "xhr": 2_000,
+    "fetch": 2_000,
+    "ping": 500,
+}
+DEFAULT_ESTIMATED_SIZE = 5_000
+TRANSPARENT_GIF = base64.b64decode("R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7")
+
+
+def _split_list(value):
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+class FilterStats:
+    """
+    Per-job counters for what the filter blocked and what was downloaded. The bytes saved
+    are an estimate (typical size per resource type); bytes received add up the
+    content-length headers, so responses without one are not counted.
+    """
+
+    def __init__(self):
+        self.blocked_requests = 0
+        self.blocked_by_type = {}
+        self.estimated_bytes_saved = 0
+        self.allowed_requests = 0
+        self.bytes_received = 0
+
+    @property
+    def estimated_saved_ratio(self):
+        """Estimated share of the page traffic the filter avoided (0-1), from the two figures above."""
+        total = self.estimated_bytes_saved + self.bytes_received
+        return self.estimated_bytes_saved / total if total else 0.0
+
+    def to_dict(self):
+        return {
+            "blocked_requests": self.blocked_requests,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+            "estimated_saved_ratio": round(self.estimated_saved_ratio, 3),
+            "allowed_requests": self.allowed_requests,
+            "bytes_received": self.bytes_received,
+        }
+
+    def summary(self):
+        return (f"{self.blocked_requests} peticiones bloqueadas (ahorro estimado ~{self.estimated_bytes_saved / 1024:.0f} KB, "
+                f"~{self.estimated_saved_ratio:.0%} del tráfico; estimación por tipo de recurso), "
+                f"{self.allowed_requests} permitidas ({self.bytes_received / 1024:.0f} KB recibidos según content-length)")
+
+
+class RequestFilter:
+    """
+    Route-interception layer for a BrowserContext: blocks non-essential resource types and
+    known tracking/analytics domains (tracker scripts and images are stubbed so pages don't
+    error), while URLs matching the allow patterns always go through.
+    """
+
+    def __init__(self, block_types=None, block_domains=None, allow_patterns=None):
+        self.block_types = set(_split_list(REQUEST_FILTER_BLOCK_TYPES if block_types is None else block_types))
+        self.block_domains = _split_list(REQUEST_FILTER_BLOCK_DOMAINS if block_domains is None else block_domains)
+        self.allow_patterns = _split_list(REQUEST_FILTER_ALLOW_PATTERNS if allow_patterns is None else allow_patterns)
+
+    def _blocked_domain(self, url):
+        host = (urlsplit(url).hostname or "").lower()
+        return any(host == d or host.endswith("." + d) for d in self.block_domains)
+
+    def should_block(self, url, resource_type):
+        """Returns True if a request for `url` of `resource_type` should not reach the network."""
+        lowered = url.lower()
+        if any(pattern in lowered for pattern in self.allow_patterns):
+            return False
+        if lowered.startswith("data:"):
+            return False
+        return resource_type in self.block_types or self._blocked_domain(url)
+
+    async def attach(self, context):
+        """Installs the route handler on `context` and returns the FilterStats it fills in."""
+        stats = FilterStats()
+        stubbed = set() # ids of requests answered locally; their responses aren't real downloads
+
+        async def handle(route):
+            request = route.request
+            resource_type = request.resource_type
+            if not self.should_block(request.url, resource_type):
+                await route.continue_()
+                return
+            stats.blocked_requests += 1
+            stats.blocked_by_type[resource_type] = stats.blocked_by_type.get(resource_type, 0) + 1
+            saved = ESTIMATED_SIZE_BY_TYPE.get(resource_type, DEFAULT_ESTIMATED_SIZE)
+            stats.estimated_bytes_saved += saved
+            BLOCKED_REQUESTS.labels(resource_type=resource_type).inc()
+            ESTIMATED_BYTES_SAVED.inc(saved)
+            # Stub what pages commonly depend on; abort the rest.
+            if resource_type in ("script", "image"):
+                stubbed.add(id(request))
+            if resource_type == "script":
+                await route.fulfill(status=200, content_type="application/javascript", body="")
+            elif resource_type == "image":
+                await route.fulfill(status=200, content_type="image/gif", body=TRANSPARENT_GIF)
+            else:
+                await route.abort("blockedbyclient")
+
+        def on_response(response):
+            if id(response.request) in stubbed:
+                stubbed.discard(id(response.request))
+                return
+            stats.allowed_requests += 1
+            try:
+                stats.bytes_received += int(response.headers.get("content-length", 0))
+            except ValueError:
+                pass
+
+        await context.route("**/*", handle)
+        context.on("response", on_response)
+        return stats
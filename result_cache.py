@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# --- Result Cache Configuration (overridable from .env) ---
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600))) # seconds
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+
+
+def _normalize(text):
+    """Case-, accent- and whitespace-insensitive form of a form field."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def make_cache_key(empresa, pais, consideraciones):
+    """Stable key for an analysis request; 'Bimbo / México' and ' bimbo /  mexico' share a key."""
+    payload = json.dumps([_normalize(empresa), _normalize(pais), _normalize(consideraciones)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent (SQLite) cache of finished analyses keyed by make_cache_key().
+    Entries expire after `ttl` seconds; beyond `max_entries` the least recently used are evicted.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self.path = path or RESULT_CACHE_PATH
+        self.ttl = RESULT_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or RESULT_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                airtable_record_id TEXT,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Returns {"content", "airtable_record_id", "created_at"} or None if missing/expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, airtable_record_id, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return {"content": row[0], "airtable_record_id": row[1], "created_at": row[2]}
+
+    def put(self, key, content, airtable_record_id=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, content, airtable_record_id, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, content, airtable_record_id, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY last_access DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+
+# --- Shared cache ---
+_shared_cache = None
+
+
+def get_result_cache():
+    """Returns the process-wide ResultCache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResultCache()
+    return _shared_cache
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import time
+
+# --- Session Cache Configuration (overridable from .env) ---
+GENSPARK_SESSION_DIR = os.getenv("GENSPARK_SESSION_DIR", ".genspark_sessions")
+GENSPARK_SESSION_MAX_AGE = int(os.getenv("GENSPARK_SESSION_MAX_AGE", str(24 * 3600)))  # seconds
+
+
+class SessionCache:
+    """
+    Persists the logged-in Playwright `storage_state` (cookies + localStorage) per
+    Genspark account so later contexts can skip the full login sequence.
+    Save times are also kept in memory, so has() does not touch the disk after the
+    first check of each account (sessions written by other processes are not seen).
+    """
+
+    def __init__(self, directory=None, max_age=None):
+        self.directory = directory or GENSPARK_SESSION_DIR
+        self.max_age = GENSPARK_SESSION_MAX_AGE if max_age is None else max_age
+        self._saved_at = {} # path -> mtime of the stored session, None when there is none
+
+    def _path(self, account):
+        # Hash the account so email addresses never end up in file names.
+        digest = hashlib.sha256(account.strip().lower().encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def has(self, account):
+        """True if a non-expired session is stored for the account (in-memory check)."""
+        path = self._path(account)
+        if path not in self._saved_at:
+            try:
+                self._saved_at[path] = os.path.getmtime(path)
+            except OSError:
+                self._saved_at[path] = None
+        saved_at = self._saved_at[path]
+        return saved_at is not None and not (self.max_age and time.time() - saved_at > self.max_age)
+
+    def load(self, account):
+        """Returns the stored storage_state dict, or None if missing, expired or unreadable."""
+        path = self._path(account)
+        try:
+            if self.max_age and time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self._saved_at[path] = None
+            return None
+
+    async def save(self, context, account):
+        """Saves the context's current storage_state for the account (atomic write, owner-only)."""
+        state = await context.storage_state()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(account)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+        self._saved_at[path] = time.time()
+
+    def invalidate(self, account):
+        """Drops the stored session so the next job performs a full login."""
+        path = self._path(account)
+        self._saved_at[path] = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# --- Shared cache ---
+_shared_cache = None
+
+
+def get_session_cache():
+    """Returns the process-wide SessionCache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SessionCache()
+    return _shared_cache
@@ -0,0 +1,105 @@
+# filename: startup_benchmark.py
+"""
+Cold-start benchmark: imports each entry module in a fresh interpreter, without .env or
+Airtable credentials, and checks the median import time against its budget. It also fails
+when an import pulls in a dependency that should only load on first use (pyairtable,
+Playwright, BeautifulSoup, the report renderers).
+
+    python startup_benchmark.py --runs 5
+    python startup_benchmark.py --modules airtable_agent app --budget-scale 1.5 --json startup.json
+
+Exits with status 1 when a module is over budget, fails to import or loads a deferred dependency.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Median import time per module (ms), measured inside the interpreter (excludes its own startup).
+MODULE_BUDGETS_MS = {
+    "airtable_agent": 150,
+    "job_manager": 200,
+    "batch_run": 200,
+    "app": 400, # Quart/Hypercorn account for most of it
+    "worker": 400,
+}
+DEFERRED_MODULES = ("pyairtable", "playwright", "bs4", "markdown", "weasyprint", "docx")
+CREDENTIAL_VARS = ("AIRTABLE_API_KEY", "AIRTABLE_BASE_ID", "AIRTABLE_TABLE_NAME", "GENSPARK_EMAIL", "GENSPARK_PASSWORD")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    """Imports `module` `runs` times in fresh interpreters; returns the per-module summary."""
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIAL_VARS}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    samples, loaded, error = [], set(), None
+    # Run from an empty directory so load_dotenv() finds no .env file.
+    with tempfile.TemporaryDirectory(prefix="kenmei_startup_") as cwd:
+        for _ in range(runs):
+            proc = subprocess.run(
+                [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+                cwd=cwd, env=env, capture_output=True, text=True, timeout=120,
+            )
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or ["sin salida"])[-1]
+                break
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            samples.append(result["ms"])
+            loaded.update(result["loaded"])
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(samples), 1) if samples else None,
+        "max_ms": round(max(samples), 1) if samples else None,
+        "loaded_deferred": sorted(loaded),
+        "error": error,
+    }
+
+
+def run_startup_benchmark(args):
+    failures = 0
+    summary = []
+    print(f"{'módulo':<16}{'mediana':>10}{'máx':>10}{'presupuesto':>13}  estado")
+    for module in args.modules:
+        budget = MODULE_BUDGETS_MS.get(module, args.default_budget_ms) * args.budget_scale
+        result = measure(module, args.runs)
+        result["budget_ms"] = round(budget, 1)
+        if result["error"]:
+            status = f"ERROR: {result['error']}"
+        elif result["loaded_deferred"]:
+            status = f"carga dependencias diferidas: {', '.join(result['loaded_deferred'])}"
+        elif result["median_ms"] > budget:
+            status = "fuera de presupuesto"
+        else:
+            status = "ok"
+        result["status"] = status
+        failures += status != "ok"
+        summary.append(result)
+        median = f"{result['median_ms']:.0f} ms" if result["median_ms"] is not None else "-"
+        worst = f"{result['max_ms']:.0f} ms" if result["max_ms"] is not None else "-"
+        print(f"{module:<16}{median:>10}{worst:>10}{budget:>10.0f} ms  {status}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío (tiempo de importación por módulo).")
+    parser.add_argument("--modules", nargs="+", default=list(MODULE_BUDGETS_MS), help="Módulos a importar (default: puntos de entrada).")
+    parser.add_argument("--runs", type=int, default=5, help="Importaciones por módulo (default: 5).")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiplica los presupuestos (p. ej. 2 en máquinas lentas de CI).")
+    parser.add_argument("--default-budget-ms", type=float, default=200, help="Presupuesto de módulos sin uno propio.")
+    parser.add_argument("--json", help="Escribe el resumen en este archivo JSON.")
+    sys.exit(1 if run_startup_benchmark(parser.parse_args()) else 0)
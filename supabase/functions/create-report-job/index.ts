@@ -72,6 +72,47 @@ async function getRedisClient(): Promise<Redis> {
 }
 // --- End Redis Initialization ---
 
+// --- Admission Control ---
+// Submissions are refused (429) once the queue or the user's share of it is full. CAPACITY
+// should match ADMISSION_MAX_RUNNING in worker.py (jobs holding a browser cluster-wide).
+const ADMISSION_MAX_QUEUED = Number(Deno.env.get("ADMISSION_MAX_QUEUED") ?? "50");
+const ADMISSION_MAX_ACTIVE_PER_USER = Number(Deno.env.get("ADMISSION_MAX_ACTIVE_PER_USER") ?? "5");
+const ADMISSION_CAPACITY = Number(Deno.env.get("ADMISSION_CAPACITY") ?? "8");
+const DEFAULT_JOB_SECONDS = 600; // Used until there are completed jobs to average
+const MIN_RETRY_AFTER_SECONDS = 30;
+
+interface QueueStats {
+  queued_total: number;
+  running_total: number;
+  active_user: number;
+  avg_seconds: number | null;
+}
+
+// Fluid approximation: jobs ahead are served ADMISSION_CAPACITY at a time, avg_seconds each.
+function estimateEtaSeconds(stats: QueueStats): number {
+  const jobSeconds = stats.avg_seconds ?? DEFAULT_JOB_SECONDS;
+  const ahead = Math.max(0, stats.queued_total + stats.running_total + 1 - ADMISSION_CAPACITY);
+  return Math.ceil(jobSeconds * (ahead / ADMISSION_CAPACITY + 1));
+}
+
+// Returns the Retry-After (seconds) and reason when the job must be refused, or null to admit it.
+function admissionRefusal(stats: QueueStats): { retryAfter: number; reason: string } | null {
+  const jobSeconds = stats.avg_seconds ?? DEFAULT_JOB_SECONDS;
+  if (stats.active_user >= ADMISSION_MAX_ACTIVE_PER_USER) {
+    // One of the user's own jobs has to finish first
+    return { retryAfter: Math.max(MIN_RETRY_AFTER_SECONDS, Math.ceil(jobSeconds)), reason: 'user_limit' };
+  }
+  if (stats.queued_total >= ADMISSION_MAX_QUEUED) {
+    // A slot frees every jobSeconds / capacity on average; wait for the overflow to drain
+    const overflow = stats.queued_total - ADMISSION_MAX_QUEUED + 1;
+    return {
+      retryAfter: Math.max(MIN_RETRY_AFTER_SECONDS, Math.ceil(jobSeconds * overflow / ADMISSION_CAPACITY)),
+      reason: 'queue_full',
+    };
+  }
+  return null;
+}
+
 // Define the schema for the request body using Zod
 const RequestBodySchema = z.object({
   report_type: z.string().min(1, { message: "Report type is required" }),
@@ -83,7 +124,7 @@ interface ReportJobInsert {
   user_id: string;
   report_type: string;
   report_parameters?: Record<string, unknown>;
-  status: 'pending' | 'processing' | 'completed' | 'failed';
+  status: 'pending' | 'processing' | 'completed' | 'failed' | 'queue_failed';
   // Add other fields from your report_jobs table schema as needed
 }
 
@@ -145,6 +186,7 @@ Deno.serve(async (req) => {
     'Access-Control-Allow-Origin': allowedOrigins.includes(origin) ? origin : 'http://localhost:3000',
     'Access-Control-Allow-Methods': 'POST, OPTIONS',
     'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+    'Access-Control-Expose-Headers': 'Retry-After',
     'Access-Control-Max-Age': '3600', // Cache preflight for 1 hour
   }
   
@@ -196,7 +238,31 @@ Deno.serve(async (req) => {
     const { report_type, report_parameters } = validationResult.data
     console.log(`Validated request: Type=${report_type}, Params=`, report_parameters)
 
-    // 4. Create the report job in the database
+    // 4. Admission control: refuse when saturated, otherwise estimate the ETA
+    const { data: queueStats, error: statsError } = await supabaseClient.rpc('report_queue_stats');
+    let etaSeconds: number | null = null;
+    if (statsError || !queueStats) {
+      // Don't block submissions on the estimate itself
+      console.error('[Admission] Could not read queue stats:', statsError?.message);
+    } else {
+      const refusal = admissionRefusal(queueStats as QueueStats);
+      if (refusal) {
+        console.log(`[Admission] Refusing job for user ${user.id}: ${refusal.reason}, retry after ${refusal.retryAfter}s`);
+        return new Response(
+          JSON.stringify({
+            error: refusal.reason === 'user_limit'
+              ? 'Too many active report jobs for this user. Please retry later.'
+              : 'The report queue is full. Please retry later.',
+            reason: refusal.reason,
+            retry_after_seconds: refusal.retryAfter,
+          }),
+          { status: 429, headers: { 'Content-Type': 'application/json', 'Retry-After': String(refusal.retryAfter), ...corsHeaders } }
+        );
+      }
+      etaSeconds = estimateEtaSeconds(queueStats as QueueStats);
+    }
+
+    // 5. Create the report job in the database
     const newJobData: ReportJobInsert = {
       user_id: user.id,
       report_type: report_type,
@@ -216,31 +282,50 @@ Deno.serve(async (req) => {
 
     console.log(`Successfully created job ID: ${createdJob.id}`) 
 
-    // 5. Publish Job ID to Redis (Restored)
+    // 6. Publish Job ID to Redis (Restored)
     console.log(`[Main] Publishing job ID ${createdJob.id} to Redis queue...`);
     const publishResult = await publishJobIdToQueue(createdJob.id);
     
     if (!publishResult.success) {
       console.error(`[Main] CRITICAL: Failed to publish job ID ${createdJob.id} to Redis queue. Error: ${publishResult.error}`);
-      
-      // Return detailed error to user
+
+      // Mark the job so the worker reaper queues it once Redis is reachable again
+      const { error: statusError } = await supabaseClient
+        .from('report_jobs')
+        .update({ status: 'queue_failed' })
+        .eq('id', createdJob.id);
+
+      if (statusError) {
+        console.error(`[Main] Failed to mark job ID ${createdJob.id} as queue_failed:`, statusError);
+        return new Response(
+          JSON.stringify({ 
+            error: 'Job created but failed to queue for processing. Please try again.',
+            details: publishResult.error,
+            jobId: createdJob.id 
+          }), 
+          { status: 500, headers: { 'Content-Type': 'application/json', ...corsHeaders } }
+        );
+      }
+
       return new Response(
-        JSON.stringify({ 
-          error: 'Job created but failed to queue for processing. Please try again.',
-          details: publishResult.error,
-          jobId: createdJob.id 
-        }), 
-        { status: 500, headers: { 'Content-Type': 'application/json', ...corsHeaders } }
+        JSON.stringify({
+          message: `Report job created with ID: ${createdJob.id}; it will be queued automatically once the queue is available.`,
+          jobId: createdJob.id,
+          status: 'queue_failed',
+          eta_seconds: etaSeconds,
+        }),
+        { status: 202, headers: { 'Content-Type': 'application/json', ...corsHeaders } }
       );
     }
     
     console.log(`[Main] Successfully queued job ID ${createdJob.id} for processing`);
 
-    // 6. Return success response
+    // 7. Return success response
     const responseData = {
       message: `Report job successfully created with ID: ${createdJob.id} and queued for processing.`,
       jobId: createdJob.id,
       status: createdJob.status,
+      eta_seconds: etaSeconds, // Approximate: fair scheduling may start it sooner
     }
 
     return new Response(
@@ -0,0 +1,16 @@
+-- Columns for reliable job processing (see worker.py): retry bookkeeping and lease expiry
+
+-- 1. Failed or expired attempts so far (drives the capped exponential backoff)
+ALTER TABLE public.report_jobs
+ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+
+-- 2. When a job scheduled for retry becomes due; the worker reaper re-queues it after this time
+ALTER TABLE public.report_jobs
+ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+
+-- 3. The lease itself is updated_at (bumped by worker heartbeats through the on_report_job_update trigger).
+-- Index the rows the reaper scans: leased jobs by age, and jobs waiting to be (re-)queued.
+CREATE INDEX IF NOT EXISTS report_jobs_lease_idx ON public.report_jobs(updated_at)
+    WHERE status IN ('processing_phase_1', 'processing_phase_2', 'processing_phase_3');
+CREATE INDEX IF NOT EXISTS report_jobs_requeue_idx ON public.report_jobs(next_attempt_at)
+    WHERE status = 'queue_failed' OR next_attempt_at IS NOT NULL;
@@ -0,0 +1,40 @@
+-- Admission control and ETA estimates for report_jobs (see worker.py and create-report-job)
+
+-- 1. Start/finish of the last attempt, so ETAs can be estimated from historical durations
+ALTER TABLE public.report_jobs
+ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ;
+
+ALTER TABLE public.report_jobs
+ADD COLUMN IF NOT EXISTS finished_at TIMESTAMPTZ;
+
+-- 2. Queued/running jobs are counted on every submission and every claim
+CREATE INDEX IF NOT EXISTS report_jobs_active_idx ON public.report_jobs(status, user_id)
+    WHERE status IN ('pending', 'queue_failed', 'processing_phase_1', 'processing_phase_2');
+CREATE INDEX IF NOT EXISTS report_jobs_completed_idx ON public.report_jobs(finished_at DESC)
+    WHERE status = 'completed';
+
+-- 3. Queue snapshot for the create-report-job admission check and ETA.
+-- SECURITY DEFINER: the edge function runs as the user, but the totals span every user's jobs
+-- (only counts are exposed; the per-user count is always the caller's own).
+CREATE OR REPLACE FUNCTION public.report_queue_stats()
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER SET search_path = public
+AS $$
+  SELECT jsonb_build_object(
+    'queued_total', count(*) FILTER (WHERE status IN ('pending', 'queue_failed')),
+    'running_total', count(*) FILTER (WHERE status IN ('processing_phase_1', 'processing_phase_2')),
+    'active_user', count(*) FILTER (WHERE user_id = auth.uid()),
+    'avg_seconds', (
+      SELECT avg(extract(epoch FROM finished_at - started_at))
+        FROM (SELECT started_at, finished_at FROM public.report_jobs
+               WHERE status = 'completed' AND started_at IS NOT NULL AND finished_at IS NOT NULL
+               ORDER BY finished_at DESC LIMIT 100) recent
+    )
+  )
+  FROM public.report_jobs
+  WHERE status IN ('pending', 'queue_failed', 'processing_phase_1', 'processing_phase_2');
+$$;
+
+GRANT EXECUTE ON FUNCTION public.report_queue_stats() TO authenticated;
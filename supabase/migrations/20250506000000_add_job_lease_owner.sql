@@ -0,0 +1,7 @@
+-- Lease ownership for report_jobs (see JobStore in worker.py)
+
+-- 1. Worker that claimed the current attempt. Together with attempts it is the lease token:
+-- writes on behalf of a claim only apply while the row still carries both values, so a worker
+-- whose lease expired cannot overwrite the attempt that replaced it.
+ALTER TABLE public.report_jobs
+ADD COLUMN IF NOT EXISTS leased_by TEXT;
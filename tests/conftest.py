@@ -0,0 +1,135 @@
+"""
+Shared test setup. The modules live at the repository root, so it is put on sys.path.
+
+    python -m pytest -q
+    TEST_DATABASE_URL=postgresql://postgres@localhost/postgres TEST_REDIS_URL=redis://localhost:6379/15 python -m pytest -q
+
+pytest itself is not in requirements.txt (a deployment list); install it separately.
+Async code is driven with asyncio.run() inside each test (no pytest plugin needed).
+The worker tests need a throwaway Postgres server (TEST_DATABASE_URL) and Redis database
+(TEST_REDIS_URL, flushed before every test); the tests that use them are skipped without one.
+"""
+import asyncio
+import datetime
+import glob
+import os
+import sys
+import uuid
+from urllib.parse import urlsplit
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+# app refuses submissions without Airtable settings; no test talks to Airtable.
+for name in ("AIRTABLE_API_KEY", "AIRTABLE_BASE_ID", "AIRTABLE_TABLE_NAME"):
+    os.environ.setdefault(name, "test")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+MIGRATIONS_DIR = os.path.join(REPO_DIR, "supabase", "migrations")
+# What the migrations expect from Supabase: auth.users, auth.uid() and the authenticated role.
+AUTH_STUB_SQL = """
+CREATE SCHEMA auth;
+CREATE TABLE auth.users (id uuid PRIMARY KEY DEFAULT gen_random_uuid());
+CREATE FUNCTION auth.uid() RETURNS uuid LANGUAGE sql STABLE
+    AS $$ SELECT nullif(current_setting('request.jwt.claim.sub', true), '')::uuid $$;
+DO $$ BEGIN CREATE ROLE authenticated; EXCEPTION WHEN duplicate_object THEN NULL; END $$;
+"""
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    """A throwaway database on the TEST_DATABASE_URL server with supabase/migrations applied."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL no está definido (servidor Postgres desechable).")
+    asyncpg = pytest.importorskip("asyncpg")
+    name = f"kenmei_test_{uuid.uuid4().hex[:12]}"
+    url = urlsplit(TEST_DATABASE_URL)._replace(path=f"/{name}").geturl()
+
+    async def create():
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            await admin.execute(f'CREATE DATABASE "{name}"')
+        finally:
+            await admin.close()
+        conn = await asyncpg.connect(url)
+        try:
+            await conn.execute(AUTH_STUB_SQL)
+            for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+                with open(path, encoding="utf-8") as f:
+                    await conn.execute(f.read())
+        finally:
+            await conn.close()
+
+    async def drop():
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            await admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        finally:
+            await admin.close()
+
+    asyncio.run(create())
+    yield url
+    asyncio.run(drop())
+
+
+@pytest.fixture
+def redis_url():
+    """TEST_REDIS_URL, flushed so every test starts from empty queues."""
+    if not TEST_REDIS_URL:
+        pytest.skip("TEST_REDIS_URL no está definido (base Redis desechable).")
+    redis = pytest.importorskip("redis")
+    client = redis.Redis.from_url(TEST_REDIS_URL)
+    try:
+        client.flushdb()
+    finally:
+        client.close()
+    return TEST_REDIS_URL
+
+
+@pytest.fixture
+def db(database_url):
+    """Runs `scenario(store, conn)` against a JobStore on emptied tables; returns its result."""
+    from worker import JobStore
+
+    def run(scenario):
+        async def main():
+            store = await JobStore.connect(database_url)
+            try:
+                async with store.pool.acquire() as conn:
+                    await conn.execute("TRUNCATE public.report_jobs, public.profiles, auth.users CASCADE")
+                    return await scenario(store, conn)
+            finally:
+                await store.close()
+        return asyncio.run(main())
+    return run
+
+
+async def add_user(conn, credits=10):
+    user_id = await conn.fetchval("INSERT INTO auth.users DEFAULT VALUES RETURNING id")
+    await conn.execute("UPDATE public.profiles SET credits = $2 WHERE id = $1", user_id, credits) # Profile made by trigger
+    return user_id
+
+
+async def add_job(conn, user_id, status="pending", age=0, **columns):
+    """Inserts a job created `age` seconds ago (updated_at too, since INSERT skips the update trigger)."""
+    created_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age)
+    values = {
+        "user_id": user_id,
+        "status": status,
+        "report_type": "trend_analysis",
+        "report_parameters": {"empresa": "Bimbo", "pais": "MX", "consideraciones": "x"}, # jsonb codec set by JobStore
+        "created_at": created_at,
+        "updated_at": created_at,
+        **columns,
+    }
+    names = ", ".join(values)
+    params = ", ".join(f"${i}" for i in range(1, len(values) + 1))
+    return await conn.fetchval(f"INSERT INTO public.report_jobs ({names}) VALUES ({params}) RETURNING id", *values.values())
+
+
+async def job_row(conn, job_id):
+    return await conn.fetchrow("SELECT * FROM public.report_jobs WHERE id = $1", job_id)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+import airtable_writer
+from airtable_writer import AirtableWriter, TokenBucket, _is_retryable
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+class FakeTable:
+    """Records batch calls; fails a call while `errors` has entries, and any batch holding a "bad" record."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    def _maybe_fail(self, records):
+        if self.errors:
+            raise self.errors.pop(0)
+        if any(r.get("bad") or r.get("fields", {}).get("bad") for r in records):
+            raise HTTPError(422)
+
+    def batch_create(self, records):
+        self.calls.append(("create", records))
+        self._maybe_fail(records)
+        return [{"id": f"rec{r['n']}"} for r in records]
+
+    def batch_update(self, records):
+        self.calls.append(("update", records))
+        self._maybe_fail(records)
+        return records
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(airtable_writer, "AIRTABLE_MAX_BACKOFF", 0)
+
+
+def run_writer(table, scenario, **options):
+    async def main():
+        writer = AirtableWriter(table, rate=1000, batch_window=0.05, **options)
+        try:
+            return await scenario(writer)
+        finally:
+            await writer.close()
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("status, retryable", [(None, True), (429, True), (500, True), (503, True), (400, False), (404, False), (422, False)])
+def test_is_retryable(status, retryable):
+    error = ConnectionError("reset") if status is None else HTTPError(status)
+    assert _is_retryable(error) is retryable
+
+
+def test_token_bucket_paces_acquisitions_after_the_burst():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+    # Two tokens are available at once; the other four arrive every 1/20 s.
+    assert 0.15 <= asyncio.run(main()) < 0.5
+
+
+def test_concurrent_creates_share_one_batch_request():
+    table = FakeTable()
+    ids = run_writer(table, lambda w: asyncio.gather(*[w.create({"n": i}) for i in range(5)]))
+    assert ids == [f"rec{i}" for i in range(5)]
+    assert [kind for kind, _ in table.calls] == ["create"]
+
+
+def test_batches_are_split_at_batch_size():
+    table = FakeTable()
+    run_writer(table, lambda w: asyncio.gather(*[w.create({"n": i}) for i in range(15)]))
+    assert [len(records) for _, records in table.calls] == [10, 5]
+
+
+def test_updates_to_the_same_record_are_merged():
+    table = FakeTable()
+    run_writer(table, lambda w: asyncio.gather(w.update("rec1", {"a": 1}), w.update("rec1", {"a": 2, "b": 3})))
+    assert table.calls == [("update", [{"id": "rec1", "fields": {"a": 2, "b": 3}}])]
+
+
+def test_retryable_errors_are_retried():
+    table = FakeTable(errors=[HTTPError(429), HTTPError(503)])
+    assert run_writer(table, lambda w: w.create({"n": 1})) == "rec1"
+    assert len(table.calls) == 3
+
+
+def test_non_retryable_error_fails_only_the_offending_record():
+    table = FakeTable()
+
+    async def scenario(writer):
+        return await asyncio.gather(
+            *[writer.create({"n": i, "bad": i == 3}) for i in range(8)],
+            *[writer.update(f"rec{i}", {"bad": i == 1}) for i in range(4)],
+            return_exceptions=True,
+        )
+
+    results = run_writer(table, scenario)
+    creates, updates = results[:8], results[8:]
+    assert isinstance(creates[3], HTTPError)
+    assert [r for i, r in enumerate(creates) if i != 3] == ["rec0", "rec1", "rec2", "rec4", "rec5", "rec6", "rec7"]
+    assert isinstance(updates[1], HTTPError)
+    assert [updates[0], updates[2], updates[3]] == [None, None, None]
+
+
+def test_table_factory_errors_fail_the_writes_instead_of_the_consumer():
+    def factory():
+        raise ValueError("Airtable environment variables not set correctly.")
+
+    async def scenario(writer):
+        with pytest.raises(ValueError):
+            await writer.create({"n": 1})
+        with pytest.raises(ValueError): # The consumer task is still alive
+            await writer.update("rec1", {"a": 1})
+
+    run_writer(factory, scenario)
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("quart")
+
+import app as app_module
+from job_manager import Job, QueueSaturated, ShuttingDown
+
+
+class FakeManager:
+    """Stands in for the JobManager the server creates at startup."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.accepting = True
+        self.saturated = False
+
+    def submit(self, empresa, pais, consideraciones, client=None):
+        if not self.accepting:
+            raise ShuttingDown("El servidor se está deteniendo; no se aceptan trabajos nuevos.")
+        if self.saturated:
+            raise QueueSaturated("Hay demasiados trabajos en cola.", 45)
+        job = Job(empresa, pais, consideraciones, "key")
+        job.client = client
+        self.jobs[job.id] = job
+        return job, None
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = FakeManager()
+    monkeypatch.setattr(app_module, "job_manager", manager)
+    return manager
+
+
+def call(method, path, **kwargs):
+    async def main():
+        response = await getattr(app_module.app.test_client(), method)(path, **kwargs)
+        return response.status_code, response.headers, await response.get_data(as_text=True)
+    return asyncio.run(main())
+
+
+def test_submit_returns_the_job_right_away(manager):
+    status, _, body = call("post", "/submit", json={"empresa": "Bimbo", "pais": "MX", "consideraciones": "x"})
+    [job] = manager.jobs.values()
+    assert job.client == "<local>" # Quart test client address
+    assert status == 202 and f'"status_url":"/jobs/{job.id}"' in body.replace(" ", "")
+
+
+@pytest.mark.parametrize("kwargs", [{"json": {"empresa": "Bimbo"}}, {"data": "empresa=Bimbo"}])
+def test_submit_rejects_incomplete_requests(manager, kwargs):
+    assert call("post", "/submit", **kwargs)[0] == 400
+    assert manager.jobs == {}
+
+
+def test_submit_while_draining_is_refused(manager):
+    manager.accepting = False
+    assert call("post", "/submit", json={"empresa": "Bimbo", "pais": "MX", "consideraciones": "x"})[0] == 503
+
+
+def test_submit_while_saturated_asks_to_retry_later(manager):
+    manager.saturated = True
+    status, headers, body = call("post", "/submit", json={"empresa": "Bimbo", "pais": "MX", "consideraciones": "x"})
+    assert status == 429 and headers["Retry-After"] == "45"
+    assert '"retry_after_seconds":45' in body.replace(" ", "")
+
+
+def test_job_status(manager):
+    job, _ = manager.submit("Bimbo", "MX", "x")
+    job.log("Investigando...")
+    status, _, body = call("get", f"/jobs/{job.id}")
+    assert status == 200 and "Investigando..." in body
+    assert "Investigando..." not in call("get", f"/jobs/{job.id}?since=1")[2]
+    assert call("get", "/jobs/desconocido")[0] == 404
+
+
+def test_job_events_stream_until_the_job_finishes(manager):
+    job, _ = manager.submit("Bimbo", "MX", "x")
+    job.log("Creando registro...")
+
+    async def main():
+        async def run_job():
+            await asyncio.sleep(0.05)
+            job.log("Investigando...")
+            job.set_progress("Mitad del reporte")
+            job.status = "completed"
+            job.publish_status()
+
+        runner = asyncio.create_task(run_job())
+        response = await app_module.app.test_client().get(f"/jobs/{job.id}/events")
+        await runner
+        return response.status_code, response.headers["Content-Type"], await response.get_data(as_text=True)
+
+    status, content_type, body = asyncio.run(main())
+    assert status == 200 and content_type.startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in body.splitlines() if line.startswith("event: ")]
+    assert events == ["status", "log", "progress", "status"]
+    assert "id: 2\n" in body # Log seqs become event ids, so reconnects resume
+
+
+def test_finished_jobs_send_a_single_snapshot(manager):
+    job, _ = manager.submit("Bimbo", "MX", "x")
+    job.log("Uno")
+    job.log("Dos")
+    job.status = "completed"
+    status, _, body = call("get", f"/jobs/{job.id}/events", headers={"Last-Event-ID": "1"})
+    assert status == 200 and body.count("event: ") == 1
+    assert "Dos" in body and "Uno" not in body
+    assert call("get", "/jobs/desconocido/events")[0] == 404
+
+
+def test_rendered_reports_are_served(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "RENDER_OUTPUT_DIR", str(tmp_path))
+    (tmp_path / "abc.html").write_text("<h1>Reporte</h1>", encoding="utf-8")
+    (tmp_path / "abc.pdf").write_bytes(b"%PDF-1.7")
+    status, headers, body = call("get", "/reports/abc.html")
+    assert status == 200 and body == "<h1>Reporte</h1>" and "attachment" not in headers.get("Content-Disposition", "")
+    assert headers["Content-Security-Policy"] == app_module.REPORT_CSP
+    status, headers, _ = call("get", "/reports/abc.pdf")
+    assert status == 200 and "attachment" in headers["Content-Disposition"]
+    assert call("get", "/reports/../app.py")[0] == 404
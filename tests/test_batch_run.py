@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from batch_run import load_checkpoint, load_rows, percentile
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def test_load_rows_from_csv(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_text("empresa,pais,consideraciones\nBimbo , México,retail\n", encoding="utf-8")
+    assert load_rows(str(path)) == [{"empresa": "Bimbo", "pais": "México", "consideraciones": "retail"}]
+
+
+def test_non_string_values_are_converted(tmp_path):
+    path = write_jsonl(tmp_path / "rows.jsonl", [{"empresa": 7, "pais": "MX", "consideraciones": True}])
+    assert load_rows(path) == [{"empresa": "7", "pais": "MX", "consideraciones": "True"}]
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"empresa": ["Bimbo"], "pais": "MX", "consideraciones": "x"}, "valores no válidos en empresa"),
+    ({"empresa": "Bimbo", "pais": None, "consideraciones": "  "}, "faltan campos pais, consideraciones"),
+    (["Bimbo", "MX", "x"], "se esperaba un objeto JSON"),
+])
+def test_invalid_rows_are_rejected(tmp_path, row, message):
+    path = write_jsonl(tmp_path / "rows.jsonl", [{"empresa": "A", "pais": "MX", "consideraciones": "x"}, row])
+    with pytest.raises(ValueError, match=f"Fila 2: {message}"):
+        load_rows(path)
+
+
+def test_checkpoint_keeps_only_completed_rows(tmp_path):
+    path = write_jsonl(tmp_path / "checkpoint.jsonl", [{"key": "a", "status": "completed"}, {"key": "b", "status": "failed"}])
+    assert load_checkpoint(path) == {"a"}
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_percentile_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 0)) == (3, 5, 1)
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+from credential_pool import Account, CredentialPool, NoAccountAvailable, load_accounts
+
+
+class FakeSessions:
+    def __init__(self, warm=()):
+        self.warm = set(warm)
+        self.invalidated = []
+
+    def has(self, email):
+        return email in self.warm
+
+    def invalidate(self, email):
+        self.warm.discard(email)
+        self.invalidated.append(email)
+
+
+def make_pool(*accounts, warm=()):
+    return CredentialPool(list(accounts), session_cache=FakeSessions(warm))
+
+
+def test_acquire_and_release_respect_max_concurrency():
+    async def main():
+        account = Account("a@x.com", "pw", max_concurrency=2)
+        pool = make_pool(account)
+        first = await pool.acquire(timeout=1)
+        second = await pool.acquire(timeout=1)
+        assert first is second is account and account.active == 2
+        with pytest.raises(NoAccountAvailable):
+            await pool.acquire(timeout=0.05)
+        await pool.release(first)
+        assert await pool.acquire(timeout=1) is account
+
+    asyncio.run(main())
+
+
+def test_acquire_waits_for_a_release():
+    async def main():
+        account = Account("a@x.com", "pw", max_concurrency=1)
+        pool = make_pool(account)
+        leased = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire(timeout=1))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await pool.release(leased)
+        assert await waiter is account
+
+    asyncio.run(main())
+
+
+def test_prefers_warm_session_then_least_busy():
+    async def main():
+        cold = Account("cold@x.com", "pw", max_concurrency=4)
+        warm = Account("warm@x.com", "pw", max_concurrency=4)
+        pool = make_pool(cold, warm, warm={"warm@x.com"})
+        assert await pool.acquire() is warm
+        pool.session_cache.warm.clear()
+        assert await pool.acquire() is cold # Both cold now: the idle one wins
+
+    asyncio.run(main())
+
+
+def test_report_failure_cools_the_account_down_exponentially():
+    async def main():
+        account = Account("a@x.com", "pw", cooldown=100)
+        other = Account("b@x.com", "pw")
+        pool = make_pool(account, other, warm={"a@x.com"})
+        leased = await pool.acquire()
+        assert leased is account
+        await pool.report_failure(account, "quota")
+        await pool.release(account, success=False)
+        assert account.disabled_until == pytest.approx(time.time() + 100, abs=2)
+        assert account.disabled_reason == "quota"
+        assert await pool.acquire() is other # Out of rotation despite its warm session
+        await pool.report_failure(account, "quota")
+        assert account.disabled_until == pytest.approx(time.time() + 200, abs=2)
+
+    asyncio.run(main())
+
+
+def test_login_failure_invalidates_the_cached_session():
+    async def main():
+        account = Account("a@x.com", "pw")
+        pool = make_pool(account, warm={"a@x.com"})
+        await pool.acquire()
+        await pool.report_failure(account, "login_failed")
+        assert pool.session_cache.invalidated == ["a@x.com"]
+        with pytest.raises(NoAccountAvailable):
+            await pool.acquire(timeout=0.05)
+
+    asyncio.run(main())
+
+
+def test_successful_release_resets_the_failure_streak():
+    async def main():
+        account = Account("a@x.com", "pw", cooldown=0)
+        pool = make_pool(account)
+        await pool.acquire()
+        await pool.report_failure(account, "quota")
+        await pool.release(account, success=True)
+        assert account.failures == 0
+
+    asyncio.run(main())
+
+
+def test_acquire_without_accounts_fails_fast():
+    with pytest.raises(NoAccountAvailable):
+        asyncio.run(make_pool().acquire(timeout=10))
+
+
+def test_load_accounts_from_json_env(monkeypatch):
+    monkeypatch.setenv("GENSPARK_ACCOUNTS", '[{"email": "a@x.com", "password": "pw", "max_concurrency": 3}]')
+    [account] = load_accounts()
+    assert (account.email, account.password, account.max_concurrency) == ("a@x.com", "pw", 3)
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("bs4")
+
+from html_to_markdown import html_to_markdown
+
+
+def test_headings_paragraphs_and_inline_formatting():
+    html = '<h1>Título</h1><p>Hola <strong>mundo</strong> y <em>más</em> <a href="https://x.y">link</a></p>'
+    assert html_to_markdown(html) == "# Título\n\nHola **mundo** y *más* [link](https://x.y)"
+
+
+def test_nested_and_ordered_lists():
+    html = "<ul><li>a<ul><li>b</li></ul></li><li>c</li></ul><ol><li>uno</li><li>dos</li></ol>"
+    assert html_to_markdown(html) == "- a\n   - b\n- c\n\n1. uno\n2. dos"
+
+
+def test_table_escapes_pipes_and_keeps_code():
+    html = "<table><tr><th>A</th><th>B</th></tr><tr><td>1|2</td><td><code>x</code></td></tr></table>"
+    assert html_to_markdown(html) == "| A | B |\n| --- | --- |\n| 1\\|2 | `x` |"
+
+
+def test_blockquote_rule_and_code_block():
+    html = "<blockquote><p>cita</p></blockquote><hr><pre><code>a = 1\nb</code></pre>"
+    assert html_to_markdown(html) == "> cita\n\n---\n\n```\na = 1\nb\n```"
+
+
+def test_skips_scripts_buttons_images_and_javascript_links():
+    html = '<p>a<br>b</p><script>bad()</script><button>Copy</button><a href="javascript:void(0)">js</a><img src="spark_page.png">'
+    assert html_to_markdown(html) == "a  \nb\n\njs"
@@ -0,0 +1,30 @@
+import job_log
+from job_log import JobLog
+
+
+def test_entries_are_numbered_and_tailed():
+    log = JobLog("job1")
+    for i in range(5):
+        log(f"paso {i}")
+    assert [e["seq"] for e in log.tail(n=2)] == [4, 5]
+    assert [e["message"] for e in log.tail(since=3)] == ["paso 3", "paso 4"]
+    assert log.last_message == "paso 4"
+
+
+def test_buffer_is_bounded_and_messages_truncated():
+    log = JobLog("job1", maxlen=3)
+    for i in range(10):
+        log.info(f"paso {i}")
+    log.error("x" * (job_log.JOB_LOG_MESSAGE_MAX + 50), detail="Traceback ...")
+    entries = log.tail(n=10)
+    assert [e["seq"] for e in entries] == [9, 10, 11]
+    assert entries[-1]["level"] == "ERROR" and len(entries[-1]["message"]) == job_log.JOB_LOG_MESSAGE_MAX + 1
+
+
+def test_debug_entries_only_reach_the_sink():
+    seen = []
+    log = JobLog("job1", on_entry=seen.append)
+    log.debug("detalle")
+    log.warning("cuidado")
+    assert [e["message"] for e in log.tail()] == ["cuidado"]
+    assert [e["level"] for e in seen] == ["WARNING"]
@@ -0,0 +1,258 @@
+import asyncio
+
+import pytest
+
+import job_manager
+from job_manager import JobManager, QueueSaturated, ShuttingDown
+from metrics import PENDING_JOBS, RUNNING_JOBS
+
+
+class FakeCache:
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, content, airtable_record_id=None):
+        self.entries[key] = {"content": content, "airtable_record_id": airtable_record_id}
+
+
+class FakeRenderer:
+    async def render(self, markdown_text):
+        return {"html": "report_output/x.html"}
+
+
+@pytest.fixture
+def genspark(monkeypatch):
+    """Replaces Airtable and Genspark; each run waits for `release` and then returns `result`."""
+    state = {"release": None, "runs": 0, "running": 0, "max_running": 0, "result": {"success": True, "content": "# Reporte", "timings": []}}
+
+    async def create_record(empresa, pais, consideraciones):
+        return f"rec-{empresa}", None
+
+    async def run(empresa, pais, consideraciones, record_id, job_log=None, on_progress=None):
+        state["runs"] += 1
+        state["running"] += 1
+        state["max_running"] = max(state["max_running"], state["running"])
+        try:
+            job_log("Investigando...")
+            on_progress("Mitad del reporte")
+            await state["release"].wait()
+            if isinstance(state["result"], Exception):
+                raise state["result"]
+            return state["result"]
+        finally:
+            state["running"] -= 1
+
+    monkeypatch.setattr(job_manager, "create_airtable_record_async", create_record)
+    monkeypatch.setattr(job_manager, "run_genspark_interaction", run)
+    monkeypatch.setattr(job_manager, "get_report_renderer", FakeRenderer)
+    return state
+
+
+def run_manager(genspark, scenario, cache=None, **options):
+    async def main():
+        genspark["release"] = asyncio.Event()
+        manager = JobManager(asyncio.get_running_loop(), result_cache=cache or FakeCache(), **options)
+        try:
+            return await scenario(manager)
+        finally:
+            genspark["release"].set()
+            await manager.drain(timeout=1)
+    return asyncio.run(main())
+
+
+async def wait_finished(*jobs):
+    while not all(job.finished for job in jobs):
+        await asyncio.sleep(0.01)
+
+
+def test_job_runs_to_completion_and_fills_the_cache(genspark):
+    cache = FakeCache()
+
+    async def scenario(manager):
+        job, reused = manager.submit("Bimbo", "México", "retail")
+        assert manager.get(job.id) is job and reused is None and job.status == "queued"
+        await asyncio.sleep(0.05)
+        assert job.status == "running" and job.log.last_message == "Investigando..."
+        genspark["release"].set()
+        await wait_finished(job)
+        return job
+
+    job = run_manager(genspark, scenario, cache=cache)
+    assert job.status == "completed" and job.analysis_markdown == "# Reporte"
+    assert job.output_files == {"html": "report_output/x.html"} and job.partial_output == "Mitad del reporte"
+    assert cache.get(job.cache_key) == {"content": "# Reporte", "airtable_record_id": "rec-Bimbo"}
+
+
+def test_identical_requests_join_the_run_in_flight(genspark):
+    async def scenario(manager):
+        first, _ = manager.submit("Bimbo", "México", "retail")
+        second, reused = manager.submit(" bimbo", "mexico", "RETAIL")
+        genspark["release"].set()
+        await wait_finished(first)
+        third, reused_after = manager.submit("Bimbo", "México", "otra cosa")
+        return first, second, reused, third, reused_after
+
+    first, second, reused, third, reused_after = run_manager(genspark, scenario)
+    assert second is first and reused == "in_flight"
+    assert third is not first and reused_after is None
+
+
+def test_cached_results_are_answered_without_a_run(genspark):
+    cache = FakeCache({job_manager.make_cache_key("Bimbo", "México", "retail"): {"content": "# Viejo", "airtable_record_id": "rec0"}})
+
+    async def scenario(manager):
+        return manager.submit("Bimbo", "México", "retail")
+
+    job, reused = run_manager(genspark, scenario, cache=cache)
+    assert reused == "cache" and job.status == "completed" and job.cached and job.analysis_markdown == "# Viejo"
+    assert genspark["runs"] == 0
+
+
+@pytest.mark.parametrize("result, message", [
+    ({"success": False, "content": None, "timings": []}, "Último log: Investigando..."),
+    (RuntimeError("boom"), "Error interno del servidor: boom"),
+])
+def test_failed_runs_are_reported(genspark, result, message):
+    genspark["result"] = result
+
+    async def scenario(manager):
+        job = manager.submit("Bimbo", "México", "retail")[0]
+        genspark["release"].set()
+        await wait_finished(job)
+        return job
+
+    job = run_manager(genspark, scenario)
+    assert job.status == "failed" and job.message.endswith(message) and job.finished_at
+
+
+def test_failed_runs_keep_the_partial_output(genspark):
+    genspark["result"] = {"success": False, "content": None, "partial_content": "Reporte casi completo", "timings": []}
+
+    async def scenario(manager):
+        job, _ = manager.submit("A", "MX", "x")
+        genspark["release"].set()
+        await wait_finished(job)
+        return job
+
+    job = run_manager(genspark, scenario)
+    assert job.status == "failed" and job.partial_output == "Reporte casi completo"
+
+
+def test_subscribers_get_status_log_and_progress_events(genspark):
+    async def scenario(manager):
+        job, _ = manager.submit("A", "MX", "x")
+        events = job.subscribe()
+        genspark["release"].set()
+        await wait_finished(job)
+        await asyncio.sleep(0.01)
+        received = []
+        while not events.empty():
+            received.append(events.get_nowait())
+        return received
+
+    received = run_manager(genspark, scenario)
+    assert [event for event, _ in received if event != "log"] == ["status", "progress", "status"]
+    assert received[-1][1]["status"] == "completed" and received[-1][1]["logs"] == []
+    assert "Investigando..." in [data["message"] for event, data in received if event == "log"]
+
+
+def test_queue_limit_refuses_new_runs_with_retry_after(genspark):
+    async def scenario(manager):
+        manager.submit("A", "MX", "x")
+        manager.submit("B", "MX", "x")
+        with pytest.raises(QueueSaturated) as excinfo:
+            manager.submit("C", "MX", "x")
+        assert excinfo.value.retry_after >= job_manager.MIN_RETRY_AFTER
+        assert manager.submit("A", "MX", "x")[1] == "in_flight" # Joining is still allowed
+
+    run_manager(genspark, scenario, concurrency=1, queue_limit=2)
+
+
+def test_per_client_cap(genspark):
+    async def scenario(manager):
+        manager.submit("A", "MX", "x", client="10.0.0.1")
+        manager.submit("B", "MX", "x", client="10.0.0.1")
+        with pytest.raises(QueueSaturated):
+            manager.submit("C", "MX", "x", client="10.0.0.1")
+        assert manager.submit("C", "MX", "x", client="10.0.0.2")[1] is None
+
+    run_manager(genspark, scenario, queue_limit=10, max_per_client=2)
+
+
+def test_eta_grows_with_the_queue(genspark):
+    async def scenario(manager):
+        return [manager.submit(name, "MX", "x")[0].eta_seconds for name in "ABCD"]
+
+    etas = run_manager(genspark, scenario, concurrency=2)
+    average = job_manager.JOB_DEFAULT_DURATION
+    assert etas == [average, average, average * 1.5, average * 2]
+
+
+def test_concurrency_is_bounded(genspark):
+    async def scenario(manager):
+        jobs = [manager.submit(name, "MX", "x")[0] for name in "ABC"]
+        await asyncio.sleep(0.05)
+        assert [job.status for job in jobs] == ["running", "running", "queued"]
+        genspark["release"].set()
+        await wait_finished(*jobs)
+
+    run_manager(genspark, scenario, concurrency=2)
+    assert genspark["max_running"] == 2
+
+
+def test_old_finished_jobs_are_pruned(genspark):
+    async def scenario(manager):
+        old, _ = manager.submit("A", "MX", "x")
+        genspark["release"].set()
+        await wait_finished(old)
+        old.finished_at -= job_manager.JOB_RETENTION_SECONDS + 1
+        manager.submit("B", "MX", "x")
+        return manager.get(old.id)
+
+    assert run_manager(genspark, scenario) is None
+
+
+def test_drain_waits_for_running_jobs_and_refuses_new_ones(genspark):
+    async def scenario(manager):
+        job, _ = manager.submit("A", "MX", "x")
+        drain = asyncio.create_task(manager.drain(timeout=5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ShuttingDown):
+            manager.submit("B", "MX", "x")
+        assert not drain.done()
+        genspark["release"].set()
+        return await drain, job
+
+    drained, job = run_manager(genspark, scenario)
+    assert drained and job.status == "completed"
+
+
+def test_drain_gives_up_after_the_timeout(genspark):
+    async def scenario(manager):
+        manager.submit("A", "MX", "x")
+        return await manager.drain(timeout=0.05)
+
+    assert run_manager(genspark, scenario) is False
+
+
+def test_jobs_cancelled_while_queued_are_cleaned_up(genspark):
+    pending_before, running_before = PENDING_JOBS._value.get(), RUNNING_JOBS._value.get()
+
+    async def scenario(manager):
+        running, _ = manager.submit("A", "MX", "x")
+        queued, _ = manager.submit("B", "MX", "x")
+        events = queued.subscribe()
+        await asyncio.sleep(0.01)
+        assert (running.status, queued.status) == ("running", "queued")
+        assert not await manager.drain(timeout=0.05)
+        await asyncio.sleep(0.01)
+        return running, queued, events, manager
+
+    running, queued, events, manager = run_manager(genspark, scenario, concurrency=1)
+    assert running.status == queued.status == "failed"
+    assert manager._in_flight == {}
+    assert (PENDING_JOBS._value.get(), RUNNING_JOBS._value.get()) == (pending_before, running_before)
+    assert events.get_nowait() == ("status", queued.to_dict(logs=False))
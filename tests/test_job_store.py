@@ -0,0 +1,260 @@
+"""JobStore (worker.py) against a real Postgres: see the database_url fixture in conftest.py."""
+import datetime
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("redis")
+
+import worker
+from conftest import add_job, add_user, job_row
+
+
+# --- Admission (CLAIM_NEXT_SQL) ---
+
+def test_claim_next_takes_the_oldest_due_job(db):
+    async def scenario(store, conn):
+        user = await add_user(conn)
+        older = await add_job(conn, user, age=60)
+        await add_job(conn, user, age=30)
+        row, waiting = await store.claim_next()
+        assert row["id"] == older and row["report_parameters"]["empresa"] == "Bimbo"
+        claimed = await job_row(conn, older)
+        assert claimed["status"] == "processing_phase_1" and claimed["started_at"] is not None
+
+    db(scenario)
+
+
+def test_claim_next_without_pending_jobs(db):
+    async def scenario(store, conn):
+        await add_job(conn, await add_user(conn), next_attempt_at=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1))
+        assert await store.claim_next() == (None, False) # Not due yet: nothing to wait for
+
+    db(scenario)
+
+
+def test_claim_next_respects_the_per_user_cap(db):
+    async def scenario(store, conn):
+        busy, other = await add_user(conn), await add_user(conn)
+        for _ in range(2):
+            await add_job(conn, busy, status="processing_phase_1")
+        await add_job(conn, busy, age=60)
+        newer = await add_job(conn, other, age=10)
+        assert (await store.claim_next(max_running=10, max_per_user=2))[0]["id"] == newer
+        assert await store.claim_next(max_running=10, max_per_user=2) == (None, True)
+
+    db(scenario)
+
+
+def test_claim_next_respects_the_global_cap(db):
+    async def scenario(store, conn):
+        user = await add_user(conn)
+        await add_job(conn, user, status="processing_phase_2")
+        await add_job(conn, await add_user(conn))
+        assert await store.claim_next(max_running=1, max_per_user=5) == (None, True)
+
+    db(scenario)
+
+
+def test_claim_next_favours_users_with_fewer_running_jobs(db):
+    async def scenario(store, conn):
+        busy, idle = await add_user(conn), await add_user(conn)
+        await add_job(conn, busy, status="processing_phase_1")
+        await add_job(conn, busy, age=60)
+        idle_job = await add_job(conn, idle, age=10)
+        assert (await store.claim_next(max_running=10, max_per_user=5))[0]["id"] == idle_job
+
+    db(scenario)
+
+
+def test_claim_next_weights_running_jobs_by_credits(db):
+    async def scenario(store, conn):
+        rich, poor = await add_user(conn, credits=1000), await add_user(conn, credits=0)
+        await add_job(conn, rich, status="processing_phase_1")
+        await add_job(conn, poor, status="processing_phase_1")
+        await add_job(conn, poor, age=60)
+        rich_job = await add_job(conn, rich, age=10)
+        assert (await store.claim_next(max_running=10, max_per_user=5))[0]["id"] == rich_job
+
+    db(scenario)
+
+
+# --- Phases ---
+
+def test_claim_next_returns_saved_phase_content(db):
+    async def scenario(store, conn):
+        job_id = await add_job(conn, await add_user(conn), base_analysis_content="# Base")
+        row, _ = await store.claim_next()
+        assert row["id"] == job_id and row["base_analysis_content"] == "# Base" and row["specific_analysis_content"] is None
+
+    db(scenario)
+
+
+# --- Phases ---
+
+def test_save_phase_and_claim_phase_3_once(db):
+    async def scenario(store, conn):
+        job_id = await add_job(conn, await add_user(conn), status="processing_phase_1", leased_by=store.worker_id)
+        assert await store.save_phase(str(job_id), 0, "phase_1", "# Base", "processing_phase_2")
+        assert await store.save_phase(str(job_id), 0, "phase_2", "# Específico", "pending_phase_3")
+        row = await store.claim_phase_3(str(job_id))
+        assert (row["base_analysis_content"], row["specific_analysis_content"]) == ("# Base", "# Específico")
+        assert (row["leased_by"], row["attempts"]) == (store.worker_id, 0)
+        assert await store.claim_phase_3(str(job_id)) is None
+        assert await store.complete(str(job_id), 0, ["report_output/x.pdf"])
+        done = await job_row(conn, job_id)
+        assert done["status"] == "completed" and done["output_file_paths"] == ["report_output/x.pdf"] and done["finished_at"]
+
+    db(scenario)
+
+
+def test_fail_records_the_error_details(db):
+    async def scenario(store, conn):
+        job_id = await add_job(conn, await add_user(conn), status="processing_phase_1", leased_by=store.worker_id)
+        assert await store.fail(str(job_id), 0, {"message": "boom"})
+        row = await job_row(conn, job_id)
+        assert (row["status"], row["error_details"]) == ("failed", {"message": "boom"})
+
+    db(scenario)
+
+
+# --- Retries (retry_later and the backoff SQL) ---
+
+def test_retry_later_schedules_a_jittered_backoff(db):
+    async def scenario(store, conn):
+        job_id = await add_job(conn, await add_user(conn), status="processing_phase_1", leased_by=store.worker_id)
+        before = await conn.fetchval("SELECT now()")
+        row = await store.retry_later(str(job_id), 0, "pending", {"message": "boom"})
+        assert (row["status"], row["attempts"]) == ("pending", 1)
+        delay = (row["next_attempt_at"] - before).total_seconds()
+        assert worker.RETRY_BASE_DELAY * 0.75 - 1 <= delay <= worker.RETRY_BASE_DELAY * 1.25 + 1
+        assert (await job_row(conn, job_id))["error_details"] == {"message": "boom"}
+
+    db(scenario)
+
+
+def test_backoff_doubles_and_is_capped(db):
+    backoff = f"now() + {worker._backoff_sql(worker.RETRY_BASE_DELAY, worker.RETRY_MAX_DELAY)}"
+
+    async def scenario(store, conn):
+        user = await add_user(conn)
+        third = await add_job(conn, user, attempts=2)
+        many = await add_job(conn, user, attempts=30)
+        now = await conn.fetchval("SELECT now()")
+        delays = [
+            (await conn.fetchval(f"SELECT {backoff} FROM public.report_jobs WHERE id = $1", job_id) - now).total_seconds()
+            for job_id in (third, many)
+        ]
+        assert worker.RETRY_BASE_DELAY * 4 * 0.75 - 1 <= delays[0] <= worker.RETRY_BASE_DELAY * 4 * 1.25 + 1
+        assert delays[1] <= worker.RETRY_MAX_DELAY + 1
+
+    db(scenario)
+
+
+def test_retry_later_fails_the_job_after_max_attempts(db):
+    async def scenario(store, conn):
+        attempts = worker.JOB_MAX_ATTEMPTS - 1
+        job_id = await add_job(conn, await add_user(conn), status="processing_phase_1", attempts=attempts, leased_by=store.worker_id)
+        row = await store.retry_later(str(job_id), attempts, "pending", {"message": "boom"})
+        assert (row["status"], row["next_attempt_at"]) == ("failed", None)
+        assert (await job_row(conn, job_id))["finished_at"] is not None
+
+    db(scenario)
+
+
+# --- Leases and the reaper ---
+
+def test_reap_expired_takes_back_stale_leases(db):
+    async def scenario(store, conn):
+        user = await add_user(conn)
+        stale = await add_job(conn, user, status="processing_phase_1", age=3600)
+        stale_phase_3 = await add_job(conn, user, status="processing_phase_3", age=3600)
+        fresh = await add_job(conn, user, status="processing_phase_2")
+        reaped = {row["id"]: row["status"] for row in await store.reap_expired(lease_timeout=180)}
+        assert reaped == {stale: "pending", stale_phase_3: "pending_phase_3"}
+        details = (await job_row(conn, stale))["error_details"]
+        assert (details["reason"], details["phase"]) == ("lease_expired", "processing_phase_1")
+        assert (await job_row(conn, fresh))["status"] == "processing_phase_2"
+
+    db(scenario)
+
+
+def test_heartbeat_renews_only_the_leases_still_held(db):
+    async def scenario(store, conn):
+        user = await add_user(conn)
+        held = await add_job(conn, user, status="processing_phase_1", age=3600, leased_by=store.worker_id)
+        retried = await add_job(conn, user, status="processing_phase_1", age=3600, leased_by=store.worker_id, attempts=1)
+        other = await add_job(conn, user, status="processing_phase_1", age=3600, leased_by="otro-worker")
+        renewed = await store.heartbeat({str(held): 0, str(retried): 0, str(other): 0})
+        assert renewed == [str(held)]
+        assert {row["id"] for row in await store.reap_expired(lease_timeout=180)} == {retried, other}
+
+    db(scenario)
+
+
+def test_writes_of_a_lost_lease_are_ignored(db):
+    async def scenario(store, conn):
+        # Claimed by this worker at attempts=0 an hour ago, without heartbeats since
+        job_id = await add_job(conn, await add_user(conn), status="processing_phase_1", age=3600, leased_by=store.worker_id)
+        await store.reap_expired(lease_timeout=180) # attempts 0 -> 1: that claim's token is stale
+        await conn.execute("UPDATE public.report_jobs SET next_attempt_at = NULL WHERE id = $1", job_id)
+        row, _ = await store.claim_next()
+        assert (row["leased_by"], row["attempts"]) == (store.worker_id, 1) # The next attempt, on the same worker
+        assert not await store.save_phase(str(job_id), 0, "phase_1", "# Viejo", "pending_phase_3")
+        assert not await store.complete(str(job_id), 0)
+        assert not await store.fail(str(job_id), 0, {"message": "viejo"})
+        assert await store.retry_later(str(job_id), 0, "pending", {"message": "viejo"}) is None
+        row = await job_row(conn, job_id)
+        assert (row["status"], row["attempts"], row["base_analysis_content"]) == ("processing_phase_1", 1, None)
+
+    db(scenario)
+
+
+def test_reap_expired_fails_jobs_out_of_attempts(db):
+    async def scenario(store, conn):
+        job_id = await add_job(conn, await add_user(conn), status="processing_phase_1", age=3600, attempts=worker.JOB_MAX_ATTEMPTS - 1)
+        [row] = await store.reap_expired(lease_timeout=180)
+        assert (row["id"], row["status"]) == (job_id, "failed")
+
+    db(scenario)
+
+
+def test_take_due_requeues_failed_pushes_and_elapsed_retries(db):
+    async def scenario(store, conn):
+        user = await add_user(conn)
+        past = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=5)
+        future = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+        queue_failed = await add_job(conn, user, status="queue_failed")
+        due = await add_job(conn, user, next_attempt_at=past)
+        due_phase_3 = await add_job(conn, user, status="pending_phase_3", next_attempt_at=past)
+        await add_job(conn, user, next_attempt_at=future)
+        taken = {row["id"]: (row["status"], row["previous_status"]) for row in await store.take_due()}
+        assert taken == {
+            queue_failed: ("pending", "queue_failed"),
+            due: ("pending", "pending"),
+            due_phase_3: ("pending_phase_3", "pending_phase_3"),
+        }
+        assert (await job_row(conn, due))["next_attempt_at"] is None
+        assert await store.take_due() == []
+
+    db(scenario)
+
+
+# --- Queue snapshot for the edge function (report_queue_stats) ---
+
+def test_report_queue_stats(db):
+    async def scenario(store, conn):
+        me, other = await add_user(conn), await add_user(conn)
+        await add_job(conn, me)
+        await add_job(conn, other, status="queue_failed")
+        await add_job(conn, other, status="processing_phase_1")
+        await add_job(conn, me, status="completed",
+                      started_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=300),
+                      finished_at=datetime.datetime.now(datetime.timezone.utc))
+        async with conn.transaction():
+            await conn.execute("SELECT set_config('request.jwt.claim.sub', $1, true)", str(me))
+            stats = await conn.fetchval("SELECT public.report_queue_stats()")
+        assert (stats["queued_total"], stats["running_total"], stats["active_user"]) == (2, 1, 1)
+        assert stats["avg_seconds"] == pytest.approx(300, abs=1)
+
+    db(scenario)
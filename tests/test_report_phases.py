@@ -0,0 +1,15 @@
+from report_phases import follow_up_queries
+
+
+def test_templates_are_filled_from_the_parameters():
+    [query] = follow_up_queries("trend_analysis", {"empresa": "Bimbo", "pais": "México", "consideraciones": "retail"})
+    assert '"Bimbo" en "México"' in query and '"retail"' in query
+
+
+def test_custom_queries_override_the_templates():
+    params = {"empresa": "Bimbo", "follow_up_queries": ["¿Competidores?", "  ", 42]}
+    assert follow_up_queries("trend_analysis", params) == ["¿Competidores?", "42"]
+
+
+def test_unknown_report_types_have_no_phase_2():
+    assert follow_up_queries("otro", {"empresa": "Bimbo"}) == []
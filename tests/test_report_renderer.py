@@ -0,0 +1,77 @@
+import asyncio
+import builtins
+import os
+
+import pytest
+
+pytest.importorskip("markdown")
+
+import report_renderer
+from report_renderer import markdown_digest, render_report
+
+REPORT = "# Reporte\n\nTexto con **negrita**.\n\n- uno\n    - dos\n\n| A | B |\n|---|---|\n| 1 | 2 |\n\n```\nprint(1)\n```\n"
+
+
+def test_renders_html_named_by_digest(tmp_path):
+    paths = render_report(REPORT, formats=("html",), output_dir=str(tmp_path))
+    assert paths == {"html": str(tmp_path / f"{markdown_digest(REPORT)}.html")}
+    with open(paths["html"], encoding="utf-8") as f:
+        html = f.read()
+    assert "<h1>Reporte</h1>" in html and "<strong>negrita</strong>" in html and "<table>" in html
+
+
+def test_raw_html_in_the_markdown_is_escaped():
+    html = report_renderer.render_html('<script>alert(1)</script>\n\nTexto <img src=x onerror="alert(1)"> y **negrita**.')
+    assert "<script>alert" not in html and "<img" not in html
+    assert "&lt;script&gt;" in html and "<strong>negrita</strong>" in html
+
+
+def test_existing_files_are_reused(tmp_path):
+    first = render_report(REPORT, formats=("html",), output_dir=str(tmp_path))
+    os.utime(first["html"], (0, 0))
+    second = render_report(REPORT, formats=("html",), output_dir=str(tmp_path))
+    assert second == first and os.path.getmtime(first["html"]) == 0
+
+
+def test_docx_handles_empty_code_blocks(tmp_path):
+    pytest.importorskip("docx")
+    pytest.importorskip("bs4")
+    paths = render_report("# Reporte\n\n```\n```\n", formats=("docx",), output_dir=str(tmp_path))
+    assert os.path.getsize(paths["docx"]) > 0
+
+
+@pytest.mark.parametrize("error", [ImportError("No module named 'weasyprint'"), OSError("cannot load library 'libpango-1.0-0'")])
+def test_pdf_is_skipped_when_weasyprint_is_unavailable(tmp_path, monkeypatch, error):
+    real_import = builtins.__import__
+
+    def broken_import(name, *args, **kwargs):
+        if name == "weasyprint":
+            raise error
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", broken_import)
+    paths = render_report(REPORT, formats=("html", "pdf"), output_dir=str(tmp_path))
+    assert set(paths) == {"html"}
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_docx_keeps_headings_lists_and_tables(tmp_path):
+    docx = pytest.importorskip("docx")
+    pytest.importorskip("bs4")
+    paths = render_report(REPORT, formats=("docx",), output_dir=str(tmp_path))
+    document = docx.Document(paths["docx"])
+    assert document.paragraphs[0].text == "Reporte" and len(document.tables) == 1
+
+
+def test_unknown_format_raises(tmp_path):
+    with pytest.raises(ValueError):
+        render_report(REPORT, formats=("odt",), output_dir=str(tmp_path))
+
+
+def test_renderer_writes_to_its_output_dir(tmp_path):
+    renderer = report_renderer.ReportRenderer(max_workers=1, output_dir=str(tmp_path), formats=("html",))
+    try:
+        paths = asyncio.run(renderer.render(REPORT))
+    finally:
+        renderer.close()
+    assert os.path.dirname(paths["html"]) == str(tmp_path)
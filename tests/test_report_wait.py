@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from airtable_agent import ProgressCapture, wait_for_report_ready
+from job_log import JobLog
+
+
+class FakePage:
+    """Serves a spark_page image response every few ms; the DOM shows `reports` reports."""
+
+    def __init__(self, reports, report_after=None):
+        self.reports = reports
+        self.report_after = report_after # Responses after which one more report appears
+        self.responses = 0
+
+    async def wait_for_event(self, event, predicate=None, timeout=None):
+        await asyncio.sleep(0.01)
+        self.responses += 1
+        if self.responses == self.report_after:
+            self.reports += 1
+
+    async def wait_for_function(self, expression, arg=None, polling=None, timeout=None):
+        await asyncio.sleep(3600) # Leaves the race to the network signal
+
+    async def evaluate(self, expression, min_count):
+        return self.reports >= min_count
+
+
+def wait(page, **kwargs):
+    return asyncio.run(wait_for_report_ready(page, print, poll_interval=3600, **kwargs))
+
+
+def test_network_signal_waits_for_the_expected_report_count():
+    page = FakePage(reports=1, report_after=3)
+    assert wait(page, max_wait=5, min_count=2) == "network"
+    assert page.responses == 3
+
+
+def test_images_of_earlier_reports_do_not_resolve_the_wait():
+    with pytest.raises(TimeoutError):
+        wait(FakePage(reports=1), max_wait=0.2, min_count=2)
+
+
+def test_progress_observer_errors_go_to_the_job_log():
+    class ClosedPage:
+        async def evaluate(self, expression, arg):
+            raise RuntimeError("Target page has been closed")
+
+    log = JobLog("job1")
+    asyncio.run(ProgressCapture(log).observe(ClosedPage()))
+    [entry] = log.tail()
+    assert entry["level"] == "WARNING" and "Target page has been closed" in entry["message"]
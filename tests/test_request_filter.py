@@ -0,0 +1,36 @@
+import pytest
+
+from request_filter import ESTIMATED_SIZE_BY_TYPE, FilterStats, RequestFilter
+
+
+@pytest.fixture
+def request_filter():
+    return RequestFilter(block_types="image,font,media", block_domains="google-analytics.com,hotjar.com", allow_patterns="spark_page")
+
+
+@pytest.mark.parametrize("url, resource_type, blocked", [
+    ("https://cdn.genspark.ai/logo.png", "image", True),
+    ("https://fonts.gstatic.com/roboto.woff2", "font", True),
+    ("https://www.genspark.ai/app.js", "script", False),
+    ("https://www.google-analytics.com/analytics.js", "script", True),
+    ("https://static.hotjar.com/c/hotjar.js", "script", True), # Subdomains of blocked domains
+    ("https://nothotjar.com/x.js", "script", False),
+    ("https://cdn.genspark.ai/spark_page_123.png", "image", False), # Completion signal always allowed
+    ("data:image/png;base64,AAAA", "image", False),
+])
+def test_should_block(request_filter, url, resource_type, blocked):
+    assert request_filter.should_block(url, resource_type) is blocked
+
+
+def test_summary_labels_the_savings_as_an_estimate():
+    stats = FilterStats()
+    stats.blocked_requests = 2
+    stats.estimated_bytes_saved = 2 * ESTIMATED_SIZE_BY_TYPE["image"]
+    stats.bytes_received = 3 * ESTIMATED_SIZE_BY_TYPE["image"]
+    assert stats.estimated_saved_ratio == pytest.approx(0.4)
+    assert stats.to_dict()["estimated_saved_ratio"] == 0.4
+    assert "estimado" in stats.summary() and "40%" in stats.summary()
+
+
+def test_ratio_without_traffic_is_zero():
+    assert FilterStats().estimated_saved_ratio == 0.0
@@ -0,0 +1,50 @@
+import itertools
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Deterministic time.time() for the cache: advances one second per call unless set."""
+    state = {"now": 1_000_000.0}
+    ticks = itertools.count()
+
+    def now():
+        return state["now"] + next(ticks)
+
+    monkeypatch.setattr(result_cache.time, "time", now)
+    return state
+
+
+def test_cache_key_ignores_case_accents_and_whitespace():
+    assert make_cache_key("Bimbo", "México", "Enfoque  en retail") == make_cache_key(" bimbo ", "mexico", "enfoque en RETAIL")
+    assert make_cache_key("Bimbo", "México", "retail") != make_cache_key("Bimbo", "Perú", "retail")
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("k") is None
+    cache.put("k", "# Reporte", "rec1")
+    entry = cache.get("k")
+    assert (entry["content"], entry["airtable_record_id"]) == ("# Reporte", "rec1")
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.put("k", "# Reporte")
+    clock["now"] += 120
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl=0, max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a") # "b" is now the least recently used
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a")["content"] == "A"
+    assert cache.get("c")["content"] == "C"
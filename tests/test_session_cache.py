@@ -0,0 +1,38 @@
+import asyncio
+import os
+import time
+
+from session_cache import SessionCache
+
+
+class FakeContext:
+    async def storage_state(self):
+        return {"cookies": [{"name": "session", "value": "abc"}], "origins": []}
+
+
+def test_save_load_and_invalidate(tmp_path):
+    cache = SessionCache(str(tmp_path))
+    assert not cache.has("User@X.com")
+    asyncio.run(cache.save(FakeContext(), "User@X.com"))
+    assert cache.has("user@x.com ") # Account names are normalized
+    assert cache.load("User@X.com")["cookies"][0]["value"] == "abc"
+    cache.invalidate("User@X.com")
+    assert not cache.has("User@X.com")
+    assert cache.load("User@X.com") is None
+
+
+def test_has_does_not_read_the_disk_after_the_first_check(tmp_path, monkeypatch):
+    cache = SessionCache(str(tmp_path))
+    asyncio.run(cache.save(FakeContext(), "a@x.com"))
+    monkeypatch.setattr(os.path, "getmtime", lambda path: (_ for _ in ()).throw(AssertionError("disk read")))
+    assert cache.has("a@x.com")
+
+
+def test_expired_sessions_are_ignored(tmp_path):
+    cache = SessionCache(str(tmp_path), max_age=60)
+    asyncio.run(cache.save(FakeContext(), "a@x.com"))
+    path = cache._path("a@x.com")
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert cache.load("a@x.com") is None
+    assert not SessionCache(str(tmp_path), max_age=60).has("a@x.com")
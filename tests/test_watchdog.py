@@ -0,0 +1,39 @@
+import pytest
+
+from airtable_agent import RETRYABLE_FAILURE_REASONS, classify_probe
+
+RESEARCH_URL = "https://www.genspark.ai/agents?type=agentic_deep_research"
+
+
+def probe(alerts="", captcha=False, login_prompt=False):
+    return {"size": "10:100", "alerts": alerts, "captcha": captcha, "loginPrompt": login_prompt}
+
+
+def test_healthy_page_has_no_verdict():
+    assert classify_probe(probe(), RESEARCH_URL) is None
+
+
+@pytest.mark.parametrize("page, url, reason", [
+    (probe(login_prompt=True), RESEARCH_URL, "login_wall"),
+    (probe(), "https://www.genspark.ai/login?redirect=x", "login_wall"),
+    (probe(captcha=True), RESEARCH_URL, "captcha"),
+    (probe(alerts="You have reached your usage limit"), RESEARCH_URL, "quota"),
+    (probe(alerts="Upgrade your plan to continue"), RESEARCH_URL, "quota"),
+    (probe(alerts="Something went wrong. Please try again"), RESEARCH_URL, "error_banner"),
+    (probe(alerts="Algo salió mal"), RESEARCH_URL, "error_banner"),
+])
+def test_known_dead_ends_are_classified(page, url, reason):
+    assert classify_probe(page, url)[0] == reason
+
+
+def test_login_wall_wins_over_other_signals():
+    assert classify_probe(probe(alerts="Something went wrong", captcha=True, login_prompt=True), RESEARCH_URL)[0] == "login_wall"
+
+
+def test_unrelated_alerts_are_ignored():
+    assert classify_probe(probe(alerts="Copied to clipboard"), RESEARCH_URL) is None
+
+
+def test_only_transient_reasons_are_retryable():
+    assert "login_wall" in RETRYABLE_FAILURE_REASONS
+    assert not {"quota", "captcha", "error_banner", "stalled"} & set(RETRYABLE_FAILURE_REASONS)
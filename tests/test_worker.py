@@ -0,0 +1,329 @@
+"""
+The worker end to end: jobs pushed onto a real Redis queue and recorded in a real Postgres
+(see conftest.py), with the Genspark run replaced by a stub.
+"""
+import asyncio
+import os
+import signal
+
+import pytest
+
+pytest.importorskip("asyncpg")
+pytest.importorskip("redis")
+
+import redis.asyncio as redis
+
+import worker
+from conftest import add_job, add_user, job_row
+from worker import JobStore
+
+
+class FakeBrowserPool:
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeRenderer:
+    async def render(self, markdown_text):
+        return {"html": f"report_output/{len(markdown_text)}.html"}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def genspark(monkeypatch):
+    """Replaces run_genspark_interaction: each call reports its phases and returns `result`."""
+    state = {"calls": [], "result": {"success": True, "content": "# Reporte", "logs": [], "timings": []}}
+
+    async def run(empresa, pais, consideraciones, airtable_record_id, browser_pool=None, job_log=None,
+                  follow_up_queries=(), on_phase_complete=None, base_content=None):
+        state["calls"].append(empresa)
+        state["base_content"] = base_content
+        if "before_phases" in state:
+            await state["before_phases"]()
+        if state["result"]["success"]:
+            if not base_content:
+                await on_phase_complete("phase_1", "# Base")
+            if follow_up_queries:
+                await on_phase_complete("phase_2", "# Específico")
+        return state["result"]
+
+    monkeypatch.setattr(worker, "run_genspark_interaction", run)
+    monkeypatch.setattr(worker, "get_report_renderer", FakeRenderer)
+    return state
+
+
+@pytest.fixture
+def env(db, redis_url):
+    """Like `db`, with a Redis client: runs `scenario(store, conn, queue)`."""
+    def run(scenario):
+        async def with_queue(store, conn):
+            queue = redis.from_url(redis_url, decode_responses=True)
+            try:
+                return await scenario(store, conn, queue)
+            finally:
+                await queue.aclose()
+        return db(with_queue)
+    return run
+
+
+def test_browser_phases_are_saved_and_handed_to_phase_3(env, genspark):
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn))
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        row = await job_row(conn, job_id)
+        assert (row["status"], row["base_analysis_content"], row["specific_analysis_content"]) == ("pending_phase_3", "# Base", "# Específico")
+        assert await queue.lrange(worker.PHASE_3_QUEUE_NAME, 0, -1) == [str(job_id)]
+        await worker.process_phase_3(str(job_id), store, {})
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert (row["status"], row["output_file_paths"]) == ("completed", [f"report_output/{len('# Base') + 2 + len('# Específico')}.html"])
+    assert genspark["calls"] == ["Bimbo"]
+
+
+def test_a_job_taken_back_mid_run_is_left_to_its_next_attempt(env, genspark):
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn))
+
+        async def reaped():
+            await conn.execute("UPDATE public.report_jobs SET status = 'pending', attempts = attempts + 1 WHERE id = $1", job_id)
+
+        genspark["before_phases"] = reaped
+        leases = {}
+        await worker.process_job("token", store, FakeBrowserPool(), queue, leases)
+        assert leases == {} and await queue.llen(worker.PHASE_3_QUEUE_NAME) == 0
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert (row["status"], row["attempts"], row["base_analysis_content"], row["error_details"]) == ("pending", 1, None, None)
+
+
+def test_reports_without_follow_up_queries_skip_phase_2(env, genspark):
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn), report_type="sin_fase_2")
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert (row["status"], row["specific_analysis_content"]) == ("pending_phase_3", None)
+
+
+@pytest.mark.parametrize("reason", ["timeout", "no_account", "stalled", "error_banner", "RuntimeError"])
+def test_transient_failures_are_retried_with_backoff(env, genspark, reason):
+    logs = [{"level": "INFO", "message": "uno"}, {"level": "ERROR", "message": "ERROR: sin reporte"}]
+    genspark["result"] = {"success": False, "content": None, "failure_reason": reason, "logs": logs, "timings": [], "partial_content": "# Mitad"}
+
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn))
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert len(genspark["calls"]) == 1 # Not worth an immediate retry: only the backoff one
+    assert (row["status"], row["attempts"]) == ("pending", 1) and row["next_attempt_at"] is not None
+    details = row["error_details"]
+    assert (details["message"], details["reason"], len(details["logs_tail"])) == ("ERROR: sin reporte", reason, 2)
+    assert details["partial_content"] == "# Mitad"
+
+
+@pytest.mark.parametrize("reason", worker.PERMANENT_FAILURE_REASONS)
+def test_permanent_failures_fail_the_job(env, genspark, reason):
+    genspark["result"] = {"success": False, "content": None, "failure_reason": reason, "logs": [], "timings": []}
+
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn))
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert (row["status"], row["attempts"], row["error_details"]["reason"]) == ("failed", 0, reason)
+
+
+def test_process_job_rejects_incomplete_parameters(env, genspark):
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn), report_parameters={"empresa": "Bimbo"})
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        return await job_row(conn, job_id)
+
+    assert env(scenario)["status"] == "failed"
+    assert genspark["calls"] == []
+
+
+def test_retries_resume_after_the_saved_phases(env, genspark):
+    async def scenario(store, conn, queue):
+        user = await add_user(conn)
+        resumed = await add_job(conn, user, base_analysis_content="# Base guardada")
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        done = await add_job(conn, user, base_analysis_content="# Base", specific_analysis_content="# Específico")
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        return await job_row(conn, resumed), await job_row(conn, done), await queue.lrange(worker.PHASE_3_QUEUE_NAME, 0, -1)
+
+    resumed, done, phase_3 = env(scenario)
+    assert genspark["calls"] == ["Bimbo"] and genspark["base_content"] == "# Base guardada"
+    assert resumed["base_analysis_content"] == "# Base guardada" and resumed["status"] == "pending_phase_3"
+    assert done["status"] == "pending_phase_3"
+    assert phase_3 == [str(done["id"]), str(resumed["id"])]
+
+
+def test_tokens_are_dropped_when_nothing_is_pending(env, genspark):
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn), status="completed")
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        await worker.process_phase_3(str(job_id), store, {})
+        await worker.process_phase_3("no-es-un-uuid", store, {})
+        assert await queue.llen(worker.REDIS_QUEUE_NAME) == 0
+        return await job_row(conn, job_id)
+
+    assert env(scenario)["status"] == "completed"
+    assert genspark["calls"] == []
+
+
+def test_tokens_are_kept_while_every_due_job_is_over_a_cap(env, genspark, monkeypatch):
+    monkeypatch.setattr(worker, "ADMISSION_RECHECK_INTERVAL", 0)
+
+    async def scenario(store, conn, queue):
+        user = await add_user(conn)
+        for _ in range(worker.ADMISSION_MAX_PER_USER):
+            await add_job(conn, user, status="processing_phase_1")
+        waiting = await add_job(conn, user)
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        assert await queue.lrange(worker.REDIS_QUEUE_NAME, 0, -1) == ["token"]
+        return await job_row(conn, waiting)
+
+    assert env(scenario)["status"] == "pending"
+    assert genspark["calls"] == []
+
+
+def test_retryable_failures_are_retried_now_and_then_with_backoff(env, genspark):
+    genspark["result"] = {"success": False, "content": None, "failure_reason": "login_wall", "retryable": True, "logs": [], "timings": []}
+
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn))
+        await worker.process_job("token", store, FakeBrowserPool(), queue, {})
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert len(genspark["calls"]) == worker.WORKER_IMMEDIATE_RETRIES + 1
+    assert (row["status"], row["attempts"], row["error_details"]["reason"]) == ("pending", 1, "login_wall")
+    assert row["next_attempt_at"] is not None
+
+
+def test_phase_3_errors_are_retried_with_backoff(env, genspark, monkeypatch):
+    class BrokenRenderer(FakeRenderer):
+        async def render(self, markdown_text):
+            raise RuntimeError("sin espacio en disco")
+
+    monkeypatch.setattr(worker, "get_report_renderer", BrokenRenderer)
+
+    async def scenario(store, conn, queue):
+        job_id = await add_job(conn, await add_user(conn), status="pending_phase_3", base_analysis_content="# Base")
+        await worker.process_phase_3(str(job_id), store, {})
+        return await job_row(conn, job_id)
+
+    row = env(scenario)
+    assert (row["status"], row["attempts"], row["error_details"]["phase"]) == ("pending_phase_3", 1, "phase_3")
+
+
+# --- Reliable dequeue (Redis) ---
+
+def run_with_queue(redis_url, scenario):
+    async def main():
+        queue = redis.from_url(redis_url, decode_responses=True)
+        try:
+            return await scenario(queue)
+        finally:
+            await queue.aclose()
+    return asyncio.run(main())
+
+
+def test_consume_keeps_ids_in_the_processing_list_until_handled(redis_url, monkeypatch):
+    monkeypatch.setattr(worker, "BRPOP_TIMEOUT", 1)
+    processing = worker.processing_list("jobs")
+
+    async def scenario(queue):
+        release, handled = asyncio.Event(), []
+
+        async def handler(job_id):
+            await release.wait()
+            handled.append(job_id)
+
+        await queue.lpush("jobs", "a", "b", "c")
+        stop, in_flight = asyncio.Event(), set()
+        consumer = asyncio.create_task(worker.consume(queue, "jobs", handler, 2, stop, in_flight))
+        while len(in_flight) < 2:
+            await asyncio.sleep(0.01)
+        # Two slots: the third ID stays queued for other workers.
+        assert await queue.lrange("jobs", 0, -1) == ["c"]
+        assert sorted(await queue.lrange(processing, 0, -1)) == ["a", "b"]
+        release.set()
+        while len(handled) < 3:
+            await asyncio.sleep(0.01)
+        stop.set()
+        await consumer
+        await asyncio.gather(*in_flight)
+        return handled, await queue.llen(processing)
+
+    assert run_with_queue(redis_url, scenario) == (["a", "b", "c"], 0)
+
+
+def test_recover_orphaned_requeues_ids_of_dead_workers_only(redis_url):
+    async def scenario(queue):
+        await queue.lpush("jobs", "queued")
+        await queue.lpush(worker.processing_list("jobs", "dead"), "orphan-1", "orphan-2")
+        await queue.lpush(worker.processing_list("jobs", "alive"), "busy")
+        await queue.set(worker.WORKER_ALIVE_KEY.format("alive"), "1")
+        await queue.lpush(worker.processing_list("jobs"), "mine")
+        recovered = await worker.recover_orphaned(queue)
+        return recovered, await queue.lrange("jobs", 0, -1), await queue.llen(worker.processing_list("jobs", "alive"))
+
+    recovered, jobs, busy = run_with_queue(redis_url, scenario)
+    # Orphans go to the right end, the one BLMOVE pops next.
+    assert (recovered, jobs, busy) == (2, ["queued", "orphan-1", "orphan-2"], 1)
+
+
+def test_reap_requeues_orphans_expired_leases_and_due_jobs(env):
+    async def scenario(store, conn, queue):
+        user = await add_user(conn)
+        stale = await add_job(conn, user, status="processing_phase_3", age=3600)
+        queue_failed = await add_job(conn, user, status="queue_failed")
+        await queue.lpush(worker.processing_list(worker.REDIS_QUEUE_NAME, "dead"), "orphan")
+        await worker.reap(store, queue)
+        stale_row = await job_row(conn, stale)
+        assert (stale_row["status"], stale_row["attempts"]) == ("pending_phase_3", 1)
+        assert await queue.lrange(worker.REDIS_QUEUE_NAME, 0, -1) == [str(queue_failed), "orphan"]
+        assert await queue.llen(worker.PHASE_3_QUEUE_NAME) == 0 # Its backoff has not elapsed yet
+
+    env(scenario)
+
+
+def test_run_worker_consumes_the_queue_until_sigterm(env, database_url, redis_url, genspark, monkeypatch):
+    connect = JobStore.connect.__func__
+    monkeypatch.setattr(JobStore, "connect", classmethod(lambda cls, dsn=database_url: connect(cls, dsn)))
+    monkeypatch.setattr(worker, "REDIS_URL", redis_url)
+    monkeypatch.setattr(worker, "BRPOP_TIMEOUT", 1)
+    monkeypatch.setattr(worker, "get_browser_pool", FakeBrowserPool)
+
+    async def scenario(store, conn, queue):
+        user = await add_user(conn)
+        job_ids = [await add_job(conn, user) for _ in range(3)]
+        await queue.lpush(worker.REDIS_QUEUE_NAME, *map(str, job_ids))
+        run = asyncio.create_task(worker.run_worker(concurrency=2, metrics_port=0))
+        statuses = {}
+
+        async def all_completed():
+            while set(statuses.values()) != {"completed"}:
+                await asyncio.sleep(0.05)
+                for job_id in job_ids:
+                    statuses[job_id] = (await job_row(conn, job_id))["status"]
+
+        await asyncio.wait_for(all_completed(), timeout=10)
+        os.kill(os.getpid(), signal.SIGTERM) # Handled by run_worker: stop popping, drain, exit
+        await asyncio.wait_for(run, timeout=10)
+        return statuses
+
+    assert len(env(scenario)) == 3